@@ -25,10 +25,36 @@ class SandboxVM:
         print(f"Capturing screenshot: {output_path}")
         return self.run_vbox(["controlvm", self.vm_name, "screenshotpng", output_path])
 
+    def vm_state(self):
+        out = self.run_vbox(["showvminfo", self.vm_name, "--machinereadable"]).stdout
+        for line in out.splitlines():
+            if line.startswith("VMState="):
+                return line.split("=", 1)[1].strip('"')
+        return None
+
+    def wait_for_state(self, states, timeout=30):
+        # Poll instead of sleeping a fixed amount
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.vm_state() in states:
+                return True
+            time.sleep(0.25)
+        return False
+
+    def wait_for_guest(self, timeout=180):
+        # Ready once Guest Additions report a logged-in user (i.e. the desktop is up)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            out = self.run_vbox(["guestproperty", "get", self.vm_name, "/VirtualBox/GuestInfo/OS/LoggedInUsers"]).stdout
+            if out.startswith("Value:") and out.split(":", 1)[1].strip() not in ("", "0"):
+                return True
+            time.sleep(0.5)
+        return False
+
     def revert_to_snapshot(self, snapshot_name="CleanState"):
         print(f"Shutting down and reverting to {snapshot_name}...")
         self.run_vbox(["controlvm", self.vm_name, "poweroff"])
-        time.sleep(2) # Give it a moment to stop
+        self.wait_for_state(("poweroff", "saved", "aborted"))
         return self.run_vbox(["snapshot", self.vm_name, "restore", snapshot_name])
 
     def get_metrics(self):
@@ -44,7 +70,7 @@ def run_vm_analysis(filepath_on_host):
     
     # 2. Start VM
     vm.start_headless()
-    time.sleep(10) # Wait for VM to boot/load
+    vm.wait_for_guest() # Wait for VM to boot/load (returns at once for a running-state snapshot)
     
     # To copy file from host to guest:
     vm.run_vbox(["guestcontrol", vm.vm_name, "copyto", filepath_on_host, "--target-directory", "C:\\temp\\"])
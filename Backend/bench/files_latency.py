@@ -0,0 +1,113 @@
+# bench/files_latency.py - p99 latency of GET /api/files with and without concurrent large uploads
+#
+# Run against a live API (uvicorn main:app from Backend/fourat) with a registered user:
+#   python files_latency.py --email bench@vex.local --password benchpass123 --upload-mb 300 --uploaders 4
+#
+# Phase 1 measures /api/files alone, phase 2 repeats it while `--uploaders`
+# clients stream `--upload-mb` samples to /api/analyze in a loop. On a
+# non-blocking request path the two p99 figures stay close.
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+async def login(client, email, password):
+    res = await client.post("/api/login", json={"email": email, "password": password})
+    res.raise_for_status()
+    return res.json()["access_token"]
+
+
+async def poll_files(client, headers, duration, interval):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        res = await client.get("/api/files", headers=headers)
+        res.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def upload_loop(client, headers, payload_path, stop):
+    uploads = 0
+    while not stop.is_set():
+        with open(payload_path, "rb") as f:
+            res = await client.post(
+                "/api/analyze",
+                headers=headers,
+                files={"file": ("bench.bin", f, "application/octet-stream")},
+            )
+        res.raise_for_status()
+        uploads += 1
+    return uploads
+
+
+def make_payload(size_mb):
+    # Random bytes so every upload is a distinct sample (no dedup shortcut)
+    path = f"bench_payload_{os.getpid()}.bin"
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+    return path
+
+
+def report(name, latencies):
+    print(
+        f"{name:<16} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50):8.1f}ms "
+        f"p95={percentile(latencies, 95):8.1f}ms "
+        f"p99={percentile(latencies, 99):8.1f}ms "
+        f"mean={statistics.fmean(latencies) if latencies else 0:8.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--upload-mb", type=int, default=200)
+    parser.add_argument("--uploaders", type=int, default=4)
+    args = parser.parse_args()
+
+    timeout = httpx.Timeout(300.0)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        idle = await poll_files(client, headers, args.duration, args.interval)
+
+        payload = make_payload(args.upload_mb)
+        try:
+            stop = asyncio.Event()
+            uploaders = [
+                asyncio.create_task(upload_loop(client, headers, payload, stop))
+                for _ in range(args.uploaders)
+            ]
+            busy = await poll_files(client, headers, args.duration, args.interval)
+            stop.set()
+            uploads = sum(await asyncio.gather(*uploaders))
+        finally:
+            os.remove(payload)
+
+    report("idle", idle)
+    report("during uploads", busy)
+    print(f"completed uploads: {uploads} x {args.upload_mb} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
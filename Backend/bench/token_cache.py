@@ -0,0 +1,72 @@
+# bench/token_cache.py - authenticated-request throughput with the verified-token cache on and off
+#
+# Runs in-process (no server, no database): a minimal FastAPI app with one
+# route behind get_current_user, driven through httpx's ASGI transport.
+# Run from Backend/fourat so the app packages import:
+#   python ../bench/token_cache.py --requests 20000 --tokens 50 --concurrency 32
+#
+# `--tokens` distinct tokens are reused round-robin, like dashboards polling
+# with the same access token.
+import argparse
+import asyncio
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from core.security import create_access_token, get_current_user, _user_from_access_token
+from core.token_cache import token_cache
+
+app = FastAPI()
+
+
+@app.get("/whoami")
+def whoami(user=Depends(get_current_user)):
+    return {"id": user["id"]}
+
+
+async def drive(client, tokens, requests, concurrency):
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            res = await client.get("/whoami", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+            res.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def decode_only(tokens, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        _user_from_access_token(tokens[i % len(tokens)])
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    tokens = [create_access_token(i + 1, f"user{i}@vex.local", username=f"user{i}") for i in range(args.tokens)]
+    transport = httpx.ASGITransport(app=app)
+
+    for enabled in (False, True):
+        token_cache.enabled = enabled
+        token_cache.clear()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            elapsed = await drive(client, tokens, args.requests, args.concurrency)
+        verify_elapsed = decode_only(tokens, args.requests)
+        print(
+            f"cache={'on ' if enabled else 'off'} "
+            f"http={args.requests / elapsed:9.0f} req/s "
+            f"verify-only={args.requests / verify_elapsed:9.0f} ops/s "
+            f"({verify_elapsed / args.requests * 1e6:6.1f}us each) "
+            f"stats={token_cache.stats() if enabled else '-'}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -17,25 +17,55 @@ CREATE TABLE IF NOT EXISTS files (
     file_hash VARCHAR(128),
     file_size BIGINT NOT NULL,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    batch_id CHAR(32) NULL,  -- set for rows created by one /api/analyze/batch request
+    INDEX idx_files_file_hash (file_hash),
+    INDEX idx_files_batch_id (batch_id),
+    INDEX idx_files_user_uploaded (user_id, uploaded_at, id),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- One row per distinct SHA-256; locked by register_sample so concurrent
+-- first uploads of the same sample queue a single analysis
+CREATE TABLE IF NOT EXISTS sample_hashes (
+    file_hash VARCHAR(128) PRIMARY KEY,
+    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS analyses (
     id INT AUTO_INCREMENT PRIMARY KEY,
     file_id INT NOT NULL,
     status ENUM('pending','running','finished','error') DEFAULT 'pending',
     score INT,
     summary TEXT,
-    report_json LONGTEXT,
+    report_ref VARCHAR(100),  -- path in the compressed report store (REPORTS_DIR)
+    report_size BIGINT,       -- uncompressed report size in bytes
     analyzed_at TIMESTAMP NULL,
+    attempts INT NOT NULL DEFAULT 0,  -- requeues by the maintenance sweeper
+    queued_at TIMESTAMP NULL,  -- job confirmed by the broker
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE INDEX uq_analyses_file_id (file_id),
+    INDEX idx_analyses_status_updated (status, updated_at),
     FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
 );
 
 -- Refresh tokens table: stores issued refresh tokens so they can be revoked
+-- Tokens are keyed by SHA-256(token), never stored in the clear
 CREATE TABLE IF NOT EXISTS refresh_tokens (
-    token VARCHAR(512) PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL,
     user_id INT NOT NULL,
     expires_at DATETIME NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX uq_refresh_tokens_token_hash (token_hash),
+    INDEX idx_refresh_tokens_expires_at (expires_at),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
+
+-- Schema version bookkeeping for database/migrate.py. A fresh install already
+-- has the latest schema; the migrations detect that and just record themselves.
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,153 @@
+# core.archives.py - streaming extraction of sample archives (zip, tar) with size and ratio limits
+#
+# Every entry is streamed straight into the sample store's incoming area and
+# hashed on the way (core.ingest.StreamingHasher); nothing is extracted to a
+# path taken from the archive. Limits are enforced on the bytes actually
+# produced, not on what the headers claim, so a zip bomb is stopped mid-entry.
+import os
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from core.config import (
+    UPLOAD_CHUNK_SIZE,
+    ARCHIVE_MAX_ENTRIES,
+    ARCHIVE_MAX_ENTRY_SIZE,
+    ARCHIVE_MAX_TOTAL_SIZE,
+    ARCHIVE_MAX_RATIO,
+)
+from core.ingest import StreamingHasher
+
+
+class ArchiveError(Exception):
+    """The archive is unreadable, encrypted with an unsupported method or over a limit."""
+
+
+@dataclass
+class ExtractedEntry:
+    filename: str  # path inside the archive, as recorded in files.filename
+    temp_path: str
+    size: int
+    sha256: str
+
+
+def _copy_limited(src, dest_path: str, name: str, max_size: int, compressed_size: Optional[int]) -> StreamingHasher:
+    hasher = StreamingHasher(("sha256",))
+    with open(dest_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as out:
+        while True:
+            chunk = src.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if hasher.size > max_size:
+                raise ArchiveError(f"{name}: larger than {max_size} bytes")
+            if compressed_size is not None and hasher.size > max(compressed_size, 1) * ARCHIVE_MAX_RATIO:
+                raise ArchiveError(f"{name}: compression ratio above {ARCHIVE_MAX_RATIO}")
+            out.write(chunk)
+    return hasher
+
+
+def _entry_name(name: str) -> str:
+    return name.replace("\\", "/").lstrip("/")[-255:]
+
+
+def zip_members(path: str) -> List[zipfile.ZipInfo]:
+    """Regular-file members of a zip, checked against the entry and declared-size limits."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir()]
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Not a valid zip archive: {e}")
+    if len(members) > ARCHIVE_MAX_ENTRIES:
+        raise ArchiveError(f"More than {ARCHIVE_MAX_ENTRIES} entries")
+    if sum(info.file_size for info in members) > ARCHIVE_MAX_TOTAL_SIZE:
+        raise ArchiveError(f"Archive expands to more than {ARCHIVE_MAX_TOTAL_SIZE} bytes")
+    return members
+
+
+def extract_zip_members(path: str, members: List[zipfile.ZipInfo], new_temp_path: Callable[[], str],
+                        password: Optional[str] = None) -> List[ExtractedEntry]:
+    """
+    Extract and hash a slice of zip_members(path). Each call opens its own
+    handle, so slices can run on several I/O threads at once. An entry may
+    not produce more than its declared size (which zip_members capped in
+    total) nor exceed ARCHIVE_MAX_RATIO against its compressed size.
+    """
+    entries = []
+    try:
+        with zipfile.ZipFile(path) as zf:
+            if password:
+                zf.setpassword(password.encode())
+            for info in members:
+                temp_path = new_temp_path()
+                try:
+                    with zf.open(info) as src:
+                        limit = min(info.file_size, ARCHIVE_MAX_ENTRY_SIZE)
+                        hasher = _copy_limited(src, temp_path, info.filename, limit, info.compress_size)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                entries.append(ExtractedEntry(_entry_name(info.filename), temp_path, hasher.size,
+                                              hasher.hexdigests()["sha256"]))
+    except (zipfile.BadZipFile, RuntimeError, NotImplementedError, EOFError) as e:
+        # RuntimeError: missing or wrong password; NotImplementedError: e.g. AES encryption
+        discard(entries)
+        raise ArchiveError(str(e))
+    except Exception:
+        discard(entries)
+        raise
+    return entries
+
+
+def extract_tar(path: str, new_temp_path: Callable[[], str]) -> List[ExtractedEntry]:
+    """
+    Extract and hash the regular files of a (possibly compressed) tar in one
+    sequential pass. Tar has no per-entry compressed size, so the ratio is
+    checked for the archive as a whole.
+    """
+    archive_size = os.path.getsize(path)
+    entries = []
+    total = 0
+    try:
+        with tarfile.open(path, mode="r|*") as tf:
+            for member in tf:
+                if not member.isfile():
+                    continue  # links, devices and directories carry no sample bytes
+                if len(entries) >= ARCHIVE_MAX_ENTRIES:
+                    raise ArchiveError(f"More than {ARCHIVE_MAX_ENTRIES} entries")
+                remaining = min(ARCHIVE_MAX_ENTRY_SIZE, ARCHIVE_MAX_TOTAL_SIZE - total,
+                                max(archive_size, 1) * ARCHIVE_MAX_RATIO - total)
+                if member.size > remaining:
+                    raise ArchiveError(f"{member.name}: over the archive size or ratio limit")
+                temp_path = new_temp_path()
+                try:
+                    hasher = _copy_limited(tf.extractfile(member), temp_path, member.name, member.size, None)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                total += hasher.size
+                entries.append(ExtractedEntry(_entry_name(member.name), temp_path, hasher.size,
+                                              hasher.hexdigests()["sha256"]))
+    except (tarfile.TarError, EOFError) as e:
+        discard(entries)
+        raise ArchiveError(f"Not a valid tar archive: {e}")
+    except Exception:
+        discard(entries)
+        raise
+    return entries
+
+
+def archive_kind(path: str) -> Optional[str]:
+    if zipfile.is_zipfile(path):
+        return "zip"
+    if tarfile.is_tarfile(path):
+        return "tar"
+    return None
+
+
+def discard(entries: List[ExtractedEntry]) -> None:
+    for entry in entries:
+        if os.path.exists(entry.temp_path):
+            os.remove(entry.temp_path)
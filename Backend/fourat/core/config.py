@@ -6,6 +6,26 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 5
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Revoked refresh-token cache (core/revocation.py), synced between API instances over RabbitMQ
+AUTH_EVENTS_EXCHANGE = os.getenv("AUTH_EVENTS_EXCHANGE", "auth_events")
+REFRESH_CACHE_SIZE = int(os.getenv("REFRESH_CACHE_SIZE", "100000"))  # exact revoked keys kept
+REVOKED_FILTER_CAPACITY = int(os.getenv("REVOKED_FILTER_CAPACITY", "200000"))  # keys per Bloom generation
+
+# Verified access-token cache in front of jwt.decode (core/token_cache.py)
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "1") == "1"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# User profile cache in front of get_user_by_id (database/fake_db.py); the TTL
+# bounds how stale a profile changed through another instance can be
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# Password hashing (core/hashing.py): bcrypt runs in its own process pool so a
+# login burst cannot starve the request threads; excess requests get a 503.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # raising it rehashes users on their next login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
 # Database configuration
 # For local development when running uvicorn on the host, default to localhost.
 # When the app runs inside Docker Compose, set DB_HOST=db in the environment.
@@ -13,3 +33,69 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_USER = os.getenv("DB_USER", "vexuser")
 DB_PASS = os.getenv("DB_PASS", "vexpass")
 DB_NAME = os.getenv("DB_NAME", "vex")
+
+# Shared connection pool (database/pool.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # recycle connections older than this
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # ping connections idle longer than this
+
+# Apply pending schema migrations (database/migrate.py) when the API starts
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+# Sample store root (content-addressed blobs live under UPLOAD_DIR/sha256/)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+# Compressed analysis reports written by the workers (shared with Worker REPORTS_PATH)
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+
+# Upload ingest: samples are streamed to disk once in UPLOAD_CHUNK_SIZE blocks,
+# feeding every digest in UPLOAD_DIGESTS as the bytes go by.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_DIGESTS = tuple(d.strip() for d in os.getenv("UPLOAD_DIGESTS", "sha256").split(",") if d.strip())
+FORM_FIELD_MAX_SIZE = int(os.getenv("FORM_FIELD_MAX_SIZE", str(64 * 1024)))  # non-file multipart fields
+
+# Resumable chunked uploads (core/uploads.py): session state lives on disk next
+# to the sample store, so an API restart only loses the in-progress digest.
+UPLOAD_SESSION_CHUNK = int(os.getenv("UPLOAD_SESSION_CHUNK", str(8 * 1024 * 1024)))  # bytes per chunk
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(8 * 1024 ** 3)))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))  # seconds without activity before a session is dropped
+
+# Batch submission (/api/analyze/batch, core/archives.py). Archive limits apply
+# to the bytes actually extracted; the ratio is extracted / compressed size.
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))  # uploaded files per request
+ARCHIVE_MAX_ENTRIES = int(os.getenv("ARCHIVE_MAX_ENTRIES", "10000"))
+ARCHIVE_MAX_ENTRY_SIZE = int(os.getenv("ARCHIVE_MAX_ENTRY_SIZE", str(1024 ** 3)))
+ARCHIVE_MAX_TOTAL_SIZE = int(os.getenv("ARCHIVE_MAX_TOTAL_SIZE", str(8 * 1024 ** 3)))
+ARCHIVE_MAX_RATIO = int(os.getenv("ARCHIVE_MAX_RATIO", "100"))
+FILE_IO_WORKERS = int(os.getenv("FILE_IO_WORKERS", "4"))  # concurrent upload writers (core/executors.py)
+
+# RabbitMQ job publishing (core/publisher.py)
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", "5672"))
+ANALYSIS_QUEUE = os.getenv("ANALYSIS_QUEUE", "analysis_queue")
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "100"))  # max messages per flush
+PUBLISH_LINGER_MS = float(os.getenv("PUBLISH_LINGER_MS", "5"))  # wait this long to group a burst
+RESULTS_QUEUE = os.getenv("RESULTS_QUEUE", "analysis_results")  # durable: worker verdicts and stage transitions
+RESULTS_BATCH_SIZE = int(os.getenv("RESULTS_BATCH_SIZE", "200"))  # max results applied per transaction
+RESULTS_LINGER_MS = float(os.getenv("RESULTS_LINGER_MS", "50"))  # wait this long to group results
+RESULTS_DEAD_QUEUE = os.getenv("RESULTS_DEAD_QUEUE", "analysis_results.dead")  # results that can never be applied
+EVENTS_EXCHANGE = os.getenv("EVENTS_EXCHANGE", "analysis_events")  # fanout of worker progress events
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))  # seconds between keep-alive comments on idle streams
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("PUBLISH_CONFIRM_TIMEOUT", "10"))  # seconds a request waits for the broker ack
+
+# Maintenance sweeper (core/maintenance.py): purges expired refresh tokens in
+# small batches and requeues or fails analyses stuck in pending/running
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") == "1"
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "60"))  # seconds between sweeps
+TOKEN_PURGE_BATCH = int(os.getenv("TOKEN_PURGE_BATCH", "1000"))  # rows per DELETE
+TOKEN_PURGE_MAX_BATCHES = int(os.getenv("TOKEN_PURGE_MAX_BATCHES", "50"))  # per sweep; the rest waits for the next
+ANALYSIS_PENDING_DEADLINE = int(os.getenv("ANALYSIS_PENDING_DEADLINE", "300"))  # seconds pending without a broker confirm before republish
+ANALYSIS_RUNNING_DEADLINE = int(os.getenv("ANALYSIS_RUNNING_DEADLINE", "3600"))  # keep above the worker's hard timeout
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))  # requeues before the analysis is failed
+STALE_ANALYSES_BATCH = int(os.getenv("STALE_ANALYSES_BATCH", "200"))
+
+# /api/files pagination
+FILES_PAGE_SIZE = int(os.getenv("FILES_PAGE_SIZE", "50"))
+FILES_PAGE_SIZE_MAX = int(os.getenv("FILES_PAGE_SIZE_MAX", "500"))
+FILES_EXPORT_BATCH = int(os.getenv("FILES_EXPORT_BATCH", "1000"))  # rows per DB round-trip in the NDJSON export
@@ -0,0 +1,128 @@
+# core.events.py - live analysis progress: worker events from RabbitMQ fanned out to SSE subscribers
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import pika
+from core.config import RABBITMQ_HOST, RABBITMQ_PORT, EVENTS_EXCHANGE
+
+TERMINAL_STATUSES = ("finished", "error")
+
+
+class EventBroker:
+    """
+    In-process pub/sub keyed by sample SHA-256. Every analyses row with the
+    same file_hash is satisfied by the same sandbox run (see
+    files_db.register_sample), so subscribing by hash also covers rows that
+    were attached to a run already in flight.
+
+    Lives on the event loop; other threads publish through publish_threadsafe.
+    """
+
+    def __init__(self, recent_size: int = 10000, queue_size: int = 100):
+        self._subscribers: Dict[str, set] = {}
+        self._recent: "OrderedDict[str, dict]" = OrderedDict()  # last event per hash
+        self._recent_size = recent_size
+        self._queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.dropped = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, file_hash: str) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.setdefault(file_hash, set()).add(q)
+        return q
+
+    def unsubscribe(self, file_hash: str, q: asyncio.Queue) -> None:
+        subs = self._subscribers.get(file_hash)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                del self._subscribers[file_hash]
+
+    def last_event(self, file_hash: str) -> Optional[dict]:
+        """Latest event for the hash; it may come from an earlier run, so callers compare its ts."""
+        return self._recent.get(file_hash)
+
+    def publish(self, event: dict) -> None:
+        file_hash = event.get("file_hash")
+        if not file_hash:
+            return
+        self.published += 1
+        self._recent[file_hash] = event
+        self._recent.move_to_end(file_hash)
+        while len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+        for q in self._subscribers.get(file_hash, ()):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client only loses intermediate progress; terminal
+                # events are re-read from last_event when it catches up
+                self.dropped += 1
+
+    def publish_threadsafe(self, event: dict) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.publish, event)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "watched_samples": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+class EventConsumer:
+    """Background thread: bind an exclusive queue to the worker events exchange and feed the broker."""
+
+    def __init__(self, broker: EventBroker, host: str = RABBITMQ_HOST, port: int = RABBITMQ_PORT,
+                 exchange: str = EVENTS_EXCHANGE):
+        self.broker = broker
+        self.params = pika.ConnectionParameters(host=host, port=port, heartbeat=30)
+        self.exchange = exchange
+        self._stopping = threading.Event()
+        self._connection = None
+        self._thread = threading.Thread(target=self._run, name="vex-events", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        conn = self._connection
+        if conn is not None:
+            try:
+                conn.add_callback_threadsafe(conn.close)
+            except Exception:
+                pass
+        self._thread.join(timeout=5)
+
+    def _on_message(self, channel, method, properties, body) -> None:
+        try:
+            self.broker.publish_threadsafe(json.loads(body))
+        except ValueError:
+            print("Dropping malformed analysis event")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._connection = pika.BlockingConnection(self.params)
+                channel = self._connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type="fanout")
+                # Exclusive, auto-deleted: each API instance gets every event while it is up
+                result = channel.queue_declare(queue="", exclusive=True)
+                channel.queue_bind(exchange=self.exchange, queue=result.method.queue)
+                channel.basic_consume(queue=result.method.queue, on_message_callback=self._on_message, auto_ack=True)
+                channel.start_consuming()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"Analysis event consumer error, reconnecting: {e}")
+                time.sleep(2)
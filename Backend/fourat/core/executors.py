@@ -0,0 +1,27 @@
+# core.executors.py - bounded executors that keep blocking DB and file work off the event loop
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from core.config import DB_POOL_SIZE, FILE_IO_WORKERS
+
+# One thread per pooled connection: DB calls queue here instead of piling up
+# on the pool, and they never compete with file I/O for threads.
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="vex-db")
+io_executor = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix="vex-io")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking data-access function on the DB executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run blocking file I/O (writes, hashing, renames) on the I/O executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    db_executor.shutdown(wait=True)
+    io_executor.shutdown(wait=True)
@@ -1,10 +1,98 @@
 # core.hashing.py - provides password hashing and verification utilities
+#
+# bcrypt is deliberately slow, so the async helpers run it in a dedicated,
+# bounded process pool: it never holds the GIL or a request thread, and when
+# more than PASSWORD_HASH_MAX_PENDING operations are queued new ones are
+# rejected straight away (HashingBusy -> 503) instead of piling up latency.
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
 from passlib.context import CryptContext
+from core.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
+
+def verify_and_update(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash): new_hash is set when the stored hash uses outdated parameters."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+class HashingBusy(Exception):
+    """The password hashing pool is saturated; the caller should retry later."""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+_stats = {"completed": 0, "failed": 0, "rejected": 0, "rehashed": 0}
+
+
+def _mp_context():
+    # Never fork the API process: by the time hashing runs it has pika, publisher
+    # and maintenance threads, and a forked child can deadlock on their locks
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def start_hash_pool() -> None:
+    """Create the pool and its forkserver; call from the lifespan before any thread starts."""
+    _get_pool().submit(int).result()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=_mp_context())
+    return _pool
+
+
+async def _submit(fn, *args):
+    # Only touched from the event loop thread, so a plain counter is enough
+    global _in_flight
+    if _in_flight >= PASSWORD_HASH_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise HashingBusy()
+    _in_flight += 1
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+    except BaseException:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _in_flight -= 1
+    _stats["completed"] += 1
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    return await _submit(hash_password, password)
+
+
+async def verify_and_update_async(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    valid, new_hash = await _submit(verify_and_update, plain, hashed)
+    if new_hash:
+        _stats["rehashed"] += 1
+    return valid, new_hash
+
+
+def hashing_stats() -> Dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "rounds": BCRYPT_ROUNDS,
+        "in_flight": _in_flight,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        **_stats,
+    }
+
+
+def shutdown_hash_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
@@ -0,0 +1,244 @@
+# core.ingest.py - single-pass upload ingest: write the sample to disk and hash it while streaming
+#
+# Multipart requests are parsed straight off request.stream(), so each file
+# part is written to its temp path (and hashed) once; Starlette's form
+# parsing would first spool it to a SpooledTemporaryFile of its own.
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+from starlette.requests import Request
+from core.config import UPLOAD_CHUNK_SIZE, UPLOAD_DIGESTS, FORM_FIELD_MAX_SIZE
+from core.executors import run_io
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class StreamingHasher:
+    """Feed several digests (and a byte counter) from the same chunks."""
+
+    def __init__(self, algorithms: Iterable[str] = UPLOAD_DIGESTS):
+        names = list(dict.fromkeys(algorithms))
+        # file_hash in the DB is always SHA-256, so it is never optional
+        if "sha256" not in names:
+            names.insert(0, "sha256")
+        self._hashers = {name: hashlib.new(name) for name in names}
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        for h in self._hashers.values():
+            h.update(chunk)
+        self.size += len(chunk)
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: h.hexdigest() for name, h in self._hashers.items()}
+
+
+@dataclass
+class IngestResult:
+    size: int
+    digests: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def sha256(self) -> str:
+        return self.digests["sha256"]
+
+
+def ingest_stream(
+    src: BinaryIO,
+    dest_path: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    algorithms: Iterable[str] = UPLOAD_DIGESTS,
+) -> IngestResult:
+    """Copy src to dest_path in one pass, hashing each chunk as it is written."""
+    hasher = StreamingHasher(algorithms)
+    with open(dest_path, "wb", buffering=chunk_size) as out:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            out.write(chunk)
+    return IngestResult(size=hasher.size, digests=hasher.hexdigests())
+
+
+class UploadFormError(Exception):
+    """The request is not a well-formed multipart form, or breaks a form limit."""
+
+
+@dataclass
+class UploadedPart:
+    field: str
+    filename: str
+    temp_path: str
+    result: Optional[IngestResult] = None
+
+
+class _PartWriter:
+    """Blocking half of one file part: the temp file and its digests, fed from the I/O executor."""
+
+    def __init__(self, path: str, algorithms: Iterable[str] = UPLOAD_DIGESTS):
+        self.path = path
+        self.hasher = StreamingHasher(algorithms)
+        self.result: Optional[IngestResult] = None
+        self._out = None
+
+    def write(self, chunks: List[bytes]) -> None:
+        if self._out is None:
+            self._out = open(self.path, "wb", buffering=UPLOAD_CHUNK_SIZE)
+        for chunk in chunks:
+            self.hasher.update(chunk)
+            self._out.write(chunk)
+
+    def close(self) -> IngestResult:
+        if self._out is None:
+            open(self.path, "wb").close()  # an empty file part
+        else:
+            self._out.close()
+        self.result = IngestResult(size=self.hasher.size, digests=self.hasher.hexdigests())
+        return self.result
+
+    def discard(self) -> None:
+        if self._out is not None:
+            self._out.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _FormStream:
+    """
+    Callbacks for MultipartParser. They run synchronously inside
+    parser.write(), so they only record what happened; ingest_form then does
+    the file I/O for those events on the executor.
+    """
+
+    def __init__(self, new_temp_path: Callable[[], str], max_files: int):
+        self.new_temp_path = new_temp_path
+        self.max_files = max_files
+        self.parts: List[UploadedPart] = []
+        self.writers: List[_PartWriter] = []
+        self.fields: Dict[str, str] = {}
+        self.events: List[Tuple[_PartWriter, Optional[bytes]]] = []  # (writer, data), data None at part end
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = ""
+        self._writer: Optional[_PartWriter] = None
+        self._value = bytearray()
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._writer = None
+        self._value = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            return
+        if len(self.parts) >= self.max_files:
+            raise UploadFormError(f"At most {self.max_files} files per request")
+        part = UploadedPart(self._name, filename.decode("utf-8", "replace")[-255:], self.new_temp_path())
+        self._writer = _PartWriter(part.temp_path)
+        self.parts.append(part)
+        self.writers.append(self._writer)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._writer is not None:
+            self.events.append((self._writer, data[start:end]))
+            return
+        self._value += data[start:end]
+        if len(self._value) > FORM_FIELD_MAX_SIZE:
+            raise UploadFormError(f"Form field {self._name} is larger than {FORM_FIELD_MAX_SIZE} bytes")
+
+    def on_part_end(self) -> None:
+        if self._writer is not None:
+            self.events.append((self._writer, None))
+        else:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+
+def _apply_events(events: List[Tuple[_PartWriter, Optional[bytes]]]) -> None:
+    """Write a run of recorded part events in order (on the I/O executor)."""
+    chunks: List[bytes] = []
+    writer = None
+    for target, data in events:
+        if target is not writer and chunks:
+            writer.write(chunks)
+            chunks = []
+        writer = target
+        if data is None:
+            if chunks:
+                writer.write(chunks)
+                chunks = []
+            target.close()
+        else:
+            chunks.append(data)
+    if chunks:
+        writer.write(chunks)
+
+
+async def ingest_form(request: Request, new_temp_path: Callable[[], str],
+                      max_files: int = 1) -> Tuple[List[UploadedPart], Dict[str, str]]:
+    """
+    Parse a multipart/form-data body as it arrives. Every file part is
+    streamed to its own new_temp_path() and hashed in the same pass, in
+    UPLOAD_CHUNK_SIZE batches on the I/O executor. Returns (file parts in
+    order, plain fields). On any error the temp files are removed.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise UploadFormError("Expected a multipart/form-data body")
+    form = _FormStream(new_temp_path, max_files)
+    parser = MultipartParser(options[b"boundary"], form.callbacks())
+    buffered = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            buffered += len(chunk)
+            # Hand the executor whole chunks' worth of work, and always the end of a part
+            if buffered >= UPLOAD_CHUNK_SIZE or any(data is None for _, data in form.events):
+                events, form.events = form.events, []
+                await run_io(_apply_events, events)
+                buffered = 0
+        parser.finalize()
+        if form.events:
+            await run_io(_apply_events, form.events)
+            form.events = []
+        if any(writer.result is None for writer in form.writers):
+            raise UploadFormError("Truncated multipart body")
+    except Exception as e:
+        await run_io(lambda: [writer.discard() for writer in form.writers])
+        if isinstance(e, UploadFormError):
+            raise
+        if type(e).__module__.split(".")[0] in ("python_multipart", "multipart"):
+            raise UploadFormError(f"Malformed multipart body: {e}")
+        raise
+    for part, writer in zip(form.parts, form.writers):
+        part.result = writer.result
+    return form.parts, form.fields
@@ -0,0 +1,123 @@
+# core.maintenance.py - periodic cleanup: expired refresh tokens and analyses stuck after a worker crash
+import threading
+import time
+from concurrent.futures import wait
+from typing import Callable, Dict, List
+from core.config import (
+    MAINTENANCE_INTERVAL,
+    TOKEN_PURGE_BATCH,
+    TOKEN_PURGE_MAX_BATCHES,
+    ANALYSIS_PENDING_DEADLINE,
+    ANALYSIS_RUNNING_DEADLINE,
+    ANALYSIS_MAX_ATTEMPTS,
+    STALE_ANALYSES_BATCH,
+    PUBLISH_CONFIRM_TIMEOUT,
+)
+from database.fake_db import purge_expired_refresh_tokens
+from database.files_db import fail_exhausted_analyses, mark_analyses_queued, requeue_stale_analyses
+
+
+class MaintenanceSweeper:
+    """
+    Background thread that runs sweep() every MAINTENANCE_INTERVAL seconds.
+
+    Expired refresh tokens are deleted TOKEN_PURGE_BATCH rows at a time, each
+    batch its own short transaction, so the purge never holds long locks on
+    a table that every /refresh writes to. Analyses running past their
+    deadline, or pending without their job ever being confirmed by the
+    broker, are reset to pending and published again (one job per sample
+    hash) until ANALYSIS_MAX_ATTEMPTS, then failed. Confirmed jobs are left
+    to RabbitMQ, which redelivers them if a worker dies. Every API
+    instance may run a sweeper: stale rows are claimed with SKIP LOCKED.
+
+    `publish` takes a list of job dicts and returns one future per job
+    (JobPublisher.publish_many); `make_job` builds a job from a stale row.
+    """
+
+    def __init__(self, publish: Callable, make_job: Callable, interval: float = MAINTENANCE_INTERVAL):
+        self.publish = publish
+        self.make_job = make_job
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vex-maintenance", daemon=True)
+        self.sweeps = 0
+        self.errors = 0
+        self.tokens_purged = 0
+        self.jobs_requeued = 0
+        self.analyses_failed = 0
+        self.publish_failures = 0
+        self.last_sweep: Dict = {}
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join(timeout=10)
+
+    def stats(self) -> Dict:
+        return {
+            "sweeps": self.sweeps,
+            "errors": self.errors,
+            "tokens_purged": self.tokens_purged,
+            "jobs_requeued": self.jobs_requeued,
+            "analyses_failed": self.analyses_failed,
+            "publish_failures": self.publish_failures,
+            "last_sweep": self.last_sweep,
+        }
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                self.errors += 1
+                print(f"Maintenance sweep failed: {e}")
+
+    def sweep(self) -> Dict:
+        started = time.monotonic()
+        purged = self.purge_tokens()
+        failed = fail_exhausted_analyses(ANALYSIS_PENDING_DEADLINE, ANALYSIS_RUNNING_DEADLINE,
+                                         ANALYSIS_MAX_ATTEMPTS, STALE_ANALYSES_BATCH)
+        requeued = self.requeue_analyses()
+
+        self.sweeps += 1
+        self.tokens_purged += purged
+        self.analyses_failed += failed
+        self.jobs_requeued += requeued
+        self.last_sweep = {
+            "at": time.time(),
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "tokens_purged": purged,
+            "jobs_requeued": requeued,
+            "analyses_failed": failed,
+        }
+        return self.last_sweep
+
+    def purge_tokens(self) -> int:
+        purged = 0
+        for _ in range(TOKEN_PURGE_MAX_BATCHES):
+            if self._stopping.is_set():
+                break
+            deleted = purge_expired_refresh_tokens(TOKEN_PURGE_BATCH)
+            purged += deleted
+            if deleted < TOKEN_PURGE_BATCH:
+                break
+        return purged
+
+    def requeue_analyses(self) -> int:
+        rows = requeue_stale_analyses(ANALYSIS_PENDING_DEADLINE, ANALYSIS_RUNNING_DEADLINE,
+                                      ANALYSIS_MAX_ATTEMPTS, STALE_ANALYSES_BATCH)
+        if not rows:
+            return 0
+        jobs: List[Dict] = [
+            self.make_job(row["analysis_id"], row["file_id"], row["stored_path"], row["file_hash"], row["filename"])
+            for row in rows
+        ]
+        # A job that is not confirmed stays pending and unqueued, and is picked up again after the deadline
+        futures = self.publish(jobs)
+        wait(futures, timeout=PUBLISH_CONFIRM_TIMEOUT)
+        confirmed = [row["analysis_id"] for row, f in zip(rows, futures) if f.done() and f.exception() is None]
+        self.publish_failures += len(rows) - len(confirmed)
+        mark_analyses_queued(confirmed)
+        return len(rows)
@@ -0,0 +1,254 @@
+# core.publisher.py - long-lived RabbitMQ publisher with publisher confirms and burst batching
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, List
+import pika
+from pika.spec import Basic
+from core.config import (
+    RABBITMQ_HOST,
+    RABBITMQ_PORT,
+    ANALYSIS_QUEUE,
+    PUBLISH_BATCH_SIZE,
+    PUBLISH_LINGER_MS,
+)
+
+
+class PublishError(Exception):
+    """The broker nacked a message or the publisher shut down before a confirm."""
+
+
+class JobPublisher:
+    """
+    Owns one AMQP connection and channel, driven by pika's SelectConnection
+    ioloop in a background thread (pika objects are not thread-safe, so every
+    channel call happens on that thread).
+
+    publish() returns a concurrent Future that resolves once the broker
+    confirms the message. Messages that arrive within PUBLISH_LINGER_MS of each
+    other are flushed together, and the broker acks them with multiple=True.
+    Unconfirmed messages are republished after a reconnect (at-least-once).
+    """
+
+    def __init__(
+        self,
+        host: str = RABBITMQ_HOST,
+        port: int = RABBITMQ_PORT,
+        queue: str = ANALYSIS_QUEUE,
+        batch_size: int = PUBLISH_BATCH_SIZE,
+        linger_ms: float = PUBLISH_LINGER_MS,
+    ):
+        self.params = pika.ConnectionParameters(host=host, port=port, heartbeat=30)
+        self.queue = queue
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._pending = deque()      # (body, future) waiting to be published
+        self._unconfirmed = {}       # delivery_tag -> (body, future)
+        self._delivery_tag = 0
+        self._flush_scheduled = False
+
+        self._connection = None
+        self._channel = None
+        self._ready = False
+        self._session_ok = False
+        self._stopping = False
+        self._thread = None
+
+        # metrics
+        self._published = 0
+        self._confirmed = 0
+        self._nacked = 0
+        self._batches = 0
+        self._reconnects = 0
+
+    # ---- public API (any thread) ----
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="vex-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, job: Dict) -> Future:
+        return self.publish_many([job])[0]
+
+    def publish_many(self, jobs: Iterable[Dict]) -> List[Future]:
+        futures = []
+        with self._lock:
+            if self._stopping:
+                raise PublishError("Publisher is stopped")
+            for job in jobs:
+                future = Future()
+                self._pending.append((json.dumps(job).encode(), future))
+                futures.append(future)
+        self._wake()
+        return futures
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._stopping = True
+        conn = self._connection
+        if conn is not None:
+            try:
+                conn.ioloop.add_callback_threadsafe(self._close)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._fail_outstanding(PublishError("Publisher stopped before confirm"))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "connected": self._ready,
+                "pending": len(self._pending),
+                "unconfirmed": len(self._unconfirmed),
+                "published": self._published,
+                "confirmed": self._confirmed,
+                "nacked": self._nacked,
+                "batches": self._batches,
+                "reconnects": self._reconnects,
+            }
+
+    # ---- ioloop thread ----
+
+    def _wake(self) -> None:
+        conn = self._connection
+        if conn is not None and self._ready:
+            try:
+                conn.ioloop.add_callback_threadsafe(self._schedule_flush)
+            except Exception:
+                pass  # connection is going away; pending is flushed on reconnect
+
+    def _run(self) -> None:
+        backoff = 0.25
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+            self._session_ok = False
+            self._connection = pika.SelectConnection(
+                self.params,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()
+
+            # ioloop stopped: connection is gone, requeue anything unconfirmed
+            self._requeue_unconfirmed()
+            with self._lock:
+                if self._stopping:
+                    return
+                self._reconnects += 1
+            # Reset the backoff after a session that actually worked
+            backoff = 0.5 if self._session_ok else min(backoff * 2, 30.0)
+            print(f"RabbitMQ publisher disconnected, reconnecting in {backoff:.1f}s")
+            time.sleep(backoff)
+
+    def _on_connection_open(self, connection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error) -> None:
+        print(f"RabbitMQ publisher connection failed: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason) -> None:
+        self._ready = False
+        self._channel = None
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel) -> None:
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_confirm)
+        channel.queue_declare(queue=self.queue, durable=True, callback=self._on_queue_declared)
+
+    def _on_channel_closed(self, channel, reason) -> None:
+        print(f"RabbitMQ publisher channel closed: {reason}")
+        self._ready = False
+        self._channel = None
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_queue_declared(self, frame) -> None:
+        self._ready = True
+        self._session_ok = True
+        self._delivery_tag = 0
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_scheduled or not self._ready:
+            return
+        with self._lock:
+            burst = len(self._pending) >= self.batch_size
+        self._flush_scheduled = True
+        if burst:
+            self._flush()
+        else:
+            self._connection.ioloop.call_later(self.linger, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        if not self._ready or self._channel is None:
+            return
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        if not batch:
+            return
+        props = pika.BasicProperties(delivery_mode=2, content_type="application/json")
+        for body, future in batch:
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = (body, future)
+            self._channel.basic_publish(exchange="", routing_key=self.queue, body=body, properties=props)
+        with self._lock:
+            self._published += len(batch)
+            self._batches += 1
+            more = bool(self._pending)
+        if more:
+            self._schedule_flush()
+
+    def _on_confirm(self, frame) -> None:
+        method = frame.method
+        if method.multiple:
+            tags = [t for t in self._unconfirmed if t <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+        acked = isinstance(method, Basic.Ack)
+        for tag in tags:
+            _, future = self._unconfirmed.pop(tag)
+            if future.done():
+                continue  # caller gave up waiting (cancelled); the message is still delivered
+            if acked:
+                future.set_result(True)
+            else:
+                future.set_exception(PublishError("Broker rejected the message"))
+        with self._lock:
+            if acked:
+                self._confirmed += len(tags)
+            else:
+                self._nacked += len(tags)
+
+    def _requeue_unconfirmed(self) -> None:
+        with self._lock:
+            for tag in sorted(self._unconfirmed, reverse=True):
+                self._pending.appendleft(self._unconfirmed[tag])
+            self._unconfirmed.clear()
+        self._flush_scheduled = False
+
+    def _close(self) -> None:
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+        elif self._connection is not None:
+            self._connection.ioloop.stop()
+
+    def _fail_outstanding(self, error: Exception) -> None:
+        with self._lock:
+            outstanding = list(self._pending) + list(self._unconfirmed.values())
+            self._pending.clear()
+            self._unconfirmed.clear()
+        for _, future in outstanding:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,81 @@
+# core.report_store.py - compressed, content-addressed analysis reports on disk (read side + backfill writes)
+#
+# Layout (shared with Worker/report_store.py, which writes new reports):
+#   <REPORTS_DIR>/<ab>/<cd>/<sha256 of the JSON>.json.zst   (zstandard installed)
+#   <REPORTS_DIR>/<ab>/<cd>/<sha256 of the JSON>.json.gz    (fallback)
+# analyses.report_ref stores the path relative to the root, so the suffix
+# tells the reader which codec to use.
+import gzip
+import hashlib
+import os
+import uuid
+from typing import Iterator, Optional, Tuple
+from core.config import REPORTS_DIR
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+READ_CHUNK = 256 * 1024
+
+
+class ReportStore:
+    def __init__(self, root: str = REPORTS_DIR):
+        self.root = root
+
+    def path(self, ref: str) -> str:
+        # refs come from our own DB rows, but never let one escape the root
+        full = os.path.normpath(os.path.join(self.root, *ref.split("/")))
+        if not full.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid report ref: {ref}")
+        return full
+
+    @staticmethod
+    def encoding(ref: str) -> str:
+        """HTTP Content-Encoding of the stored bytes."""
+        return "zstd" if ref.endswith(".zst") else "gzip"
+
+    def put(self, data: bytes) -> Tuple[str, int]:
+        """Compress and store a report; returns (ref, uncompressed size). Identical reports share a blob."""
+        digest = hashlib.sha256(data).hexdigest()
+        suffix = ".json.zst" if zstandard else ".json.gz"
+        ref = "/".join((digest[:2], digest[2:4], digest + suffix))
+        final_path = self.path(ref)
+        if not os.path.exists(final_path):
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if zstandard:
+                blob = zstandard.ZstdCompressor(level=10).compress(data)
+            else:
+                blob = gzip.compress(data, compresslevel=6)
+            tmp = f"{final_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, final_path)
+        return ref, len(data)
+
+    def _reader(self, ref: str):
+        path = self.path(ref)
+        if ref.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read .zst reports")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return gzip.open(path, "rb")
+
+    def stream(self, ref: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield decompressed bytes [start, end] (inclusive, like HTTP ranges) without inflating the whole report in memory."""
+        with self._reader(ref) as reader:
+            skip = start
+            while skip > 0:
+                chunk = reader.read(min(READ_CHUNK, skip))
+                if not chunk:
+                    return
+                skip -= len(chunk)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = reader.read(READ_CHUNK if remaining is None else min(READ_CHUNK, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
@@ -0,0 +1,214 @@
+# core.results.py - consume worker results from RabbitMQ and apply them to MySQL in batches
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import pika
+from mysql.connector import errors as mysql_errors
+from core.config import (
+    RABBITMQ_HOST,
+    RABBITMQ_PORT,
+    RESULTS_QUEUE,
+    RESULTS_BATCH_SIZE,
+    RESULTS_LINGER_MS,
+    RESULTS_DEAD_QUEUE,
+)
+from database.files_db import apply_analysis_results
+
+RESULT_STATUSES = ("running", "finished", "error")
+SUMMARY_MAX_BYTES = 65535  # analyses.summary is TEXT
+REPORT_REF_MAX = 100  # analyses.report_ref is VARCHAR(100)
+FILE_HASH_MAX = 128  # files.file_hash is VARCHAR(128)
+
+# Lost connection, pool exhausted, lock wait timeout, deadlock, too many connections:
+# worth retrying. Anything else (bad data, constraint violations) fails the same way again.
+TRANSIENT_MYSQL_ERRNOS = {1040, 1205, 1213, 2003, 2006, 2013, 2055}
+
+
+def is_transient_db_error(error: Exception) -> bool:
+    if isinstance(error, (mysql_errors.OperationalError, mysql_errors.InterfaceError, mysql_errors.PoolError)):
+        return True
+    return getattr(error, "errno", None) in TRANSIENT_MYSQL_ERRNOS
+
+
+def _optional_int(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"expected an integer, got {value!r}")
+    return value
+
+
+def parse_result(body: bytes) -> Optional[Dict]:
+    """Decode and validate one worker result message into apply_analysis_results' shape; None if unusable."""
+    try:
+        message = json.loads(body)
+        if not isinstance(message, dict) or message.get("status") not in RESULT_STATUSES:
+            return None
+        file_hash = message.get("file_hash")
+        if not isinstance(file_hash, str) or not file_hash or len(file_hash) > FILE_HASH_MAX:
+            return None
+        score = _optional_int(message.get("score"))
+        if score is not None and not 0 <= score <= 100:
+            return None
+        summary = message.get("summary")
+        summary = json.dumps(summary) if summary is not None else None
+        if summary is not None and len(summary.encode()) > SUMMARY_MAX_BYTES:
+            return None
+        report_ref = message.get("report_ref")
+        if report_ref is not None and (not isinstance(report_ref, str) or len(report_ref) > REPORT_REF_MAX):
+            return None
+        analyzed_at = message.get("analyzed_at")
+        return {
+            "analysis_id": _optional_int(message.get("analysis_id")),
+            "file_hash": file_hash,
+            "status": message["status"],
+            "score": score,
+            "summary": summary,
+            "report_ref": report_ref,
+            "report_size": _optional_int(message.get("report_size")),
+            "analyzed_at": datetime.fromisoformat(analyzed_at) if analyzed_at else None,
+        }
+    except (ValueError, TypeError):
+        return None
+
+
+class ResultConsumer:
+    """
+    Background thread that drains the durable results queue.
+
+    Messages are collected until RESULTS_BATCH_SIZE arrive or the oldest has
+    waited RESULTS_LINGER_MS, then applied in one transaction and acked with
+    multiple=True. If the database write fails transiently (connection, lock
+    wait, deadlock) the whole batch is nacked back onto the queue; the updates
+    are idempotent, so redelivery is harmless. Malformed messages and results
+    that fail permanently (found by re-applying the batch one by one) go to
+    RESULTS_DEAD_QUEUE instead, so they cannot block the queue.
+    Several API instances can run this side by side as competing consumers.
+    """
+
+    def __init__(self, host: str = RABBITMQ_HOST, port: int = RABBITMQ_PORT, queue: str = RESULTS_QUEUE,
+                 batch_size: int = RESULTS_BATCH_SIZE, linger_ms: float = RESULTS_LINGER_MS,
+                 dead_queue: str = RESULTS_DEAD_QUEUE):
+        self.params = pika.ConnectionParameters(host=host, port=port, heartbeat=30)
+        self.queue = queue
+        self.dead_queue = dead_queue
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self._pending: List = []  # (delivery_tag, body)
+        self._first_at = 0.0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vex-results", daemon=True)
+        self.applied = 0
+        self.rows_updated = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.malformed = 0
+        self.dead_lettered = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join(timeout=10)
+
+    def stats(self) -> Dict:
+        return {
+            "applied": self.applied,
+            "rows_updated": self.rows_updated,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "malformed": self.malformed,
+            "dead_lettered": self.dead_lettered,
+            "pending": len(self._pending),
+        }
+
+    def _on_message(self, channel, method, properties, body) -> None:
+        if not self._pending:
+            self._first_at = time.monotonic()
+        self._pending.append((method.delivery_tag, body))
+
+    def _dead_letter(self, channel, body: bytes, reason: str) -> None:
+        self.dead_lettered += 1
+        channel.basic_publish(
+            exchange="",
+            routing_key=self.dead_queue,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2, headers={"x-vex-reason": reason[:500]}),
+        )
+
+    def _flush(self, channel) -> None:
+        pending, self._pending = self._pending, []
+        last_tag = pending[-1][0]
+        parsed = []  # (body, result)
+        for _, body in pending:
+            result = parse_result(body)
+            if result is None:
+                self.malformed += 1
+                print("Dead-lettering malformed analysis result")
+                self._dead_letter(channel, body, "malformed")
+                continue
+            parsed.append((body, result))
+        try:
+            if parsed:
+                self.rows_updated += apply_analysis_results([result for _, result in parsed])
+            self.applied += len(parsed)
+        except Exception as e:
+            if is_transient_db_error(e):
+                self.failed_batches += 1
+                print(f"Applying {len(parsed)} analysis results failed, requeueing: {e}")
+                channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+                time.sleep(1)
+                return
+            # Permanent: apply one by one so only the offending results are set aside
+            try:
+                self._apply_individually(channel, parsed)
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"Applying analysis results failed, requeueing: {e}")
+                channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+                time.sleep(1)
+                return
+        self.batches += 1
+        channel.basic_ack(delivery_tag=last_tag, multiple=True)
+
+    def _apply_individually(self, channel, parsed: List) -> None:
+        """Raises only on a transient error; the caller then requeues (re-applying is idempotent)."""
+        for body, result in parsed:
+            try:
+                self.rows_updated += apply_analysis_results([result])
+                self.applied += 1
+            except Exception as e:
+                if is_transient_db_error(e):
+                    raise
+                print(f"Dead-lettering analysis result for {result['file_hash']}: {e}")
+                self._dead_letter(channel, body, str(e))
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = pika.BlockingConnection(self.params)
+                channel = connection.channel()
+                channel.queue_declare(queue=self.queue, durable=True)
+                channel.queue_declare(queue=self.dead_queue, durable=True)
+                # Never hold more unacked results than one batch
+                channel.basic_qos(prefetch_count=self.batch_size)
+                channel.basic_consume(queue=self.queue, on_message_callback=self._on_message)
+                while not self._stopping.is_set():
+                    connection.process_data_events(time_limit=self.linger)
+                    if self._pending and (len(self._pending) >= self.batch_size
+                                          or time.monotonic() - self._first_at >= self.linger):
+                        self._flush(channel)
+                if self._pending:
+                    self._flush(channel)
+                connection.close()
+            except Exception as e:
+                # Unacked deliveries go back to the queue with the connection
+                self._pending = []
+                if self._stopping.is_set():
+                    break
+                print(f"Analysis result consumer error, reconnecting: {e}")
+                time.sleep(2)
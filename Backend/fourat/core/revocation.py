@@ -0,0 +1,186 @@
+# core.revocation.py - per-instance set of revoked refresh tokens, kept in sync over RabbitMQ
+#
+# Refresh tokens are identified by the SHA-256 of their jti (database.fake_db.token_hash).
+# Every revocation (rotation, logout) is broadcast on a fanout exchange, so each
+# API instance can turn away a replayed or logged-out token without the DELETE
+# round-trip to MySQL. Only the revoked side is cached: a token not known to be
+# revoked always goes to MySQL, which stays authoritative.
+import hashlib
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import pika
+from core.config import (
+    RABBITMQ_HOST,
+    RABBITMQ_PORT,
+    AUTH_EVENTS_EXCHANGE,
+    REFRESH_CACHE_SIZE,
+    REVOKED_FILTER_CAPACITY,
+)
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over hex SHA-256 keys (the key already is a hash,
+    so its bytes supply the bit positions). Two generations: once the current
+    one holds `capacity` keys it becomes the previous one and a fresh filter
+    starts, which bounds the false-positive rate without ever clearing
+    recent revocations.
+    """
+
+    def __init__(self, capacity: int = REVOKED_FILTER_CAPACITY, bits_per_key: int = 10, hashes: int = 7):
+        self.capacity = capacity
+        self.size = max(64, capacity * bits_per_key)
+        self.hashes = hashes
+        self._current = bytearray(self.size // 8 + 1)
+        self._previous = bytearray(self.size // 8 + 1)
+        self._count = 0
+
+    def _positions(self, key: str):
+        digest = bytes.fromhex(key) if len(key) == 64 else hashlib.sha256(key.encode()).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], "big") % self.size
+
+    def add(self, key: str) -> None:
+        if self._count >= self.capacity:
+            self._previous, self._current = self._current, bytearray(self.size // 8 + 1)
+            self._count = 0
+        for pos in self._positions(key):
+            self._current[pos >> 3] |= 1 << (pos & 7)
+        self._count += 1
+
+    def might_contain(self, key: str) -> bool:
+        positions = list(self._positions(key))
+        for bits in (self._current, self._previous):
+            if all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+                return True
+        return False
+
+
+class RefreshTokenCache:
+    """
+    Recently revoked keys: a Bloom filter in front of an exact LRU bounded by
+    REFRESH_CACHE_SIZE. The filter keeps the common case (a key never
+    revoked) to a few bit tests; only a filter hit looks at the exact set.
+    """
+
+    def __init__(self, max_size: int = REFRESH_CACHE_SIZE):
+        self.max_size = max_size
+        self._revoked: "OrderedDict[str, None]" = OrderedDict()
+        self._revoked_filter = BloomFilter()
+        self._lock = threading.Lock()
+        self._stats = {"revoked_hits": 0, "filter_false_positives": 0, "misses": 0, "invalidations": 0}
+
+    def is_revoked(self, key: str) -> bool:
+        with self._lock:
+            if not self._revoked_filter.might_contain(key):
+                self._stats["misses"] += 1
+                return False
+            if key in self._revoked:
+                self._stats["revoked_hits"] += 1
+                return True
+            # A false positive, or a key evicted from the exact set: the DB decides
+            self._stats["filter_false_positives"] += 1
+            return False
+
+    def revoke(self, key: str) -> None:
+        with self._lock:
+            self._revoked_filter.add(key)
+            self._revoked[key] = None
+            self._revoked.move_to_end(key)
+            while len(self._revoked) > self.max_size:
+                self._revoked.popitem(last=False)
+            self._stats["invalidations"] += 1
+
+    def apply(self, event: Dict) -> None:
+        if event.get("type") == "revoke":
+            for key in event.get("keys", ()):
+                self.revoke(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"revoked": len(self._revoked), **self._stats}
+
+
+class RevocationBus:
+    """
+    One background thread owns a RabbitMQ connection: it publishes this
+    instance's revocations to AUTH_EVENTS_EXCHANGE and applies everyone's
+    (an exclusive queue per instance, so each gets every event). Local
+    revocations are applied to the cache immediately by publish(); the echo
+    from the broker is a harmless repeat.
+    """
+
+    def __init__(self, cache: RefreshTokenCache, host: str = RABBITMQ_HOST, port: int = RABBITMQ_PORT,
+                 exchange: str = AUTH_EVENTS_EXCHANGE):
+        self.cache = cache
+        self.params = pika.ConnectionParameters(host=host, port=port, heartbeat=30)
+        self.exchange = exchange
+        self._outgoing: "queue.Queue[dict]" = queue.Queue(maxsize=100000)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vex-revocations", daemon=True)
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join(timeout=5)
+
+    def publish(self, event: Dict) -> None:
+        self.cache.apply(event)
+        try:
+            self._outgoing.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def revoke(self, *keys: str) -> None:
+        self.publish({"type": "revoke", "keys": list(keys)})
+
+    def stats(self) -> Dict:
+        return {"published": self.published, "received": self.received, "dropped": self.dropped,
+                "backlog": self._outgoing.qsize()}
+
+    def _on_message(self, channel, method, properties, body) -> None:
+        try:
+            self.cache.apply(json.loads(body))
+            self.received += 1
+        except (ValueError, KeyError, TypeError):
+            print("Dropping malformed auth event")
+
+    def _run(self) -> None:
+        pending: Optional[dict] = None
+        while not self._stopping.is_set():
+            try:
+                connection = pika.BlockingConnection(self.params)
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type="fanout")
+                result = channel.queue_declare(queue="", exclusive=True)
+                channel.queue_bind(exchange=self.exchange, queue=result.method.queue)
+                channel.basic_consume(queue=result.method.queue, on_message_callback=self._on_message, auto_ack=True)
+                while not self._stopping.is_set():
+                    connection.process_data_events(time_limit=0.05)
+                    while True:
+                        if pending is None:
+                            try:
+                                pending = self._outgoing.get_nowait()
+                            except queue.Empty:
+                                break
+                        channel.basic_publish(exchange=self.exchange, routing_key="", body=json.dumps(pending).encode())
+                        pending = None
+                        self.published += 1
+                connection.close()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"Auth event bus error, reconnecting: {e}")
+                time.sleep(2)
+
+
+refresh_cache = RefreshTokenCache()
+revocation_bus = RevocationBus(refresh_cache)
@@ -0,0 +1,48 @@
+# core.sample_store.py - content-addressed sample store: each distinct SHA-256 is kept on disk exactly once
+import os
+import uuid
+from typing import Tuple
+
+
+class SampleStore:
+    """
+    Blobs live at <root>/sha256/<ab>/<cd>/<full hex digest>.
+    Uploads are streamed into <root>/.incoming first and moved into place once
+    their hash is known, so a blob path always matches its content.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.incoming_dir = os.path.join(root, ".incoming")
+
+    def new_temp_path(self) -> str:
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        return os.path.join(self.incoming_dir, f"{uuid.uuid4().hex}.part")
+
+    def relpath(self, sha256: str) -> str:
+        """Path relative to the store root; this is what goes into files.stored_path."""
+        sha256 = sha256.lower()
+        return "/".join(("sha256", sha256[:2], sha256[2:4], sha256))
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, *self.relpath(sha256).split("/"))
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def commit(self, temp_path: str, sha256: str) -> Tuple[str, bool]:
+        """
+        Move a fully written temp file to its content address.
+        Returns (relpath, created); created is False when the blob was already
+        stored, in which case the temp copy is discarded.
+        """
+        final_path = self.path(sha256)
+        if os.path.exists(final_path):
+            if os.path.exists(temp_path):  # gone if an earlier attempt already committed it
+                os.remove(temp_path)
+            return self.relpath(sha256), False
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Same filesystem, so this is a rename rather than a copy; a concurrent
+        # commit of the same digest just replaces identical bytes.
+        os.replace(temp_path, final_path)
+        return self.relpath(sha256), True
@@ -6,15 +6,21 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose.exceptions import ExpiredSignatureError
 from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from typing import Optional
+from core.token_cache import token_cache
 from datetime import datetime
+import secrets
 from database.fake_db import (
+    token_hash,
     store_refresh_token,
     is_refresh_token_present,
+    rotate_refresh_token_db,
     revoke_refresh_token_db,
     revoke_all_refresh_tokens_for_user_db,
 )
+from core.revocation import refresh_cache, revocation_bus
 
 security = HTTPBearer()  # class provides HTTP Bearer authentication for FastAPI routes
+optional_security = HTTPBearer(auto_error=False)  # same, but lets the route fall back to other credentials
 
 
 def create_access_token(user_id: int, email: str, username: Optional[str] = None):
@@ -29,28 +35,60 @@ def create_access_token(user_id: int, email: str, username: Optional[str] = None
         payload["username"] = username
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def create_refresh_token(user_id: int):
+def _new_refresh_token(user_id: int):
+    """(token, key, expires_at) for a fresh refresh token; key is what the DB stores."""
+    jti = secrets.token_urlsafe(12)  # short id: the DB and caches key on sha256(jti)
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     payload = {
         "sub": str(user_id),
         "type": "refresh",
-        "exp": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        "jti": jti,
+        "exp": expires_at
     }
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM), token_hash(jti), expires_at
+
+def _refresh_key(token: str, payload: dict) -> str:
+    # Tokens issued before jtis were stored by the hash of the whole token
+    return token_hash(payload["jti"]) if payload.get("jti") else token_hash(token)
+
+def create_refresh_token(user_id: int):
+    token, key, expires_at = _new_refresh_token(user_id)
     # Persist token in DB so it survives restarts and can be revoked across instances
-    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     try:
-        store_refresh_token(token, user_id, expires_at)
+        store_refresh_token(key, user_id, expires_at)
     except Exception:
         # best-effort: if DB write fails, token may not be revocable
         pass
     return token
 
+def rotate_refresh_token(token: str):
+    """
+    Exchange a refresh token for a new one: one DB transaction that deletes the
+    old row and inserts the new one. Returns (user_id, new_token); a token that
+    was already used or revoked is rejected, without the DB round-trip if
+    any instance has broadcast its revocation.
+    """
+    payload = _decode_refresh_token(token)
+    user_id = int(payload["sub"])
+    old_key = _refresh_key(token, payload)
+    if refresh_cache.is_revoked(old_key):
+        raise HTTPException(status_code=401, detail="Refresh token revoked or unknown")
+
+    new_token, new_key, expires_at = _new_refresh_token(user_id)
+    if not rotate_refresh_token_db(old_key, new_key, user_id, expires_at):
+        raise HTTPException(status_code=401, detail="Refresh token revoked or unknown")
+    revocation_bus.revoke(old_key)
+    return user_id, new_token
+
 def revoke_refresh_token(token: str):
-    """Revoke a refresh token (remove from refresh store)."""
-    revoke_refresh_token_db(token)
+    """Revoke a refresh token (remove from refresh store) on every instance."""
+    key = _refresh_key(token, jwt.get_unverified_claims(token))
+    revoke_refresh_token_db(key)
+    revocation_bus.revoke(key)
 
 def revoke_all_refresh_tokens_for_user(user_id: int):
     """Revoke all refresh tokens for a user (useful for forced logout)."""
+    # Their keys are not known here; the rows are gone, so every instance's DB check rejects them
     revoke_all_refresh_tokens_for_user_db(user_id)
 
 def _token_belongs_to_user(token: str, user_id: int) -> bool:
@@ -60,29 +98,48 @@ def _token_belongs_to_user(token: str, user_id: int) -> bool:
     except Exception:
         return False
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-):  # Get current user from token
+def _user_from_access_token(token: str):
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
         # Verify token type
         if payload.get("type") != "access":
             raise HTTPException(status_code=401, detail="Invalid token type")
 
         # Convert subject to int here so downstream code can rely on int id
-        return {
+        user = {
             "id": int(payload["sub"]),
             "email": payload["email"],
             "username": payload.get("username")
         }
+        token_cache.put(token, float(payload["exp"]), user)
+        return user
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def verify_refresh_token(token: str):
-    # Verify signature and expiry, and make sure token is in the refresh store
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):  # Get current user from token
+    return _user_from_access_token(credentials.credentials)
+
+def get_current_user_for_stream(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    """Like get_current_user, but also accepts ?token= (browser EventSource cannot send headers)."""
+    if credentials is not None:
+        return _user_from_access_token(credentials.credentials)
+    if token:
+        return _user_from_access_token(token)
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+def _decode_refresh_token(token: str) -> dict:
+    # Verify signature and expiry
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except ExpiredSignatureError:
@@ -92,8 +149,15 @@ def verify_refresh_token(token: str):
 
     if payload.get("type") != "refresh":
         raise HTTPException(status_code=401, detail="Invalid token type")
-    # Check presence in DB and expiration (DB check compares expires_at > NOW())
-    if not is_refresh_token_present(token):
+    return payload
+
+def verify_refresh_token(token: str):
+    payload = _decode_refresh_token(token)
+    user_id = int(payload["sub"])
+    key = _refresh_key(token, payload)
+
+    # Known revocations are rejected locally; otherwise the DB (expires_at > NOW()) decides
+    if refresh_cache.is_revoked(key) or not is_refresh_token_present(key):
         raise HTTPException(status_code=401, detail="Refresh token revoked or unknown")
 
-    return int(payload["sub"])
\ No newline at end of file
+    return user_id
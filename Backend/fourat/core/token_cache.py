@@ -0,0 +1,83 @@
+# core.token_cache.py - bounded, expiry-aware LRU of verified access tokens
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from core.config import TOKEN_CACHE_SIZE, TOKEN_CACHE_ENABLED
+
+
+class VerifiedTokenCache:
+    """
+    Maps sha256(token) -> (exp, user claims) for access tokens that already
+    passed signature and expiry checks, so repeat requests with the same
+    token skip jwt.decode. Entries are dropped at the token's own exp (a hit
+    on an expired entry counts as a miss and falls through to decode, which
+    reports the expiry) and the least recently used go first once full.
+    Only successful verifications are cached.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, enabled: bool = TOKEN_CACHE_ENABLED):
+        self.max_size = max_size
+        self.enabled = enabled
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            exp, user = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return dict(user)
+
+    def put(self, token: str, exp: float, user: Dict) -> None:
+        if not self.enabled or exp <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, dict(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+token_cache = VerifiedTokenCache()
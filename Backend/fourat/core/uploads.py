@@ -0,0 +1,281 @@
+# core.uploads.py - resumable chunked uploads: sessions on disk, chunks written in place, SHA-256 as they line up
+#
+# Each session is a directory under the sample store's incoming area holding
+# data.part (pre-sized to the full sample) and session.json. Chunk i covers
+# bytes [i * chunk_size, (i + 1) * chunk_size) and is written straight to its
+# offset, so chunks may arrive in any order and in parallel, and finishing is
+# a rename of data.part into the content-addressed store: no assembly copy.
+# session.json records which chunks arrived, so after a restart the client
+# asks for the status and re-sends only what is missing.
+#
+# Several API processes (uvicorn workers) may serve the same session: every
+# chunk and every completion re-reads session.json under an exclusive flock
+# on session.lock, and a completion additionally holds complete.lock so only
+# one process registers the sample.
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Optional
+from core.config import UPLOAD_SESSION_CHUNK, UPLOAD_MAX_SIZE, UPLOAD_SESSION_TTL
+
+
+class UploadError(Exception):
+    """Client-side problem with an upload session (bad chunk, checksum mismatch, incomplete)."""
+
+
+class UploadBusy(UploadError):
+    """Another request is completing the same upload right now."""
+
+
+class UploadSession:
+    """
+    State of one upload. The running SHA-256 covers chunks 0..hashed-1: each
+    time the next chunk in order is present it is read back (from the page
+    cache, right after being written) and fed to the digest. hashlib state
+    cannot be saved, so after a restart the digest restarts from chunk 0.
+    Chunks are never rewritten once received, so a digest kept by one
+    process stays valid while others add chunks.
+    """
+
+    def __init__(self, directory: str, meta: Dict):
+        self.directory = directory
+        self.load(meta)
+        self.lock = threading.Lock()
+        self._sha256 = hashlib.sha256()
+        self._hashed = 0
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.directory, "data.part")
+
+    def chunk_range(self, index: int):
+        start = index * self.meta["chunk_size"]
+        return start, min(start + self.meta["chunk_size"], self.meta["size"])
+
+    def load(self, meta: Dict) -> None:
+        self.meta = meta
+        self.received = set(meta["received"])
+
+    def reload(self) -> None:
+        """Re-read session.json, which another process may have updated."""
+        try:
+            with open(os.path.join(self.directory, "session.json")) as f:
+                self.load(json.load(f))
+        except FileNotFoundError:
+            raise UploadError("Upload was completed or aborted")
+
+    def missing(self) -> List[int]:
+        return [i for i in range(self.meta["chunk_count"]) if i not in self.received]
+
+    def status(self) -> Dict:
+        missing = self.missing()
+        return {
+            "upload_id": self.id,
+            "filename": self.meta["filename"],
+            "size": self.meta["size"],
+            "chunk_size": self.meta["chunk_size"],
+            "chunk_count": self.meta["chunk_count"],
+            "received": len(self.received),
+            "missing": missing,
+            "complete": not missing,
+        }
+
+    def save(self) -> None:
+        self.meta["received"] = sorted(self.received)
+        self.meta["updated_at"] = time.time()
+        tmp = os.path.join(self.directory, "session.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.directory, "session.json"))
+
+    def advance_hash(self) -> None:
+        if self._hashed not in self.received:
+            return
+        with open(self.data_path, "rb") as f:
+            while self._hashed in self.received and self._hashed < self.meta["chunk_count"]:
+                start, end = self.chunk_range(self._hashed)
+                f.seek(start)
+                self._sha256.update(f.read(end - start))
+                self._hashed += 1
+
+    def sha256(self) -> Optional[str]:
+        """Final digest once every chunk has been hashed, else None."""
+        if self._hashed < self.meta["chunk_count"]:
+            return None
+        return self._sha256.hexdigest()
+
+
+class UploadManager:
+    """
+    Upload sessions stored under `root`, shared by every API process that
+    uses the same directory. All methods block on disk I/O (and on other
+    processes' session locks) and are meant to run on the I/O executor.
+    """
+
+    def __init__(self, root: str, chunk_size: int = UPLOAD_SESSION_CHUNK, max_size: int = UPLOAD_MAX_SIZE,
+                 ttl: float = UPLOAD_SESSION_TTL):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, filename: str, size: int, sha256: Optional[str] = None) -> UploadSession:
+        if size <= 0 or size > self.max_size:
+            raise UploadError(f"Size must be between 1 and {self.max_size} bytes")
+        self.purge_expired()
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "data.part"), "wb") as f:
+            f.truncate(size)  # sparse on most filesystems; chunks fill it in place
+        session = UploadSession(directory, {
+            "id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "chunk_size": self.chunk_size,
+            "chunk_count": -(-size // self.chunk_size),
+            "received": [],
+            "created_at": time.time(),
+        })
+        session.save()
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str, user_id: int) -> Optional[UploadSession]:
+        """
+        Session owned by user_id, with its state as on disk (another process
+        may have changed it). The in-memory object, and so its running
+        digest, is reused when this process has seen the session before.
+        """
+        if not upload_id.isalnum():
+            return None
+        directory = os.path.join(self.root, upload_id)
+        try:
+            with open(os.path.join(directory, "session.json")) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self._sessions.pop(upload_id, None)
+            return None
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                session = self._sessions[upload_id] = UploadSession(directory, meta)
+        if session.lock.acquire(blocking=False):
+            try:
+                session.load(meta)
+            finally:
+                session.lock.release()
+        return session if meta["user_id"] == user_id else None
+
+    @contextmanager
+    def _locked(self, session: UploadSession):
+        """Exclusive across threads and processes, with session state re-read from disk."""
+        with session.lock:
+            try:
+                f = open(os.path.join(session.directory, "session.lock"), "a")
+            except FileNotFoundError:
+                raise UploadError("Upload was completed or aborted")
+            with f:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+                session.reload()
+                yield
+
+    def write_chunk(self, session: UploadSession, index: int, data: bytes, checksum: Optional[str]) -> Dict:
+        """Verify a chunk against its SHA-256 and write it at its offset; re-sending a chunk is a no-op."""
+        if not 0 <= index < session.meta["chunk_count"]:
+            raise UploadError("Chunk index out of range")
+        if index in session.received:
+            return session.status()  # a retry after a lost response; the bytes may already be hashed
+        start, end = session.chunk_range(index)
+        if len(data) != end - start:
+            raise UploadError(f"Chunk {index} must be {end - start} bytes")
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise UploadError(f"Checksum mismatch for chunk {index}")
+
+        # Outside the lock, so chunks are written in parallel; the checksum makes
+        # a concurrent duplicate of this chunk byte-identical
+        fd = os.open(session.data_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, start)
+        finally:
+            os.close(fd)
+        with self._locked(session):
+            session.received.add(index)
+            session.save()
+            session.advance_hash()
+            return session.status()
+
+    def claim(self, session: UploadSession) -> BinaryIO:
+        """
+        Lock the session for completion; close the returned file to release it.
+        Raises UploadBusy if another request (in any process) holds it. A
+        process that dies mid-completion releases it, so a retry can proceed.
+        """
+        try:
+            f = open(os.path.join(session.directory, "complete.lock"), "a")
+        except FileNotFoundError:
+            raise UploadError("Upload was completed or aborted")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            raise UploadBusy("Upload is already being completed")
+        return f
+
+    def finish(self, session: UploadSession) -> str:
+        """
+        Check the upload is complete and return its SHA-256; data.part is then
+        ready to commit. The digest is recorded in session.json first, so a
+        retry after data.part was already moved into the store still succeeds.
+        """
+        with self._locked(session):
+            if session.meta.get("digest"):
+                return session.meta["digest"]
+            if session.missing():
+                raise UploadError("Upload is incomplete")
+            session.advance_hash()
+            digest = session.sha256()
+            if session.meta["sha256"] and digest != session.meta["sha256"]:
+                raise UploadError("SHA-256 of the assembled file does not match")
+            session.meta["digest"] = digest
+            session.save()
+        return digest
+
+    def discard(self, session: UploadSession) -> None:
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Remove sessions untouched for longer than the TTL (also those of other, restarted processes)."""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, "session.json")
+            try:
+                if os.path.getmtime(meta_path) < cutoff:
+                    with self._lock:
+                        self._sessions.pop(name, None)
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
@@ -1,26 +1,23 @@
-import mysql.connector
 from mysql.connector import Error as MySQLError
-import os
 from typing import Optional, Dict
 from datetime import datetime
+from collections import OrderedDict
+import threading
+import time
 import traceback
+import hashlib
 
-# Database connection configuration
-DB_CONFIG = {
-    # Default to localhost for host-based development. When running in Docker
-    # Compose use environment DB_HOST=db so services can resolve by name.
-    "host": os.getenv("DB_HOST", "localhost"),
-    "user": os.getenv("DB_USER", "vexuser"),
-    "password": os.getenv("DB_PASS", "vexpass"),
-    "database": os.getenv("DB_NAME", "vex"),
-}
+from core.config import USER_CACHE_TTL, USER_CACHE_SIZE
+from database.pool import get_pool
 
+# Connection settings live in core/config.py; every connection comes from the
+# shared pool in database/pool.py.
 
 
 def get_db():
-    """Get a MySQL database connection"""
+    """Borrow a MySQL connection from the shared pool (close() returns it)"""
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        return get_pool().get_connection()
     except MySQLError as e:
         print(f"Database connection error: {e}")
         raise
@@ -39,7 +36,78 @@ def get_user_by_email(email: str) -> Optional[Dict]:
         print(f"Error fetching user: {e}")
         return None
 
+class UserProfileCache:
+    """
+    id -> (cached_until, profile) for get_user_by_id: /me on every page load
+    and /refresh every few minutes per session read the same rows. Entries
+    live USER_CACHE_TTL seconds and are dropped explicitly whenever this
+    process writes the user. Misses are not cached, so a failed query or a
+    user created meanwhile is always looked up again.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate(), so a read racing an update is not cached
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int):
+        """(profile or None, generation to hand back to put())"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return dict(entry[1]), self._generation
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, user_id: int, profile: Dict, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation or self.ttl <= 0:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(profile))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserProfileCache()
+
 def get_user_by_id(user_id: int) -> Optional[Dict]:
+    """Fetch user by ID, from the profile cache when possible"""
+    user, generation = user_cache.get(user_id)
+    if user is not None:
+        return user
+    user = get_user_by_id_db(user_id)
+    if user is not None:
+        user_cache.put(user_id, user, generation)
+    return user
+
+def get_user_by_id_db(user_id: int) -> Optional[Dict]:
     """Fetch user from database by ID"""
     try:
         conn = get_db()
@@ -64,6 +132,7 @@ def create_user(username: str, email: str, password_hash: str) -> Optional[int]:
         )
         conn.commit()
         user_id = cursor.lastrowid
+        user_cache.invalidate(user_id)
         cursor.close()
         conn.close()
         return user_id
@@ -72,19 +141,44 @@ def create_user(username: str, email: str, password_hash: str) -> Optional[int]:
         return None
 
 
+def update_password_hash(user_id: int, password_hash: str) -> bool:
+    """Replace a user's password hash (transparent rehash after a cost change)"""
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
+        conn.commit()
+        user_cache.invalidate(user_id)
+        cursor.close()
+        conn.close()
+        return True
+    except MySQLError as e:
+        print(f"Error updating password hash: {e}")
+        return False
+
+
 def user_exists(email: str) -> bool:
     """Check if user exists by email"""
     return get_user_by_email(email) is not None
 
 
-def store_refresh_token(token: str, user_id: int, expires_at: datetime) -> bool:
-    """Store a refresh token in the database."""
+def token_hash(value: str) -> str:
+    """
+    Refresh tokens are stored by the SHA-256 of their jti (same value as
+    MySQL's SHA2(jti, 256)); tokens issued before jtis existed were stored by
+    the SHA-256 of the whole token, which core.security still accepts.
+    """
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def store_refresh_token(key: str, user_id: int, expires_at: datetime) -> bool:
+    """Store a refresh token (by its key, see token_hash) in the database."""
     try:
         conn = get_db()
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO refresh_tokens (token, user_id, expires_at) VALUES (%s, %s, %s)",
-            (token, user_id, expires_at.strftime("%Y-%m-%d %H:%M:%S")),
+            "INSERT INTO refresh_tokens (token_hash, user_id, expires_at) VALUES (%s, %s, %s)",
+            (key, user_id, expires_at.strftime("%Y-%m-%d %H:%M:%S")),
         )
         conn.commit()
         cursor.close()
@@ -96,14 +190,14 @@ def store_refresh_token(token: str, user_id: int, expires_at: datetime) -> bool:
         return False
 
 
-def is_refresh_token_present(token: str) -> bool:
+def is_refresh_token_present(key: str) -> bool:
     """Return True if the refresh token exists and has not expired."""
     try:
         conn = get_db()
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT COUNT(1) FROM refresh_tokens WHERE token = %s AND expires_at > NOW()",
-            (token,)
+            "SELECT COUNT(1) FROM refresh_tokens WHERE token_hash = %s AND expires_at > NOW()",
+            (key,)
         )
         row = cursor.fetchone()
         cursor.close()
@@ -114,12 +208,12 @@ def is_refresh_token_present(token: str) -> bool:
         return False
 
 
-def get_user_id_for_refresh(token: str) -> Optional[int]:
+def get_user_id_for_refresh(key: str) -> Optional[int]:
     """Return the user_id associated with a refresh token, or None."""
     try:
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM refresh_tokens WHERE token = %s", (token,))
+        cursor.execute("SELECT user_id FROM refresh_tokens WHERE token_hash = %s", (key,))
         row = cursor.fetchone()
         cursor.close()
         conn.close()
@@ -129,12 +223,47 @@ def get_user_id_for_refresh(token: str) -> Optional[int]:
         return None
 
 
-def revoke_refresh_token_db(token: str) -> None:
+def rotate_refresh_token_db(old_key: str, new_key: str, user_id: int, expires_at: datetime) -> bool:
+    """
+    Swap a refresh token for a new one in a single transaction. The DELETE
+    doubles as the validity check: if the old token is unknown, expired,
+    revoked or already rotated (a replay), nothing is inserted and False is returned.
+    """
+    conn = None
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM refresh_tokens WHERE token_hash = %s AND user_id = %s AND expires_at > NOW()",
+            (old_key, user_id)
+        )
+        if cursor.rowcount != 1:
+            conn.rollback()
+            cursor.close()
+            return False
+        cursor.execute(
+            "INSERT INTO refresh_tokens (token_hash, user_id, expires_at) VALUES (%s, %s, %s)",
+            (new_key, user_id, expires_at.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        conn.commit()
+        cursor.close()
+        return True
+    except MySQLError as e:
+        print(f"Error rotating refresh token: {e}")
+        if conn is not None:
+            conn.rollback()
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def revoke_refresh_token_db(key: str) -> None:
     """Delete a refresh token from the database."""
     try:
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM refresh_tokens WHERE token = %s", (token,))
+        cursor.execute("DELETE FROM refresh_tokens WHERE token_hash = %s", (key,))
         conn.commit()
         cursor.close()
         conn.close()
@@ -153,3 +282,23 @@ def revoke_all_refresh_tokens_for_user_db(user_id: int) -> None:
         conn.close()
     except MySQLError as e:
         print(f"Error revoking all refresh tokens for user {user_id}: {e}")
+
+
+def purge_expired_refresh_tokens(batch_size: int) -> int:
+    """Delete up to batch_size expired refresh tokens (oldest first); returns rows deleted."""
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM refresh_tokens WHERE expires_at <= NOW() ORDER BY expires_at LIMIT %s",
+            (batch_size,)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return deleted
+    except MySQLError as e:
+        print(f"Error purging expired refresh tokens: {e}")
+        return 0
+
@@ -0,0 +1,474 @@
+import base64
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+from database.fake_db import get_db
+
+# Preference order when several analyses exist for the same SHA-256:
+# a finished verdict beats one in flight, and failed runs are never reused.
+REUSABLE_STATUSES = ("finished", "running", "pending")
+
+
+def find_reusable_analysis(cursor, file_hash: str) -> Optional[Dict]:
+    """Return the best existing analysis for a sample hash, or None."""
+    cursor.execute(
+        """SELECT a.id, a.file_id, a.status, a.score
+           FROM files f
+           JOIN analyses a ON a.file_id = f.id
+           WHERE f.file_hash = %s AND a.status IN (%s, %s, %s)
+           ORDER BY FIELD(a.status, %s, %s, %s), a.id DESC
+           LIMIT 1""",
+        (file_hash, *REUSABLE_STATUSES, *REUSABLE_STATUSES),
+    )
+    return cursor.fetchone()
+
+
+def lock_sample_hashes(cursor, hashes: List[str]) -> None:
+    """
+    Serialize registrations of the same SHA-256 for the rest of the
+    transaction: the upsert holds an exclusive lock on each sample_hashes
+    row until commit, so a concurrent first upload of the hash waits here
+    and then finds this one's analysis instead of queueing a second run.
+    Hashes are locked in sorted order so overlapping batches cannot deadlock.
+    """
+    cursor.executemany(
+        """INSERT INTO sample_hashes (file_hash) VALUES (%s)
+           ON DUPLICATE KEY UPDATE file_hash = file_hash""",
+        [(file_hash,) for file_hash in sorted(set(hashes))]
+    )
+
+
+def register_sample(user_id: int, filename: str, stored_path: str, file_hash: str, file_size: int) -> Dict:
+    """
+    Record an upload and its analysis row in one transaction.
+
+    If the same SHA-256 was analysed before, the new analysis row copies the
+    finished verdict ("cached"), or mirrors the run still in flight
+    ("attached") so the result is applied to it when that run completes.
+    Only samples with no reusable analysis come back with reuse=None and
+    need a sandbox run.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # The lookup runs after the lock, so it sees any registration that won the race
+        lock_sample_hashes(cursor, [file_hash])
+        previous = find_reusable_analysis(cursor, file_hash)
+
+        cursor.execute(
+            """INSERT INTO files (user_id, filename, stored_path, file_hash, file_size)
+               VALUES (%s, %s, %s, %s, %s)""",
+            (user_id, filename, stored_path, file_hash, file_size)
+        )
+        file_id = cursor.lastrowid
+
+        if previous and previous["status"] == "finished":
+            # Reports are content-addressed, so the copy just shares the pointer
+            cursor.execute(
+                """INSERT INTO analyses (file_id, status, score, summary, report_ref, report_size, analyzed_at)
+                   SELECT %s, status, score, summary, report_ref, report_size, analyzed_at
+                   FROM analyses WHERE id = %s""",
+                (file_id, previous["id"])
+            )
+            reuse = "cached"
+            status = "finished"
+        elif previous:
+            cursor.execute(
+                """INSERT INTO analyses (file_id, status) VALUES (%s, %s)""",
+                (file_id, previous["status"])
+            )
+            reuse = "attached"
+            status = previous["status"]
+        else:
+            cursor.execute(
+                """INSERT INTO analyses (file_id, status) VALUES (%s, %s)""",
+                (file_id, "pending")
+            )
+            reuse = None
+            status = "pending"
+        analysis_id = cursor.lastrowid
+
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "file_id": file_id,
+        "analysis_id": analysis_id,
+        "status": status,
+        "score": previous["score"] if reuse == "cached" else None,
+        "reuse": reuse,
+        "reused_file_id": previous["file_id"] if previous else None,
+    }
+
+
+def register_samples(user_id: int, samples: List[Dict], batch_id: str) -> List[Dict]:
+    """
+    Batch version of register_sample: one transaction, one lookup of reusable
+    analyses for every hash and multi-row INSERTs for files and analyses.
+
+    samples: [{"filename", "stored_path", "file_hash", "file_size"}]. Returns
+    one record per sample, in order, shaped like register_sample's plus
+    stored_path/file_hash. A hash repeated within the batch is run once; the
+    later copies are attached to the first.
+    """
+    if not samples:
+        return []
+    hashes = list(dict.fromkeys(s["file_hash"] for s in samples))
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        lock_sample_hashes(cursor, hashes)
+        placeholders = ", ".join(["%s"] * len(hashes))
+        # One preferred analysis per hash (same order as find_reusable_analysis),
+        # picked in SQL so the summary is only read for the rows kept
+        cursor.execute(
+            f"""SELECT best.file_hash, a.id, a.file_id, a.status, a.score, a.summary,
+                       a.report_ref, a.report_size, a.analyzed_at
+                FROM (
+                    SELECT f.file_hash, a.id,
+                           ROW_NUMBER() OVER (PARTITION BY f.file_hash
+                                              ORDER BY FIELD(a.status, %s, %s, %s), a.id DESC) AS pick
+                    FROM files f
+                    JOIN analyses a ON a.file_id = f.id
+                    WHERE f.file_hash IN ({placeholders}) AND a.status IN (%s, %s, %s)
+                ) best
+                JOIN analyses a ON a.id = best.id
+                WHERE best.pick = 1""",
+            (*REUSABLE_STATUSES, *hashes, *REUSABLE_STATUSES),
+        )
+        previous: Dict[str, Dict] = {row["file_hash"]: row for row in cursor.fetchall()}
+
+        # mysql-connector sends executemany INSERTs as one multi-row statement
+        cursor.executemany(
+            """INSERT INTO files (user_id, filename, stored_path, file_hash, file_size, batch_id)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            [(user_id, s["filename"], s["stored_path"], s["file_hash"], s["file_size"], batch_id) for s in samples]
+        )
+        cursor.execute("SELECT id FROM files WHERE batch_id = %s ORDER BY id", (batch_id,))
+        file_ids = [row["id"] for row in cursor.fetchall()]
+
+        records = []
+        analyses = []
+        for sample, file_id in zip(samples, file_ids):
+            prev = previous.get(sample["file_hash"])
+            if prev and prev["status"] == "finished":
+                analyses.append((file_id, "finished", prev["score"], prev["summary"], prev["report_ref"],
+                                 prev["report_size"], prev["analyzed_at"]))
+                reuse = "cached"
+            elif prev:
+                analyses.append((file_id, prev["status"], None, None, None, None, None))
+                reuse = "attached"
+            else:
+                analyses.append((file_id, "pending", None, None, None, None, None))
+                reuse = None
+                # Later copies of this hash in the batch attach to this run
+                previous[sample["file_hash"]] = {"file_id": file_id, "status": "pending", "score": None}
+            records.append({
+                "file_id": file_id,
+                "status": analyses[-1][1],
+                "score": prev["score"] if reuse == "cached" else None,
+                "reuse": reuse,
+                "reused_file_id": prev["file_id"] if prev else None,
+                "stored_path": sample["stored_path"],
+                "file_hash": sample["file_hash"],
+            })
+
+        cursor.executemany(
+            """INSERT INTO analyses (file_id, status, score, summary, report_ref, report_size, analyzed_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            analyses
+        )
+        placeholders = ", ".join(["%s"] * len(file_ids))
+        cursor.execute(f"SELECT id, file_id FROM analyses WHERE file_id IN ({placeholders})", tuple(file_ids))
+        analysis_ids = {row["file_id"]: row["id"] for row in cursor.fetchall()}
+        for record in records:
+            record["analysis_id"] = analysis_ids[record["file_id"]]
+
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return records
+
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque keyset cursor for the position just after `row` in (uploaded_at, id) DESC order."""
+    raw = f"{row['uploaded_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    uploaded_at, file_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(uploaded_at), int(file_id)
+
+
+def list_user_files(user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of a user's files, newest first, with their analysis status.
+    Keyset pagination on (uploaded_at, id): each page is an index range scan
+    that starts where the previous one ended, however deep the history.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    params = [user_id]
+    after = ""
+    if cursor:
+        uploaded_at, file_id = decode_cursor(cursor)
+        after = "AND (f.uploaded_at < %s OR (f.uploaded_at = %s AND f.id < %s))"
+        params += [uploaded_at, uploaded_at, file_id]
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    conn = get_db()
+    try:
+        cursor_ = conn.cursor(dictionary=True)
+        cursor_.execute(
+            f"""SELECT f.id, f.filename, f.file_size, f.uploaded_at, a.status, a.score 
+               FROM files f
+               LEFT JOIN analyses a ON f.id = a.file_id
+               WHERE f.user_id = %s {after}
+               ORDER BY f.uploaded_at DESC, f.id DESC
+               LIMIT %s""",
+            params
+        )
+        files = cursor_.fetchall()
+        cursor_.close()
+    finally:
+        conn.close()
+
+    if len(files) > limit:
+        files = files[:limit]
+        return files, encode_cursor(files[-1])
+    return files, None
+
+
+def get_analysis_for_user(file_id: int, user_id: int) -> Optional[Dict]:
+    """
+    Analysis status for a file, only if the file belongs to user_id.
+    Deliberately excludes the report: it is served by get_report_for_user.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """SELECT a.id, a.file_id, a.status, a.score, a.summary, a.analyzed_at,
+                      a.report_size, a.report_ref IS NOT NULL AS has_report, UNIX_TIMESTAMP(a.updated_at) AS updated_ts,
+                      f.user_id, f.file_hash
+               FROM analyses a
+               JOIN files f ON a.file_id = f.id
+               WHERE a.file_id = %s AND f.user_id = %s""",
+            (file_id, user_id)
+        )
+        analysis = cursor.fetchone()
+        cursor.close()
+        return analysis
+    finally:
+        conn.close()
+
+
+def get_report_for_user(file_id: int, user_id: int) -> Optional[Dict]:
+    """report_ref/report_size for a file's analysis, only if the file belongs to user_id."""
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """SELECT a.report_ref, a.report_size FROM analyses a
+               JOIN files f ON a.file_id = f.id
+               WHERE a.file_id = %s AND f.user_id = %s""",
+            (file_id, user_id)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+    finally:
+        conn.close()
+
+
+# Result messages only ever move an analysis forward: replays and stale
+# stage transitions match no rows. A finished verdict may still replace an
+# error that was fanned out from a different run of the same sample.
+_RESULT_STATUS_RANK = {"running": 0, "error": 1, "finished": 2}
+
+
+def _coalesce_results(results: List[Dict]) -> List[Dict]:
+    """Keep the most advanced message per sample hash within a batch."""
+    latest: Dict[str, Dict] = {}
+    for result in results:
+        key = result["file_hash"]
+        prev = latest.get(key)
+        if prev is None or _RESULT_STATUS_RANK[result["status"]] >= _RESULT_STATUS_RANK[prev["status"]]:
+            latest[key] = result
+    return list(latest.values())
+
+
+def apply_analysis_results(results: List[Dict]) -> int:
+    """
+    Apply a batch of worker result messages in a single transaction.
+
+    Updates are keyed by file_hash, so analyses attached to the run (see
+    register_sample) get the same verdict. Returns the number of rows changed.
+    """
+    batch = _coalesce_results(results)
+    running = [(r["file_hash"],) for r in batch if r["status"] == "running"]
+    finished = [
+        (r.get("score"), r.get("summary"), r.get("report_ref"), r.get("report_size"), r.get("analyzed_at"), r["file_hash"])
+        for r in batch if r["status"] == "finished"
+    ]
+    failed = [(r.get("summary"), r.get("analyzed_at"), r["file_hash"]) for r in batch if r["status"] == "error"]
+
+    changed = 0
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        if running:
+            cursor.executemany(
+                """UPDATE analyses a JOIN files f ON a.file_id = f.id
+                   SET a.status = 'running'
+                   WHERE f.file_hash = %s AND a.status = 'pending'""",
+                running
+            )
+            changed += cursor.rowcount
+        if finished:
+            cursor.executemany(
+                """UPDATE analyses a JOIN files f ON a.file_id = f.id
+                   SET a.status = 'finished', a.score = %s, a.summary = %s,
+                       a.report_ref = %s, a.report_size = %s, a.analyzed_at = %s
+                   WHERE f.file_hash = %s AND a.status <> 'finished'""",
+                finished
+            )
+            changed += cursor.rowcount
+        if failed:
+            cursor.executemany(
+                """UPDATE analyses a JOIN files f ON a.file_id = f.id
+                   SET a.status = 'error', a.summary = %s, a.analyzed_at = %s
+                   WHERE f.file_hash = %s AND a.status IN ('pending', 'running')""",
+                failed
+            )
+            changed += cursor.rowcount
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return changed
+
+
+# Stuck analyses the sweeper may act on. Running rows past the deadline lost
+# their worker. Pending rows are only stuck if their job never reached the
+# broker (queued_at is set on publisher confirm): a confirmed job is durable
+# and RabbitMQ redelivers it itself, however deep the backlog. Rows attached
+# to a run that is queued or running are covered by that run.
+_STALE_ANALYSIS = """
+    (a.status = 'running' AND a.updated_at < NOW() - INTERVAL %s SECOND)
+    OR (a.status = 'pending' AND a.queued_at IS NULL AND a.updated_at < NOW() - INTERVAL %s SECOND
+        AND NOT EXISTS (
+            SELECT 1 FROM files f2 JOIN analyses a2 ON a2.file_id = f2.id
+            WHERE f2.file_hash = f.file_hash AND a2.id <> a.id
+              AND (a2.status = 'running' OR (a2.status = 'pending' AND a2.queued_at IS NOT NULL))))
+"""
+
+
+def mark_analyses_queued(analysis_ids: List[int]) -> None:
+    """Record that the broker confirmed these analyses' jobs."""
+    if not analysis_ids:
+        return
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(analysis_ids))
+        cursor.execute(
+            f"UPDATE analyses SET queued_at = NOW() WHERE id IN ({placeholders}) AND status = 'pending'",
+            tuple(analysis_ids)
+        )
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _stale_analysis_ids(cursor, pending_deadline: int, running_deadline: int, attempts_clause: str,
+                        max_attempts: int, limit: int) -> List[Dict]:
+    cursor.execute(
+        f"""SELECT a.id AS analysis_id, a.file_id, f.stored_path, f.file_hash, f.filename
+            FROM analyses a
+            JOIN files f ON a.file_id = f.id
+            WHERE a.attempts {attempts_clause} %s AND ({_STALE_ANALYSIS})
+            ORDER BY a.updated_at
+            LIMIT %s
+            FOR UPDATE OF a SKIP LOCKED""",
+        (max_attempts, running_deadline, pending_deadline, limit)
+    )
+    return cursor.fetchall()
+
+
+def fail_exhausted_analyses(pending_deadline: int, running_deadline: int, max_attempts: int, limit: int) -> int:
+    """
+    Fail stuck analyses (see _STALE_ANALYSIS) that were already requeued
+    max_attempts times. Returns the number of analyses failed.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        rows = _stale_analysis_ids(cursor, pending_deadline, running_deadline, ">=", max_attempts, limit)
+        if rows:
+            cursor.executemany(
+                """UPDATE analyses
+                   SET status = 'error', summary = 'Analysis timed out', analyzed_at = NOW()
+                   WHERE id = %s""",
+                [(row["analysis_id"],) for row in rows]
+            )
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def requeue_stale_analyses(pending_deadline: int, running_deadline: int, max_attempts: int, limit: int) -> List[Dict]:
+    """
+    Reset stuck analyses (see _STALE_ANALYSIS) to pending, unqueued, and
+    count the attempt.
+
+    Returns one job per sample hash (analyses attached to the same run share
+    it, see register_sample) for the caller to publish again and then pass
+    to mark_analyses_queued. Rows locked by another instance's sweep are
+    skipped.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        rows = _stale_analysis_ids(cursor, pending_deadline, running_deadline, "<", max_attempts, limit)
+        if rows:
+            cursor.executemany(
+                """UPDATE analyses SET status = 'pending', queued_at = NULL, attempts = attempts + 1
+                   WHERE id = %s""",
+                [(row["analysis_id"],) for row in rows]
+            )
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    jobs: Dict[str, Dict] = {}
+    for row in rows:
+        jobs.setdefault(row["file_hash"], row)
+    return list(jobs.values())
+
@@ -0,0 +1,221 @@
+# database.migrate.py - versioned schema migrations for existing databases
+#
+# Run from Backend/fourat:
+#   python -m database.migrate                 apply pending migrations
+#   python -m database.migrate --check-plans   also assert hot-query plans use their indexes
+#
+# db/init.sql always describes the latest schema for fresh installs, so every
+# migration checks the current shape first and is a no-op where it already matches.
+import sys
+from typing import Callable, List, NamedTuple
+from database.fake_db import get_db
+
+LOCK_NAME = "vex_schema_migrations"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        """SELECT COUNT(1) FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(
+        """SELECT COUNT(1) FROM information_schema.columns
+           WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _add_index(cursor, table: str, index: str, definition: str) -> None:
+    if not _index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+
+
+def m001_files_indexes(cursor):
+    # Dedup lookup by hash, and /api/files keyset pages: WHERE user_id = ? ORDER BY uploaded_at, id
+    _add_index(cursor, "files", "idx_files_file_hash", "INDEX idx_files_file_hash (file_hash)")
+    _add_index(cursor, "files", "idx_files_user_uploaded", "INDEX idx_files_user_uploaded (user_id, uploaded_at, id)")
+
+
+def m002_analyses_unique_file(cursor):
+    if _index_exists(cursor, "analyses", "uq_analyses_file_id"):
+        return
+    # Keep only the newest analysis per file before enforcing one-to-one
+    cursor.execute(
+        """DELETE a1 FROM analyses a1
+           JOIN analyses a2 ON a1.file_id = a2.file_id AND a1.id < a2.id"""
+    )
+    cursor.execute("ALTER TABLE analyses ADD UNIQUE INDEX uq_analyses_file_id (file_id)")
+
+
+def m003_refresh_tokens_surrogate_key(cursor):
+    # Replace the 512-char token primary key with a compact surrogate id and a
+    # unique SHA-256 of the token; existing tokens keep working.
+    if _column_exists(cursor, "refresh_tokens", "token_hash"):
+        return
+    cursor.execute("ALTER TABLE refresh_tokens ADD COLUMN token_hash CHAR(64) NULL")
+    cursor.execute("UPDATE refresh_tokens SET token_hash = SHA2(token, 256)")
+    cursor.execute(
+        """ALTER TABLE refresh_tokens
+           DROP PRIMARY KEY,
+           ADD COLUMN id BIGINT AUTO_INCREMENT PRIMARY KEY FIRST,
+           MODIFY token_hash CHAR(64) NOT NULL,
+           ADD UNIQUE INDEX uq_refresh_tokens_token_hash (token_hash),
+           ADD INDEX idx_refresh_tokens_expires_at (expires_at),
+           DROP COLUMN token"""
+    )
+
+
+def m004_offload_reports(cursor):
+    # Move report_json out of InnoDB into the compressed report store, a
+    # batch at a time, then drop the column.
+    if not _column_exists(cursor, "analyses", "report_ref"):
+        cursor.execute(
+            """ALTER TABLE analyses
+               ADD COLUMN report_ref VARCHAR(100) NULL AFTER summary,
+               ADD COLUMN report_size BIGINT NULL AFTER report_ref"""
+        )
+    if not _column_exists(cursor, "analyses", "report_json"):
+        return
+    from core.report_store import ReportStore
+    store = ReportStore()
+    last_id = 0
+    while True:
+        cursor.execute(
+            """SELECT id, report_json FROM analyses
+               WHERE id > %s AND report_json IS NOT NULL
+               ORDER BY id LIMIT 200""",
+            (last_id,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for analysis_id, report_json in rows:
+            ref, size = store.put(report_json.encode() if isinstance(report_json, str) else report_json)
+            cursor.execute(
+                "UPDATE analyses SET report_ref = %s, report_size = %s WHERE id = %s",
+                (ref, size, analysis_id)
+            )
+            last_id = analysis_id
+        cursor.execute("COMMIT")
+    cursor.execute("ALTER TABLE analyses DROP COLUMN report_json")
+
+
+def m005_analyses_timestamps(cursor):
+    # Lets the maintenance sweeper find analyses stuck in pending/running
+    if not _column_exists(cursor, "analyses", "updated_at"):
+        cursor.execute(
+            """ALTER TABLE analyses
+               ADD COLUMN attempts INT NOT NULL DEFAULT 0 AFTER analyzed_at,
+               ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP AFTER attempts,
+               ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP AFTER created_at"""
+        )
+    _add_index(cursor, "analyses", "idx_analyses_status_updated",
+               "INDEX idx_analyses_status_updated (status, updated_at)")
+
+
+def m006_files_batch_id(cursor):
+    # Rows inserted together by register_samples are read back by batch id
+    if not _column_exists(cursor, "files", "batch_id"):
+        cursor.execute("ALTER TABLE files ADD COLUMN batch_id CHAR(32) NULL AFTER uploaded_at")
+    _add_index(cursor, "files", "idx_files_batch_id", "INDEX idx_files_batch_id (batch_id)")
+
+
+def m007_analyses_queued_at(cursor):
+    # Set when the broker confirms an analysis' job; the sweeper only
+    # republishes pending rows that never got that far
+    if _column_exists(cursor, "analyses", "queued_at"):
+        return
+    cursor.execute("ALTER TABLE analyses ADD COLUMN queued_at TIMESTAMP NULL AFTER attempts")
+    # Jobs already pending were published by the old code; assume they are in the queue
+    cursor.execute("UPDATE analyses SET queued_at = updated_at WHERE status = 'pending'")
+
+
+def m008_sample_hashes(cursor):
+    # One row per distinct SHA-256; register_sample locks it so two first
+    # uploads of the same hash cannot both queue a run
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS sample_hashes (
+               file_hash VARCHAR(128) PRIMARY KEY,
+               first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "files: hash and (user_id, uploaded_at, id) indexes", m001_files_indexes),
+    Migration(2, "analyses: unique file_id", m002_analyses_unique_file),
+    Migration(3, "refresh_tokens: surrogate id + unique token_hash", m003_refresh_tokens_surrogate_key),
+    Migration(4, "analyses: report_json -> compressed report store", m004_offload_reports),
+    Migration(5, "analyses: attempts, created_at, updated_at", m005_analyses_timestamps),
+    Migration(6, "files: batch_id", m006_files_batch_id),
+    Migration(7, "analyses: queued_at", m007_analyses_queued_at),
+    Migration(8, "sample_hashes: per-hash registration lock", m008_sample_hashes),
+]
+
+
+def migrate(verbose: bool = True) -> List[int]:
+    """Apply pending migrations in version order; returns the versions applied."""
+    conn = get_db()
+    applied = []
+    try:
+        cursor = conn.cursor()
+        # Several API instances may start at once: only one runs migrations
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Could not acquire the schema migration lock")
+        try:
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS schema_migrations (
+                       version INT PRIMARY KEY,
+                       name VARCHAR(200) NOT NULL,
+                       applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                   )"""
+            )
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+
+            for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+                if migration.version in done:
+                    continue
+                if verbose:
+                    print(f"Applying migration {migration.version}: {migration.name}")
+                # MySQL DDL commits implicitly, so each step is recorded right after it runs
+                migration.apply(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name)
+                )
+                conn.commit()
+                applied.append(migration.version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+            cursor.close()
+    finally:
+        conn.close()
+    return applied
+
+
+if __name__ == "__main__":
+    applied = migrate()
+    print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    if "--check-plans" in sys.argv:
+        from database.query_plans import check_query_plans
+        failures = check_query_plans()
+        for failure in failures:
+            print("PLAN FAIL:", failure)
+        if failures:
+            sys.exit(1)
+        print("All hot-query plans use their expected indexes")
@@ -0,0 +1,243 @@
+# database.pool.py - one shared, bounded MySQL connection pool for the whole backend
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+import mysql.connector
+from mysql.connector.errors import PoolError
+from core.config import (
+    DB_HOST,
+    DB_USER,
+    DB_PASS,
+    DB_NAME,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_PING_INTERVAL,
+)
+
+
+class PoolTimeout(PoolError):
+    """No connection became free within the pool timeout."""
+
+
+class _Entry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled mysql connection. Everything is forwarded to the
+    real connection except close(), which hands it back to the pool, so
+    existing `conn.close()` call sites keep working unchanged.
+    """
+
+    def __init__(self, pool: "ConnectionPool", entry: _Entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise PoolError("Connection already returned to the pool")
+        return getattr(self._entry.conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_pool", "_entry"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._entry.conn, name, value)
+
+    def close(self) -> None:
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # A caller that forgot close() must not leak a pool slot
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        config: Dict,
+        size: int = DB_POOL_SIZE,
+        timeout: float = DB_POOL_TIMEOUT,
+        max_lifetime: float = DB_POOL_MAX_LIFETIME,
+        ping_interval: float = DB_POOL_PING_INTERVAL,
+    ):
+        self.config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # metrics
+        self._in_use = 0
+        self._acquired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._exhausted = 0
+        self._created = 0
+        self._recycled = 0
+        self._health_failures = 0
+
+    def _connect(self) -> _Entry:
+        conn = mysql.connector.connect(autocommit=False, **self.config)
+        with self._cond:
+            self._created += 1
+        return _Entry(conn)
+
+    def _discard(self, entry: _Entry) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, entry: _Entry, now: float) -> bool:
+        if now - entry.created_at > self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - entry.last_used > self.ping_interval:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._health_failures += 1
+                return False
+        return True
+
+    def get_connection(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Borrow a connection, waiting up to `timeout` seconds for a free slot."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO keeps a warm working set
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._exhausted += 1
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s")
+                self._cond.wait(remaining)
+
+        try:
+            if entry is not None and not self._is_healthy(entry, time.monotonic()):
+                self._discard(entry)
+                entry = None
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return PooledConnection(self, entry)
+
+    def _release(self, entry: _Entry) -> None:
+        healthy = True
+        try:
+            # Never hand the next borrower an open transaction (or a stale
+            # REPEATABLE READ snapshot from a read-only caller)
+            if entry.conn.in_transaction:
+                entry.conn.rollback()
+        except Exception:
+            healthy = False
+        entry.last_used = time.monotonic()
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append(entry)
+                entry = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if entry is not None:
+            self._discard(entry)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "acquired": self._acquired,
+                "wait_avg_ms": round(1000 * self._wait_total / self._acquired, 3) if self._acquired else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 3),
+                "exhausted": self._exhausted,
+                "created": self._created,
+                "recycled": self._recycled,
+                "health_check_failures": self._health_failures,
+            }
+
+    def close(self) -> None:
+        """Close idle connections; borrowed ones are closed when returned."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool({
+                    "host": DB_HOST,
+                    "user": DB_USER,
+                    "password": DB_PASS,
+                    "database": DB_NAME,
+                })
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
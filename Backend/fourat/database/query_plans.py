@@ -0,0 +1,183 @@
+# database.query_plans.py - EXPLAIN-based assertions that hot queries use their indexes
+#
+# Each check mirrors a query in database/fake_db.py or database/files_db.py
+# (kept in sync by hand; the function name is noted next to each one). A plan
+# fails if any table is read with a full scan (access_type ALL) or through an
+# index other than the expected ones. Run against a database with realistic
+# row counts: on near-empty tables the optimizer may legitimately prefer scans.
+import json
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Sequence, Set
+from database.fake_db import get_db
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    sql: str
+    params: Sequence
+    expected: Dict[str, Set[str]]  # table alias -> acceptable index names
+
+
+SAMPLE_HASH = "0" * 64
+SAMPLE_TIME = datetime(2030, 1, 1)
+
+PLAN_CHECKS: List[PlanCheck] = [
+    PlanCheck(
+        "fake_db.get_user_by_email",
+        "SELECT id, username, email, password_hash FROM users WHERE email = %s",
+        ("plan-check@vex.local",),
+        {"users": {"email"}},
+    ),
+    PlanCheck(
+        "fake_db.get_user_by_id_db",
+        "SELECT id, username, email FROM users WHERE id = %s",
+        (1,),
+        {"users": {"PRIMARY"}},
+    ),
+    PlanCheck(
+        "fake_db.is_refresh_token_present",
+        "SELECT COUNT(1) FROM refresh_tokens WHERE token_hash = %s AND expires_at > NOW()",
+        (SAMPLE_HASH,),
+        {"refresh_tokens": {"uq_refresh_tokens_token_hash"}},
+    ),
+    PlanCheck(
+        "fake_db.revoke_refresh_token_db",
+        "DELETE FROM refresh_tokens WHERE token_hash = %s",
+        (SAMPLE_HASH,),
+        {"refresh_tokens": {"uq_refresh_tokens_token_hash"}},
+    ),
+    PlanCheck(
+        "fake_db.rotate_refresh_token_db",
+        "DELETE FROM refresh_tokens WHERE token_hash = %s AND user_id = %s AND expires_at > NOW()",
+        (SAMPLE_HASH, 1),
+        {"refresh_tokens": {"uq_refresh_tokens_token_hash"}},
+    ),
+    PlanCheck(
+        "fake_db.revoke_all_refresh_tokens_for_user_db",
+        "DELETE FROM refresh_tokens WHERE user_id = %s",
+        (1,),
+        {"refresh_tokens": {"user_id"}},
+    ),
+    PlanCheck(
+        "files_db.find_reusable_analysis",
+        """SELECT a.id, a.file_id, a.status, a.score
+           FROM files f
+           JOIN analyses a ON a.file_id = f.id
+           WHERE f.file_hash = %s AND a.status IN ('finished', 'running', 'pending')""",
+        (SAMPLE_HASH,),
+        {"f": {"idx_files_file_hash"}, "a": {"uq_analyses_file_id", "file_id"}},
+    ),
+    PlanCheck(
+        "files_db.list_user_files (first page)",
+        """SELECT f.id, f.filename, f.file_size, f.uploaded_at, a.status, a.score
+           FROM files f
+           LEFT JOIN analyses a ON f.id = a.file_id
+           WHERE f.user_id = %s
+           ORDER BY f.uploaded_at DESC, f.id DESC
+           LIMIT 51""",
+        (1,),
+        {"f": {"idx_files_user_uploaded"}, "a": {"uq_analyses_file_id", "file_id"}},
+    ),
+    PlanCheck(
+        "files_db.list_user_files (after cursor)",
+        """SELECT f.id, f.filename, f.file_size, f.uploaded_at, a.status, a.score
+           FROM files f
+           LEFT JOIN analyses a ON f.id = a.file_id
+           WHERE f.user_id = %s AND (f.uploaded_at < %s OR (f.uploaded_at = %s AND f.id < %s))
+           ORDER BY f.uploaded_at DESC, f.id DESC
+           LIMIT 51""",
+        (1, SAMPLE_TIME, SAMPLE_TIME, 1000),
+        {"f": {"idx_files_user_uploaded"}, "a": {"uq_analyses_file_id", "file_id"}},
+    ),
+    PlanCheck(
+        "files_db.get_analysis_for_user",
+        """SELECT a.id, a.file_id, a.status, a.score, a.summary, a.analyzed_at,
+                  a.report_size, a.report_ref IS NOT NULL AS has_report, UNIX_TIMESTAMP(a.updated_at) AS updated_ts,
+                  f.user_id, f.file_hash
+           FROM analyses a
+           JOIN files f ON a.file_id = f.id
+           WHERE a.file_id = %s AND f.user_id = %s""",
+        (1, 1),
+        {"a": {"uq_analyses_file_id", "file_id"}, "f": {"PRIMARY"}},
+    ),
+    PlanCheck(
+        "files_db.apply_analysis_results",
+        """UPDATE analyses a JOIN files f ON a.file_id = f.id
+           SET a.status = 'running'
+           WHERE f.file_hash = %s AND a.status = 'pending'""",
+        (SAMPLE_HASH,),
+        {"f": {"idx_files_file_hash"}, "a": {"uq_analyses_file_id", "file_id"}},
+    ),
+    PlanCheck(
+        "fake_db.purge_expired_refresh_tokens",
+        "DELETE FROM refresh_tokens WHERE expires_at <= NOW() ORDER BY expires_at LIMIT %s",
+        (1000,),
+        {"refresh_tokens": {"idx_refresh_tokens_expires_at"}},
+    ),
+    PlanCheck(
+        "files_db.requeue_stale_analyses",
+        """SELECT a.id AS analysis_id, a.file_id, f.stored_path, f.file_hash, f.filename
+           FROM analyses a
+           JOIN files f ON a.file_id = f.id
+           WHERE a.attempts < %s AND (
+               (a.status = 'running' AND a.updated_at < NOW() - INTERVAL %s SECOND)
+               OR (a.status = 'pending' AND a.queued_at IS NULL AND a.updated_at < NOW() - INTERVAL %s SECOND
+                   AND NOT EXISTS (
+                       SELECT 1 FROM files f2 JOIN analyses a2 ON a2.file_id = f2.id
+                       WHERE f2.file_hash = f.file_hash AND a2.id <> a.id
+                         AND (a2.status = 'running' OR (a2.status = 'pending' AND a2.queued_at IS NOT NULL)))))
+           ORDER BY a.updated_at
+           LIMIT %s""",
+        (3, 3600, 300, 200),
+        {"a": {"idx_analyses_status_updated"}, "f": {"PRIMARY"},
+         "f2": {"idx_files_file_hash"}, "a2": {"uq_analyses_file_id", "file_id"}},
+    ),
+    PlanCheck(
+        "files_db.register_samples",
+        "SELECT id FROM files WHERE batch_id = %s ORDER BY id",
+        ("0" * 32,),
+        {"files": {"idx_files_batch_id"}},
+    ),
+]
+
+
+def _table_accesses(node):
+    """Yield every {"table_name", "access_type", "key"} block in an EXPLAIN FORMAT=JSON tree."""
+    if isinstance(node, dict):
+        table = node.get("table")
+        if isinstance(table, dict) and "table_name" in table:
+            yield table
+        for value in node.values():
+            yield from _table_accesses(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _table_accesses(item)
+
+
+def check_plan(cursor, check: PlanCheck) -> List[str]:
+    cursor.execute("EXPLAIN FORMAT=JSON " + check.sql, tuple(check.params))
+    plan = json.loads(cursor.fetchone()[0])
+    failures = []
+    for table in _table_accesses(plan):
+        alias = table["table_name"]
+        access = table.get("access_type")
+        key = table.get("key")
+        if access == "ALL":
+            failures.append(f"{check.name}: full scan of {alias}")
+        elif alias in check.expected and key is not None and key not in check.expected[alias]:
+            failures.append(f"{check.name}: {alias} uses {key}, expected one of {sorted(check.expected[alias])}")
+    return failures
+
+
+def check_query_plans(checks: Sequence[PlanCheck] = PLAN_CHECKS) -> List[str]:
+    """Run every check and return human-readable failures (empty list means all good)."""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        failures = []
+        for check in checks:
+            failures.extend(check_plan(cursor, check))
+        cursor.close()
+        return failures
+    finally:
+        conn.close()
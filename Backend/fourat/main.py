@@ -1,17 +1,67 @@
 #Purpose: create app, add middleware, integrate auth with file upload
-from fastapi import FastAPI, HTTPException, Depends, UploadFile #fastapi tools and error handling
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Header #fastapi tools and error handling
 from fastapi.middleware.cors import CORSMiddleware #middleware for handling CORS
+from fastapi.responses import StreamingResponse, FileResponse
 from routes.auth import router as auth_router #importing the route modules
-from core.security import get_current_user
+from core.security import get_current_user, get_current_user_for_stream
+from core.events import EventBroker, EventConsumer, TERMINAL_STATUSES
+from core.results import ResultConsumer
+from core.ingest import UploadFormError, ingest_form
+from core.executors import run_db, run_io, shutdown_executors
+from core.hashing import hashing_stats, start_hash_pool, shutdown_hash_pool
+from core.token_cache import token_cache
+from core.revocation import refresh_cache, revocation_bus
+from core.maintenance import MaintenanceSweeper
+from core.uploads import UploadManager, UploadError, UploadBusy
+from core.archives import ArchiveError, ExtractedEntry, archive_kind, discard, extract_tar, extract_zip_members, zip_members
+from schemas.uploads import CreateUploadRequest
 import os
+import json
 import uuid
-import shutil
-import hashlib
-import mysql.connector
+import asyncio
+from datetime import datetime
+from typing import List, Optional
 from mysql.connector import Error as MySQLError
-from core.config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from core.config import UPLOAD_DIR, MIGRATE_ON_STARTUP, MAINTENANCE_ENABLED, PUBLISH_CONFIRM_TIMEOUT, FILES_PAGE_SIZE, FILES_PAGE_SIZE_MAX, FILES_EXPORT_BATCH, SSE_HEARTBEAT, BATCH_MAX_FILES, FILE_IO_WORKERS
+from core.publisher import JobPublisher, PublishError
+from core.sample_store import SampleStore
+from core.report_store import ReportStore
+from database.files_db import register_sample, register_samples, mark_analyses_queued, list_user_files, get_analysis_for_user, get_report_for_user
+from database.fake_db import get_db, user_cache
+from database.pool import get_pool, close_pool
+from database.migrate import migrate
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="VEX - Analysis API with Authentication") #API instance that gives you ip to get access
+job_publisher = JobPublisher()
+event_broker = EventBroker()
+event_consumer = EventConsumer(event_broker)
+result_consumer = ResultConsumer()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Before any background thread exists (see core/hashing.py)
+    start_hash_pool()
+    if MIGRATE_ON_STARTUP:
+        await run_db(migrate)
+    event_broker.bind(asyncio.get_running_loop())
+    event_consumer.start()
+    result_consumer.start()
+    revocation_bus.start()
+    job_publisher.start()
+    if MAINTENANCE_ENABLED:
+        maintenance.start()
+    yield
+    if MAINTENANCE_ENABLED:
+        maintenance.stop()
+    job_publisher.stop()
+    result_consumer.stop()
+    revocation_bus.stop()
+    event_consumer.stop()
+    shutdown_hash_pool()
+    shutdown_executors()
+    close_pool()
+
+app = FastAPI(title="VEX - Analysis API with Authentication", lifespan=lifespan) #API instance that gives you ip to get access
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.0.0.1:5500", "http://localhost:3000"],
@@ -22,140 +72,461 @@ app.add_middleware(
 
 app.include_router(auth_router, prefix="/api")
 
-UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+sample_store = SampleStore(UPLOAD_DIR)
+upload_manager = UploadManager(os.path.join(sample_store.incoming_dir, "sessions"))
+report_store = ReportStore()
 
 def get_db_connection():
-    """Get database connection"""
-    return mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        autocommit=False,
-    )
+    """Get database connection from the shared pool"""
+    return get_db()
+
+@app.get("/api/metrics")
+def metrics():
+    """Operational counters for this API instance"""
+    return {
+        "db_pool": get_pool().stats(),
+        "publisher": job_publisher.stats(),
+        "events": event_broker.stats(),
+        "results": result_consumer.stats(),
+        "password_hashing": hashing_stats(),
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "refresh_tokens": {**refresh_cache.stats(), "bus": revocation_bus.stats()},
+        "maintenance": maintenance.stats(),
+    }
+
+def analysis_job(analysis_id: int, file_id: int, stored_path: str, file_hash: str, filename: str) -> dict:
+    """Message body consumed by the worker from ANALYSIS_QUEUE"""
+    return {
+        "job_id": str(analysis_id),
+        "analysis_id": analysis_id,
+        "file_id": file_id,
+        "file_path": stored_path,
+        "file_hash": file_hash,
+        # Blobs are stored without an extension; the worker names the guest copy after this
+        "filename": filename,
+    }
+
+maintenance = MaintenanceSweeper(job_publisher.publish_many, analysis_job)
+
+async def queue_analysis_jobs(jobs: list) -> bool:
+    """Publish jobs and wait for broker confirms; False if any was not confirmed in time"""
+    if not jobs:
+        return True
+    try:
+        futures = [asyncio.wrap_future(f) for f in job_publisher.publish_many(jobs)]
+    except PublishError as e:
+        print(f"Failed to queue {len(jobs)} analysis job(s): {e!r}")
+        return False
+    await asyncio.wait(futures, timeout=PUBLISH_CONFIRM_TIMEOUT)
+    confirmed = [job["analysis_id"] for job, f in zip(jobs, futures)
+                 if f.done() and not f.cancelled() and f.exception() is None]
+    # Only confirmed jobs are marked queued; the maintenance sweeper republishes the rest
+    try:
+        await run_db(mark_analyses_queued, confirmed)
+    except MySQLError as e:
+        print(f"Failed to mark {len(confirmed)} analysis job(s) queued: {e}")
+    if len(confirmed) < len(jobs):
+        print(f"Failed to queue {len(jobs) - len(confirmed)} of {len(jobs)} analysis job(s)")
+        return False
+    return True
+
+async def submit_sample(user_id: int, filename: str, temp_path: str, file_hash: str, file_size: int) -> dict:
+    """Commit a fully written temp file to the sample store, register it and queue a run if needed"""
+    # Store the bytes once per SHA-256 (duplicates just drop the temp copy)
+    stored_path, _ = await run_io(sample_store.commit, temp_path, file_hash)
+
+    # Store file metadata and reuse any earlier verdict for the same hash
+    record = await run_db(register_sample, user_id, filename, stored_path, file_hash, file_size)
+
+    # Only samples without a reusable verdict need a sandbox run
+    queued = False
+    if record["reuse"] is None:
+        queued = await queue_analysis_jobs([
+            analysis_job(record["analysis_id"], record["file_id"], stored_path, file_hash, filename)
+        ])
+
+    return {
+        "success": True,
+        "file_id": record["file_id"],
+        "filename": filename,
+        "file_hash": file_hash,
+        "file_size": file_size,
+        "status": record["status"],
+        "score": record["score"],
+        "reused": record["reuse"],
+        "queued": queued,
+    }
 
 @app.post("/api/analyze")
-async def upload_and_analyze(file: UploadFile, user=Depends(get_current_user)):
-    """Upload and analyze a file - requires authentication"""
+async def upload_and_analyze(request: Request, user=Depends(get_current_user)):
+    """Upload and analyze a file (multipart field `file`) - requires authentication"""
     user_id = int(user["id"])
+
+    # Stream into the store's incoming area; the final name is the content hash
+    try:
+        parts, _ = await ingest_form(request, sample_store.new_temp_path)
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(parts) != 1 or parts[0].field != "file":
+        await run_io(_discard_parts, parts)
+        raise HTTPException(status_code=400, detail="Send one file in the `file` field")
+    upload = parts[0]
+
+    try:
+        return await submit_sample(user_id, upload.filename, upload.temp_path, upload.result.sha256,
+                                   upload.result.size)
     
-    # Ensure upload directory exists
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    except Exception as e:
+        # Cleanup on error (a committed blob may be shared, so it stays)
+        await run_io(_discard_parts, parts)
+        raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
+
+def _discard_parts(parts: list) -> None:
+    for part in parts:
+        if os.path.exists(part.temp_path):
+            os.remove(part.temp_path)
+
+async def _extract_archive(archive_path: str, password: Optional[str]) -> list:
+    """Extract an uploaded archive into the incoming area; zip entries are hashed on several I/O threads"""
+    kind = await run_io(archive_kind, archive_path)
+    if kind == "tar":
+        return await run_io(extract_tar, archive_path, sample_store.new_temp_path)
+    if kind != "zip":
+        raise ArchiveError("Unsupported archive format (expected zip or tar)")
+    members = await run_io(zip_members, archive_path)
+    slices = [members[i::FILE_IO_WORKERS] for i in range(FILE_IO_WORKERS) if members[i::FILE_IO_WORKERS]]
+    results = await asyncio.gather(
+        *(run_io(extract_zip_members, archive_path, part, sample_store.new_temp_path, password) for part in slices),
+        return_exceptions=True,
+    )
+    entries = [entry for result in results if isinstance(result, list) for entry in result]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        discard(entries)
+        raise errors[0]
+    return entries
 
-    # Use UUID-based filename to avoid collisions
-    stored_filename = f"{uuid.uuid4()}.exe"
-    file_path = os.path.join(UPLOAD_DIR, stored_filename)
+@app.post("/api/analyze/batch")
+async def analyze_batch(request: Request, user=Depends(get_current_user)):
+    """
+    Submit many samples in one request: several `files`, or one zip/tar
+    `archive` (optionally with the zip `password`) whose entries are the
+    samples. All rows are written in one transaction and the jobs published
+    as one batch.
+    """
+    user_id = int(user["id"])
+    try:
+        parts, fields = await ingest_form(request, sample_store.new_temp_path, max_files=BATCH_MAX_FILES)
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    files = [p for p in parts if p.field == "files"]
+    archives = [p for p in parts if p.field == "archive"]
+    if len(files) + len(archives) != len(parts) or bool(files) == bool(archives) or len(archives) > 1:
+        await run_io(_discard_parts, parts)
+        raise HTTPException(status_code=400, detail="Send either files or one archive")
 
+    entries = []
+    committed = False
     try:
-        # Save uploaded file
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        
-        file_size = os.path.getsize(file_path)
-        
-        # Compute SHA256 hash
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        file_hash = sha256_hash.hexdigest()
-        
-        # Store file metadata in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """INSERT INTO files (user_id, filename, stored_path, file_hash, file_size) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            (user_id, file.filename, stored_filename, file_hash, file_size)
-        )
-        file_id = cursor.lastrowid
-        
-        # Create analysis record
-        cursor.execute(
-            """INSERT INTO analyses (file_id, status) VALUES (%s, %s)""",
-            (file_id, "pending")
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
+        if archives:
+            try:
+                entries = await _extract_archive(archives[0].temp_path, fields.get("password") or None)
+            finally:
+                await run_io(_discard_parts, archives)
+        else:
+            entries = [ExtractedEntry(p.filename, p.temp_path, p.result.size, p.result.sha256) for p in files]
+        if not entries:
+            raise HTTPException(status_code=400, detail="No files to analyze")
+
+        stored = await asyncio.gather(*(run_io(sample_store.commit, e.temp_path, e.sha256) for e in entries))
+        committed = True
+        samples = [
+            {"filename": e.filename, "stored_path": path, "file_hash": e.sha256, "file_size": e.size}
+            for e, (path, _) in zip(entries, stored)
+        ]
+        batch_id = uuid.uuid4().hex
+        records = await run_db(register_samples, user_id, samples, batch_id)
+
+        queued = await queue_analysis_jobs([
+            analysis_job(r["analysis_id"], r["file_id"], r["stored_path"], r["file_hash"], sample["filename"])
+            for r, sample in zip(records, samples) if r["reuse"] is None
+        ])
+
         return {
             "success": True,
-            "file_id": file_id,
-            "filename": file.filename,
-            "file_hash": file_hash,
-            "file_size": file_size,
-            "status": "pending"
+            "batch_id": batch_id,
+            "count": len(records),
+            "queued": queued,
+            "files": [
+                {
+                    "file_id": r["file_id"],
+                    "filename": sample["filename"],
+                    "file_hash": r["file_hash"],
+                    "file_size": sample["file_size"],
+                    "status": r["status"],
+                    "score": r["score"],
+                    "reused": r["reuse"],
+                }
+                for r, sample in zip(records, samples)
+            ],
         }
-    
+
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=f"Rejected archive: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
-        # Cleanup on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to submit batch: {str(e)}")
+    finally:
+        # Cleanup on error (committed blobs may be shared, so they stay)
+        if not committed:
+            discard(entries)
+
+async def _get_upload(upload_id: str, user_id: int):
+    session = await run_io(upload_manager.get, upload_id, user_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@app.post("/api/uploads")
+async def create_upload(request: CreateUploadRequest, user=Depends(get_current_user)):
+    """Start a resumable upload; the client then PUTs each chunk (in any order, in parallel) and completes it"""
+    try:
+        session = await run_io(upload_manager.create, int(user["id"]), request.filename, request.size, request.sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **session.status()}
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str, user=Depends(get_current_user)):
+    """Which chunks the server has; after a dropped connection, re-send only the missing ones"""
+    session = await _get_upload(upload_id, int(user["id"]))
+    return {"success": True, **session.status()}
+
+@app.put("/api/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: str = Header(...),
+    user=Depends(get_current_user),
+):
+    """Raw chunk bytes as the body, with the chunk's SHA-256 in X-Chunk-SHA256"""
+    session = await _get_upload(upload_id, int(user["id"]))
+    limit = session.meta["chunk_size"]
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail="Chunk larger than the session chunk size")
+    # Content-Length is absent with chunked transfer encoding, so the cap is enforced while reading
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Chunk larger than the session chunk size")
+    data = bytes(body)
+    try:
+        status = await run_io(upload_manager.write_chunk, session, index, data, x_chunk_sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **status}
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, user=Depends(get_current_user)):
+    """Finish an upload: the assembled file is moved into the sample store and analysed like /api/analyze"""
+    user_id = int(user["id"])
+    session = await _get_upload(upload_id, user_id)
+    # Held until the session is gone, so two workers cannot register the same upload
+    try:
+        claim = await run_io(upload_manager.claim, session)
+    except UploadBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        try:
+            file_hash = await run_io(upload_manager.finish, session)
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            result = await submit_sample(user_id, session.meta["filename"], session.data_path, file_hash,
+                                         session.meta["size"])
+        except Exception as e:
+            # The session is kept (its bytes in data.part or already in the store), so the client can retry
+            raise HTTPException(status_code=500, detail=f"Failed to register upload: {str(e)}")
+        await run_io(upload_manager.discard, session)
+        return result
+    finally:
+        await run_io(claim.close)
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str, user=Depends(get_current_user)):
+    session = await _get_upload(upload_id, int(user["id"]))
+    await run_io(upload_manager.discard, session)
+    return {"success": True}
 
 @app.get("/api/files")
-async def get_user_files(user=Depends(get_current_user)):
-    """Get all files uploaded by the authenticated user"""
+async def get_user_files(
+    limit: int = Query(FILES_PAGE_SIZE, ge=1, le=FILES_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    """Get one page of files uploaded by the authenticated user (pass next_cursor back for the next page)"""
     user_id = int(user["id"])
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(
-            """SELECT f.id, f.filename, f.file_size, f.uploaded_at, a.status, a.score 
-               FROM files f
-               LEFT JOIN analyses a ON f.id = a.file_id
-               WHERE f.user_id = %s
-               ORDER BY f.uploaded_at DESC""",
-            (user_id,)
-        )
-        
-        files = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-
+        files, next_cursor = await run_db(list_user_files, user_id, limit, cursor)
         
         return {
             "success": True,
-            "files": files
+            "files": files,
+            "next_cursor": next_cursor,
         }
     
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except MySQLError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+@app.get("/api/files/export")
+async def export_user_files(user=Depends(get_current_user)):
+    """Stream every file of the authenticated user as NDJSON (one JSON object per line)"""
+    user_id = int(user["id"])
+
+    async def rows():
+        cursor = None
+        while True:
+            # A short pooled borrow per batch: a slow client never pins a connection
+            files, cursor = await run_db(list_user_files, user_id, FILES_EXPORT_BATCH, cursor)
+            yield "".join(json.dumps(f, default=_json_default) + "\n" for f in files)
+            if cursor is None:
+                break
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
 @app.get("/api/analysis/{file_id}")
 async def get_analysis(file_id: int, user=Depends(get_current_user)):
     """Get analysis results for a specific file"""
     user_id = int(user["id"])
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Verify ownership
-        cursor.execute(
-            """SELECT a.*, f.user_id FROM analyses a
-               JOIN files f ON a.file_id = f.id
-               WHERE a.file_id = %s AND f.user_id = %s""",
-            (file_id, user_id)
-        )
-        
-        analysis = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if not analysis:
-            raise HTTPException(status_code=404, detail="Analysis not found")
+        analysis = await run_db(get_analysis_for_user, file_id, user_id)
+    except MySQLError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
-        return {
-            "success": True,
-            "analysis": analysis
-        }
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
+    return {
+        "success": True,
+        "analysis": analysis
+    }
+
+def _sse(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event, default=_json_default)}\n\n"
+
+@app.get("/api/analysis/{file_id}/events")
+async def analysis_events(file_id: int, request: Request, user=Depends(get_current_user_for_stream)):
+    """Server-sent events: pending -> running (per-stage progress) -> finished/error for one file"""
+    user_id = int(user["id"])
+
+    try:
+        analysis = await run_db(get_analysis_for_user, file_id, user_id)
     except MySQLError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    file_hash = analysis["file_hash"]
+
+    async def stream():
+        queue = event_broker.subscribe(file_hash)
+        try:
+            current = {"file_id": file_id, "status": analysis["status"], "stage": analysis["status"],
+                       "score": analysis["score"]}
+            # Anything the workers reported since the DB row was last written wins.
+            # Older events belong to an earlier run of the same hash (e.g. one that
+            # failed before this file was uploaded again) and must not end the stream.
+            latest = event_broker.last_event(file_hash)
+            row_ts = float(analysis["updated_ts"] or 0)
+            if latest and latest.get("ts", 0) >= row_ts and analysis["status"] not in TERMINAL_STATUSES:
+                current = {**latest, "file_id": file_id}
+            yield _sse(current)
+            if current["status"] in TERMINAL_STATUSES:
+                return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse({**event, "file_id": file_id})
+                if event.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            event_broker.unsubscribe(file_hash, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _parse_range(header: str, size: int):
+    """Parse a single 'bytes=a-b' range; None if absent or unsatisfiable-as-a-range."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_s == "":
+            # suffix range: last N bytes
+            length = int(end_s)
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+@app.get("/api/analysis/{file_id}/report")
+async def get_analysis_report(file_id: int, request: Request, user=Depends(get_current_user)):
+    """Stream the full analysis report (JSON); supports single byte ranges"""
+    user_id = int(user["id"])
+
+    try:
+        row = await run_db(get_report_for_user, file_id, user_id)
+    except MySQLError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not row:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if not row["report_ref"]:
+        raise HTTPException(status_code=404, detail="Report not available yet")
+
+    ref, size = row["report_ref"], row["report_size"]
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=86400"}
+    byte_range = _parse_range(request.headers.get("range"), size)
+
+    # Whole report to a client that understands the stored codec: send the
+    # compressed blob as-is, no inflate on our side
+    accepted = request.headers.get("accept-encoding", "")
+    encoding = report_store.encoding(ref)
+    if byte_range is None and encoding in [e.split(";")[0].strip() for e in accepted.split(",")]:
+        headers["Content-Encoding"] = encoding
+        return FileResponse(report_store.path(ref), media_type="application/json", headers=headers)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(report_store.stream(ref), media_type="application/json", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(report_store.stream(ref, start, end), status_code=206,
+                             media_type="application/json", headers=headers)
@@ -1,36 +1,48 @@
 # routes.auth.py - handles user authentication routes using FastAPI
 from fastapi import APIRouter, HTTPException, Depends
 from schemas.authy import LoginRequest, RegisterRequest, RefreshRequest
-from core.hashing import hash_password, verify_password
+from core.hashing import hash_password_async, verify_and_update_async, HashingBusy
+from core.executors import run_db
 from core.security import (
     create_access_token,
     create_refresh_token,
     get_current_user,
     verify_refresh_token,
     revoke_refresh_token,
+    rotate_refresh_token,
     revoke_all_refresh_tokens_for_user,
 )
-from database.fake_db import get_user_by_email, get_user_by_id, create_user, user_exists
+from database.fake_db import get_user_by_email, get_user_by_id, create_user, user_exists, update_password_hash
 from jose import jwt, JWTError
 from core.config import SECRET_KEY, ALGORITHM
 
 router = APIRouter(tags=["auth"])
 
+def _hashing_busy():
+    return HTTPException(status_code=503, detail="Authentication is busy, please retry", headers={"Retry-After": "1"})
+
 @router.post("/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     # Get user from database by email
-    user = get_user_by_email(request.email)
+    user = await run_db(get_user_by_email, request.email)
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    # Verify password
-    if not verify_password(request.password, user["password_hash"]):
+    # Verify password (bcrypt runs in the hashing process pool)
+    try:
+        valid, new_hash = await verify_and_update_async(request.password, user["password_hash"])
+    except HashingBusy:
+        raise _hashing_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored hash predates the current cost settings: upgrade it now that we know the password
+        await run_db(update_password_hash, user["id"], new_hash)
 
     # Create tokens (include username in access token to reduce DB hits)
     access_token = create_access_token(user["id"], user["email"], username=user.get("username"))
-    refresh_token = create_refresh_token(user["id"])
+    refresh_token = await run_db(create_refresh_token, user["id"])
 
     return {
         "success": True,
@@ -44,23 +56,26 @@ def login(request: LoginRequest):
     }
 
 @router.post("/register")
-def register(request: RegisterRequest):
+async def register(request: RegisterRequest):
     # Check if user already exists
-    if user_exists(request.email):
+    if await run_db(user_exists, request.email):
         raise HTTPException(status_code=400, detail="User already exists")
 
     # Hash password
-    password_hash = hash_password(request.password)
+    try:
+        password_hash = await hash_password_async(request.password)
+    except HashingBusy:
+        raise _hashing_busy()
 
     # Create new user in database
-    user_id = create_user(request.username, request.email, password_hash)
+    user_id = await run_db(create_user, request.username, request.email, password_hash)
 
     if not user_id:
         raise HTTPException(status_code=500, detail="Failed to create user")
 
     # Create tokens
     access_token = create_access_token(user_id, request.email, username=request.username)
-    refresh_token = create_refresh_token(user_id)
+    refresh_token = await run_db(create_refresh_token, user_id)
 
     return {
         "success": True,
@@ -92,17 +107,12 @@ def me(user=Depends(get_current_user)):
 @router.post("/refresh")
 def refresh(request: RefreshRequest):
     """
-    Exchange a refresh token for a new access token.
-    Consider rotating refresh tokens in production.
+    Exchange a refresh token for a new access token and a new refresh token.
     """
-    user_id = verify_refresh_token(request.refresh_token)
-
-    # Optionally rotate refresh token: revoke old and issue a new one
-    revoke_refresh_token(request.refresh_token)
-    new_refresh = create_refresh_token(user_id)
+    # Rotate: the old refresh token stops working on every instance
+    user_id, new_refresh = rotate_refresh_token(request.refresh_token)
 
-    # Create a new access token
-    # You might want to get user's email/username from DB for the payload:
+    # Create a new access token; the profile usually comes from the user cache
     user = get_user_by_id(user_id)
     email = user["email"] if user else ""
     username = user["username"] if user else None
@@ -0,0 +1,14 @@
+#schemas.uploads.py - defines Pydantic models for resumable chunked uploads
+from typing import Optional
+from pydantic import BaseModel, field_validator
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None  # if given, the finished upload must match it
+
+    @field_validator("sha256")
+    def sha256_hex(cls, v):
+        if v is not None and (len(v) != 64 or any(c not in "0123456789abcdefABCDEF" for c in v)):
+            raise ValueError("sha256 must be 64 hex characters")
+        return v
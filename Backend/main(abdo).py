@@ -1,6 +1,5 @@
 from fastapi import FastAPI, UploadFile, HTTPException, status
 import hashlib
-import shutil
 import uuid
 import os
 import mysql.connector
@@ -10,6 +9,7 @@ from typing import List
 app = FastAPI()
 
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+CHUNK_SIZE = 1024 * 1024  # stream uploads in 1 MiB blocks
 
 # DB config from environment with sensible defaults
 DB_HOST = os.environ.get("DB_HOST", "localhost")
@@ -40,21 +40,17 @@ async def upload(file: UploadFile):
     stored_filename = f"{uuid.uuid4()}.exe"
     file_path = os.path.join(UPLOAD_DIR, stored_filename)
 
-    # Save uploaded file
+    # Save uploaded file and compute SHA256 in the same pass
+    sha256 = hashlib.sha256()
+    file_size = 0
     try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save file: {e}")
-    file_size = os.path.getsize(file_path) #getting file size
-    # Compute SHA256
-    sha256 = hashlib.sha256() 
-    try:
-        with open(file_path, "rb") as f:
-            for block in iter(lambda: f.read(4096), b""):
+        with open(file_path, "wb", buffering=CHUNK_SIZE) as f:
+            for block in iter(lambda: file.file.read(CHUNK_SIZE), b""):
                 sha256.update(block)
+                file_size += len(block)
+                f.write(block)
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to hash file: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save file: {e}")
 
     digest = sha256.hexdigest()
 
@@ -1,6 +1,5 @@
 from fastapi import FastAPI, UploadFile
 import hashlib
-import shutil
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
 import pika
@@ -20,6 +19,7 @@ app.add_middleware(
 
 
 UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 1024 * 1024  # 1 MiB blocks: one read per byte, far fewer syscalls than 4 KiB
 file_number = 1
 
 @app.post("/api/analyze")
@@ -31,9 +31,12 @@ async def upload(file: UploadFile):
         file_path = f"{UPLOAD_DIR}/{file.filename}"
         file_number += 1
 
-        # Save
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        # Save and hash in a single pass over the upload
+        sha256 = hashlib.sha256()
+        with open(file_path, "wb", buffering=CHUNK_SIZE) as f:
+            for block in iter(lambda: file.file.read(CHUNK_SIZE), b""):
+                sha256.update(block)
+                f.write(block)
 #RabbitMQ: connect to the RabbitMQ server and set a channel and then a slot to send the file path to a queue in that slot
 # to start the server: docker run -it --rm --name rabbitmq -p 5672:5672 -p 15672:15672  rabbitmq:4-management
 #                                                             srvr port     mgmt port
@@ -57,12 +60,6 @@ async def upload(file: UploadFile):
         
         connection.close()
 
-        # Hash
-        sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for block in iter(lambda: f.read(4096), b""):
-                sha256.update(block)
-
         digest = sha256.hexdigest()
         return {"status": "Task queued","id": file_id, "hash": digest}
     except Exception as e:
@@ -0,0 +1,89 @@
+# Worker/bench.py - end-to-end worker throughput on the in-process fake hypervisor
+#
+# Run from the repository root (no VirtualBox or RabbitMQ needed):
+#   python -m Worker.bench --jobs 64 --vms 8 --warm 4 --spawn-ms 150
+#
+# Runs the same jobs twice through VMPool + run_vm_analysis: once with
+# per-operation latency 0 (a persistent API session) and once with
+# `--spawn-ms` added to every VM operation (a VBoxManage process spawn plus
+# VBoxSVC handshake each time), and prints job latency and throughput for both.
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .execution import ExecutionController
+from .hypervisor import FakeGuest, FakeHypervisor
+from .vm_controller import run_vm_analysis
+from .vm_pool import VMPool
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run(args, op_latency):
+    hv = FakeHypervisor(
+        boot_time=args.boot,
+        restore_time=args.restore,
+        op_latency=op_latency,
+        guest=FakeGuest(processes=args.processes, duration=args.activity),
+    )
+    hv.add_vm("BenchBase", snapshots=("clean_state",))
+    pool = VMPool(base_vm="BenchBase", snapshot="clean_state", size=args.vms, prefix="BenchVM-",
+                  warm_snapshot="warm_desktop", warm_standby=args.warm, hv=hv)
+    pool.prepare()
+    out = tempfile.mkdtemp(prefix="vex-bench-")
+
+    def job(i):
+        start = time.perf_counter()
+        with pool.lease(i) as (vm_name, warm):
+            controller = ExecutionController(hard_timeout=args.activity * 4, quiet_interval=args.quiet,
+                                             min_runtime=0.2, poll_interval=0.1)
+            run_vm_analysis(f"bench-{i}", "sample.exe", vm_name, warm, hv=hv, controller=controller,
+                            results_root=out, reports_root=out)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.vms) as executor:
+        latencies = list(executor.map(job, range(args.jobs)))
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    pool.shutdown()
+    return latencies, elapsed, stats, hv.stats()
+
+
+def report(name, latencies, elapsed, pool_stats, hv_stats):
+    calls = sum(hv_stats["calls"].values())
+    print(
+        f"{name:<22} jobs={len(latencies):4d} "
+        f"p50={percentile(latencies, 50):6.2f}s "
+        f"p95={percentile(latencies, 95):6.2f}s "
+        f"throughput={len(latencies) / elapsed * 60:7.1f} jobs/min "
+        f"warm={pool_stats['warm_leases']}/{pool_stats['leases']} "
+        f"vm_ops={calls}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--vms", type=int, default=8)
+    parser.add_argument("--warm", type=int, default=4)
+    parser.add_argument("--boot", type=float, default=1.0, help="seconds from start to desktop (cold)")
+    parser.add_argument("--restore", type=float, default=0.2, help="seconds per snapshot restore")
+    parser.add_argument("--processes", type=int, default=50, help="processes each fake sample spawns")
+    parser.add_argument("--activity", type=float, default=1.0, help="seconds the fake sample stays active")
+    parser.add_argument("--quiet", type=float, default=0.5, help="quiet interval that ends execution")
+    parser.add_argument("--spawn-ms", type=float, default=150.0, help="per-operation cost of a VBoxManage spawn")
+    args = parser.parse_args()
+
+    report("persistent session", *run(args, 0.0))
+    report(f"spawn per op ({args.spawn_ms:.0f}ms)", *run(args, args.spawn_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
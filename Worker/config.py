@@ -1,12 +1,66 @@
 # worker/config.py
+import os
 
 RABBITMQ_HOST = "localhost"
 QUEUE_NAME = "analysis_queue"
+RESULTS_QUEUE = "analysis_results"  # durable: verdicts and stage transitions, applied to MySQL by the API
+EVENTS_EXCHANGE = "analysis_events"  # fanout: live stage/progress events for the API
+
+# VM control backend: "vboxapi" (long-lived SDK session, falls back to
+# "vboxmanage" if the bindings are missing), "vboxmanage", or "fake" (in-process)
+HYPERVISOR = os.getenv("VEX_HYPERVISOR", "vboxapi")
+VBOXMANAGE = r"C:\Program Files\Oracle\VirtualBox\VBoxManage.exe"
+GUEST_USER = "user"
+GUEST_PASSWORD = "pass"
 
 VM_NAME = "WinSandbox"
 VM_SNAPSHOT = "clean_state"
 
+# Samples reach the guest through the sample store, shared at GUEST_STORE_DIR.
+# Blobs there have no extension, so each run copies its sample into
+# GUEST_RUN_DIR as <sha256><original extension> (DEFAULT_SAMPLE_EXT if none)
+GUEST_STORE_DIR = r"C:\sandbox"
+GUEST_RUN_DIR = r"C:\Users\Public"
+DEFAULT_SAMPLE_EXT = ".exe"
+
 UPLOADS_PATH = "/shared/uploads"
 RESULTS_PATH = "/shared/results"
+REPORTS_PATH = "/shared/reports"  # compressed report store, read by the API (REPORTS_DIR)
+
+EXECUTION_TIMEOUT = 120  # seconds, hard cap on the execution window
+EXECUTION_QUIET_INTERVAL = 15  # stop early once the guest has been quiet this long
+EXECUTION_MIN_RUNTIME = 10  # never stop before this, however quiet
+EXECUTION_POLL_INTERVAL = 2  # how often to pull new monitor events
+PROCESS_TREE_REPORT_MAX = 50000  # processes kept in the report; the rest are counted as truncated
+
+# Screenshots during execution: one frame every SCREENSHOT_INTERVAL seconds,
+# near-duplicates (dHash distance, needs Pillow) folded into the previous frame
+SCREENSHOT_INTERVAL = 3
+SCREENSHOT_MAX_FRAMES = 120
+SCREENSHOT_DEDUP_DISTANCE = 4  # of 64 bits
+SCREENSHOT_THUMB_WIDTH = 320
+SCREENSHOT_QUALITY = 80  # JPEG quality for full frames and thumbnails
+SCREENSHOT_ENCODERS = 2  # encoder threads shared by all jobs on this worker
+
+# Behaviour rules: every *.json file in RULES_PATH, compiled once per worker
+RULES_PATH = os.path.join(os.path.dirname(__file__), "rules")
+SCORE_HIGH = 50  # score (0-100) at or above which risk_level is High
+SCORE_MEDIUM = 20
+# The summary sent back to the API lands in analyses.summary (TEXT, 64 KB):
+# matches and command lines stay in the report, reasons are capped
+SUMMARY_MAX_REASONS = 10
+SUMMARY_MAX_REASON_CHARS = 200
+MATCH_EXAMPLE_MAX_CHARS = 4096  # example command line kept per match in the report
+
+# VM pool: linked clones of VM_NAME at VM_SNAPSHOT, one analysis per clone
+VM_POOL_SIZE = 8
+VM_CLONE_PREFIX = "WinSandbox-"
+
+# Worker status endpoint (pool occupancy etc.), 0 disables it
+WORKER_STATUS_PORT = 8090
 
-EXECUTION_TIMEOUT = 120  # seconds
+# Warm standby: keep WARM_STANDBY clones resumed from VM_WARM_SNAPSHOT (a
+# running-state snapshot taken at the desktop) so jobs skip restore + boot
+VM_WARM_SNAPSHOT = "warm_desktop"
+WARM_STANDBY = 4
+GUEST_READY_TIMEOUT = 180  # seconds to wait for a guest to reach the desktop
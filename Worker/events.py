@@ -0,0 +1,64 @@
+import json
+import queue
+import threading
+import time
+import pika
+from .config import RABBITMQ_HOST, EVENTS_EXCHANGE
+
+
+class EventPublisher:
+    """
+    Best-effort progress events (stage transitions) to a fanout exchange that
+    every API instance listens on. Job threads call emit(); a single thread
+    owns the pika connection. Events are transient: if the broker is down or
+    the buffer is full they are dropped, and the final result still arrives
+    through the results path.
+    """
+
+    def __init__(self, host=RABBITMQ_HOST, exchange=EVENTS_EXCHANGE, maxsize=10000):
+        self.host = host
+        self.exchange = exchange
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="event-publisher", daemon=True)
+        self.dropped = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def emit(self, job, stage, status="running", progress=None, **extra):
+        event = {
+            "analysis_id": job.get("analysis_id"),
+            "file_hash": job.get("file_hash"),
+            "stage": stage,
+            "status": status,
+            "progress": progress,
+            "ts": time.time(),
+        }
+        event.update(extra)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type="fanout")
+                while True:
+                    try:
+                        event = self._queue.get(timeout=5)
+                    except queue.Empty:
+                        connection.process_data_events()  # keep heartbeats flowing
+                        continue
+                    channel.basic_publish(
+                        exchange=self.exchange,
+                        routing_key="",
+                        body=json.dumps(event).encode(),
+                        properties=pika.BasicProperties(content_type="application/json"),
+                    )
+            except Exception as e:
+                print("Event publisher error, reconnecting:", e)
+                time.sleep(2)
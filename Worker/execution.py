@@ -0,0 +1,93 @@
+import time
+from dataclasses import dataclass, field
+from .config import (
+    EXECUTION_TIMEOUT,
+    EXECUTION_QUIET_INTERVAL,
+    EXECUTION_MIN_RUNTIME,
+    EXECUTION_POLL_INTERVAL,
+)
+
+# Why an execution window ended
+STOP_QUIESCED = "quiesced"  # no guest activity for the quiet interval
+STOP_TIMEOUT = "timeout"    # hit the hard EXECUTION_TIMEOUT
+STOP_MONITOR_ERROR = "monitor_error"  # the activity feed kept failing; fall back to the hard cap
+
+
+@dataclass
+class ExecutionOutcome:
+    stop_reason: str
+    duration: float
+    last_activity_after: float  # seconds from start to the last observed activity
+    activity: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            "stop_reason": self.stop_reason,
+            "duration": round(self.duration, 1),
+            "last_activity_after": round(self.last_activity_after, 1),
+            "activity": dict(self.activity),
+        }
+
+
+class ExecutionController:
+    """
+    Decides how long a sample keeps running. Polls a monitor feed (anything
+    with poll() -> {kind: count}) and ends the window once the guest has been
+    quiet for `quiet_interval`, after at least `min_runtime`, and never later
+    than `hard_timeout`.
+    """
+
+    def __init__(
+        self,
+        hard_timeout=EXECUTION_TIMEOUT,
+        quiet_interval=EXECUTION_QUIET_INTERVAL,
+        min_runtime=EXECUTION_MIN_RUNTIME,
+        poll_interval=EXECUTION_POLL_INTERVAL,
+        max_feed_errors=3,
+    ):
+        self.hard_timeout = hard_timeout
+        self.quiet_interval = quiet_interval
+        self.min_runtime = min_runtime
+        self.poll_interval = poll_interval
+        self.max_feed_errors = max_feed_errors
+
+    def run(self, feed, clock=time.monotonic, sleep=time.sleep):
+        start = clock()
+        last_activity = start
+        totals = {}
+        feed_errors = 0
+        feed_ok = True
+
+        while True:
+            sleep(self.poll_interval)
+            now = clock()
+
+            if feed_ok:
+                try:
+                    counts = feed.poll()
+                    feed_errors = 0
+                except Exception as e:
+                    feed_errors += 1
+                    print(f"Monitor poll failed ({feed_errors}/{self.max_feed_errors}): {e}")
+                    counts = {}
+                    if feed_errors >= self.max_feed_errors:
+                        feed_ok = False
+                if any(counts.values()):
+                    last_activity = now
+                for kind, n in counts.items():
+                    totals[kind] = totals.get(kind, 0) + n
+
+            elapsed = now - start
+            if elapsed >= self.hard_timeout:
+                reason = STOP_TIMEOUT if feed_ok else STOP_MONITOR_ERROR
+                break
+            if feed_ok and elapsed >= self.min_runtime and now - last_activity >= self.quiet_interval:
+                reason = STOP_QUIESCED
+                break
+
+        return ExecutionOutcome(
+            stop_reason=reason,
+            duration=clock() - start,
+            last_activity_after=last_activity - start,
+            activity=totals,
+        )
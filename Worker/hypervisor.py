@@ -0,0 +1,560 @@
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+from .config import (
+    HYPERVISOR,
+    VBOXMANAGE,
+    VM_SNAPSHOT,
+    VM_WARM_SNAPSHOT,
+    GUEST_READY_TIMEOUT,
+    GUEST_USER,
+    GUEST_PASSWORD,
+)
+
+LOGGED_IN_USERS = "/VirtualBox/GuestInfo/OS/LoggedInUsers"
+
+
+class Hypervisor:
+    """
+    VM operations the worker needs. Backends implement the primitives; the
+    multi-step flows (cold start, warm resume, clone setup) live here so every
+    backend runs them the same way.
+    """
+
+    name = "base"
+
+    def vm_exists(self, vm_name):
+        raise NotImplementedError
+
+    def snapshot_exists(self, vm_name, snapshot):
+        raise NotImplementedError
+
+    def clone(self, base_vm, snapshot, vm_name):
+        """Linked clone of base_vm at snapshot, registered as vm_name."""
+        raise NotImplementedError
+
+    def take_snapshot(self, vm_name, snapshot):
+        raise NotImplementedError
+
+    def restore_snapshot(self, vm_name, snapshot):
+        raise NotImplementedError
+
+    def start(self, vm_name):
+        """Start headless (or resume a running-state snapshot)."""
+        raise NotImplementedError
+
+    def power_off(self, vm_name):
+        """Power off if running; a VM that is already off is not an error."""
+        raise NotImplementedError
+
+    def guest_property(self, vm_name, key):
+        """Guest property value, or None if unset."""
+        raise NotImplementedError
+
+    def guest_run(self, vm_name, exe, args):
+        """Run a program in the guest, wait for it, and return its stdout."""
+        raise NotImplementedError
+
+    def guest_start(self, vm_name, exe):
+        """Start a program in the guest without waiting for it."""
+        raise NotImplementedError
+
+    def screenshot_png(self, vm_name):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+    def wait_for_guest(self, vm_name, timeout=GUEST_READY_TIMEOUT, interval=0.5):
+        """Poll Guest Additions until a user is logged in at the desktop."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.guest_property(vm_name, LOGGED_IN_USERS) not in (None, "", "0"):
+                return
+            time.sleep(interval)
+        raise TimeoutError(f"{vm_name} did not reach the desktop within {timeout}s")
+
+    def cold_start(self, vm_name, snapshot=VM_SNAPSHOT):
+        """Restore a VM to `snapshot`, boot it and wait for the desktop."""
+        self.power_off(vm_name)
+        self.restore_snapshot(vm_name, snapshot)
+        self.start(vm_name)
+        self.wait_for_guest(vm_name)
+
+    def resume_warm(self, vm_name, snapshot=VM_WARM_SNAPSHOT):
+        """Restore a running-state snapshot and resume it: the guest comes back at the desktop."""
+        self.cold_start(vm_name, snapshot)
+
+    def create_clone(self, base_vm, snapshot, vm_name):
+        """Linked clone with its own copy of the clean snapshot, so it restores independently."""
+        self.clone(base_vm, snapshot, vm_name)
+        self.take_snapshot(vm_name, snapshot)
+
+
+class VBoxManageHypervisor(Hypervisor):
+    """One VBoxManage process per operation (no shell). Works everywhere VirtualBox does, but slowly."""
+
+    name = "vboxmanage"
+
+    def __init__(self, vboxmanage=VBOXMANAGE):
+        self.exe = vboxmanage
+
+    def _run(self, args, check=True):
+        result = subprocess.run([self.exe, *args], capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise RuntimeError(f"VBoxManage {args[0]} failed (exit {result.returncode}): {result.stderr.strip()}")
+        return result
+
+    def vm_exists(self, vm_name):
+        return self._run(["showvminfo", vm_name, "--machinereadable"], check=False).returncode == 0
+
+    def snapshot_exists(self, vm_name, snapshot):
+        return self._run(["snapshot", vm_name, "showvminfo", snapshot], check=False).returncode == 0
+
+    def clone(self, base_vm, snapshot, vm_name):
+        self._run(["clonevm", base_vm, "--snapshot", snapshot, "--options", "link", "--name", vm_name, "--register"])
+
+    def take_snapshot(self, vm_name, snapshot):
+        self._run(["snapshot", vm_name, "take", snapshot])
+
+    def restore_snapshot(self, vm_name, snapshot):
+        self._run(["snapshot", vm_name, "restore", snapshot])
+
+    def start(self, vm_name):
+        self._run(["startvm", vm_name, "--type", "headless"])
+
+    def power_off(self, vm_name):
+        self._run(["controlvm", vm_name, "poweroff"], check=False)
+
+    def guest_property(self, vm_name, key):
+        result = self._run(["guestproperty", "get", vm_name, key], check=False)
+        if result.returncode != 0 or not result.stdout.startswith("Value:"):
+            return None
+        return result.stdout.split(":", 1)[1].strip()
+
+    def guest_run(self, vm_name, exe, args):
+        result = self._run(
+            ["guestcontrol", vm_name, "run", "--exe", exe, "--username", GUEST_USER, "--password", GUEST_PASSWORD,
+             "--", exe, *args],
+            check=False,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{exe} failed in {vm_name} (exit {result.returncode})")
+        return result.stdout
+
+    def guest_start(self, vm_name, exe):
+        self._run(["guestcontrol", vm_name, "start", "--exe", exe, "--username", GUEST_USER,
+                   "--password", GUEST_PASSWORD])
+
+    def screenshot_png(self, vm_name):
+        fd, path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        try:
+            self._run(["controlvm", vm_name, "screenshotpng", path])
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class VBoxApiHypervisor(Hypervisor):
+    """
+    Long-lived session to VBoxSVC through the VirtualBox SDK bindings
+    (vboxapi). One manager per worker; each running VM keeps its session (for
+    the console: power, display, guest) and a guest session, so a poll of the
+    guest event log or a screenshot is an API call, not a process spawn plus a
+    VBoxSVC handshake.
+
+    COM needs per-thread initialisation on Windows; every public call does it
+    lazily for the calling thread.
+    """
+
+    name = "vboxapi"
+
+    def __init__(self):
+        from vboxapi import VirtualBoxManager  # ImportError: caller falls back to VBoxManage
+        self._mgr = VirtualBoxManager(None, None)
+        self._vbox = self._mgr.getVirtualBox()
+        self._const = self._mgr.constants
+        self._lock = threading.Lock()
+        self._sessions = {}        # vm name -> ISession holding a shared lock (console access)
+        self._guest_sessions = {}  # vm name -> IGuestSession
+        self._thread_state = threading.local()
+        self._calls = Counter()
+
+    def _init_thread(self, op):
+        if not getattr(self._thread_state, "ready", False):
+            self._mgr.initPerThread()
+            self._thread_state.ready = True
+        self._calls[op] += 1
+
+    def _machine(self, vm_name):
+        return self._vbox.findMachine(vm_name)
+
+    def _wait(self, progress, what):
+        progress.waitForCompletion(-1)
+        if progress.resultCode != 0:
+            info = progress.errorInfo
+            raise RuntimeError(f"{what} failed: {info.text if info else progress.resultCode}")
+
+    @contextmanager
+    def _locked(self, vm_name):
+        # Snapshot operations need a write lock on a stopped VM, a shared one on a running VM
+        const = self._const
+        machine = self._machine(vm_name)
+        running = machine.state in (const.MachineState_Running, const.MachineState_Paused)
+        session = self._mgr.getSessionObject()
+        machine.lockMachine(session, const.LockType_Shared if running else const.LockType_Write)
+        try:
+            yield session
+        finally:
+            session.unlockMachine()
+
+    def _console(self, vm_name):
+        with self._lock:
+            session = self._sessions.get(vm_name)
+            if session is None or session.state != self._const.SessionState_Locked:
+                session = self._mgr.getSessionObject()
+                self._machine(vm_name).lockMachine(session, self._const.LockType_Shared)
+                self._sessions[vm_name] = session
+            return session.console
+
+    def _guest_session(self, vm_name):
+        with self._lock:
+            guest_session = self._guest_sessions.get(vm_name)
+        if guest_session is not None and guest_session.status == self._const.GuestSessionStatus_Started:
+            return guest_session
+        guest_session = self._console(vm_name).guest.createSession(GUEST_USER, GUEST_PASSWORD, "", "vex-worker")
+        guest_session.waitForArray([self._const.GuestSessionWaitForFlag_Start], 30000)
+        with self._lock:
+            self._guest_sessions[vm_name] = guest_session
+        return guest_session
+
+    def _forget(self, vm_name):
+        with self._lock:
+            guest_session = self._guest_sessions.pop(vm_name, None)
+            session = self._sessions.pop(vm_name, None)
+        for release in (lambda: guest_session and guest_session.close(),
+                        lambda: session and session.unlockMachine()):
+            try:
+                release()
+            except Exception:
+                pass  # the VM went away underneath us; nothing left to release
+
+    def vm_exists(self, vm_name):
+        self._init_thread("vm_exists")
+        try:
+            self._machine(vm_name)
+            return True
+        except Exception:
+            return False
+
+    def snapshot_exists(self, vm_name, snapshot):
+        self._init_thread("snapshot_exists")
+        try:
+            self._machine(vm_name).findSnapshot(snapshot)
+            return True
+        except Exception:
+            return False
+
+    def clone(self, base_vm, snapshot, vm_name):
+        self._init_thread("clone")
+        source = self._machine(base_vm)
+        target = self._vbox.createMachine("", vm_name, [], source.OSTypeId, "")
+        progress = source.findSnapshot(snapshot).machine.cloneTo(
+            target, self._const.CloneMode_MachineState, [self._const.CloneOptions_Link]
+        )
+        self._wait(progress, f"clone {base_vm} -> {vm_name}")
+        self._vbox.registerMachine(target)
+
+    def take_snapshot(self, vm_name, snapshot):
+        self._init_thread("take_snapshot")
+        with self._locked(vm_name) as session:
+            progress, _ = session.machine.takeSnapshot(snapshot, "", False)
+            self._wait(progress, f"snapshot {vm_name}/{snapshot}")
+
+    def restore_snapshot(self, vm_name, snapshot):
+        self._init_thread("restore_snapshot")
+        with self._locked(vm_name) as session:
+            target = session.machine.findSnapshot(snapshot)
+            self._wait(session.machine.restoreSnapshot(target), f"restore {vm_name}/{snapshot}")
+
+    def start(self, vm_name):
+        self._init_thread("start")
+        self._forget(vm_name)
+        session = self._mgr.getSessionObject()
+        self._wait(self._machine(vm_name).launchVMProcess(session, "headless", []), f"start {vm_name}")
+        with self._lock:
+            self._sessions[vm_name] = session
+
+    def power_off(self, vm_name):
+        self._init_thread("power_off")
+        const = self._const
+        try:
+            state = self._machine(vm_name).state
+            if state in (const.MachineState_Running, const.MachineState_Paused, const.MachineState_Stuck):
+                self._wait(self._console(vm_name).powerDown(), f"power off {vm_name}")
+        finally:
+            self._forget(vm_name)
+
+    def guest_property(self, vm_name, key):
+        self._init_thread("guest_property")
+        return self._machine(vm_name).getGuestPropertyValue(key) or None
+
+    def guest_run(self, vm_name, exe, args):
+        self._init_thread("guest_run")
+        const = self._const
+        process = self._guest_session(vm_name).processCreate(
+            exe, [exe, *args], [], [const.ProcessCreateFlag_WaitForStdOut], 0
+        )
+        out = bytearray()
+        while True:
+            process.waitForArray([const.ProcessWaitForFlag_StdOut, const.ProcessWaitForFlag_Terminate], 1000)
+            data = process.read(1, 65536, 0)
+            if data:
+                out += bytes(data)
+                continue
+            if process.status >= const.ProcessStatus_TerminatedNormally:
+                break
+        if process.exitCode != 0:
+            raise RuntimeError(f"{exe} failed in {vm_name} (exit {process.exitCode})")
+        return out.decode("utf-8", "replace")
+
+    def guest_start(self, vm_name, exe):
+        self._init_thread("guest_start")
+        process = self._guest_session(vm_name).processCreate(exe, [exe], [], [], 0)
+        process.waitForArray([self._const.ProcessWaitForFlag_Start], 30000)
+
+    def screenshot_png(self, vm_name):
+        self._init_thread("screenshot_png")
+        display = self._console(vm_name).display
+        width, height, _, _, _, _ = display.getScreenResolution(0)
+        return bytes(display.takeScreenShotToArray(0, width, height, self._const.BitmapFormat_PNG))
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "sessions": len(self._sessions), "calls": dict(self._calls)}
+
+
+def _png(width=1, height=1, rgb=(0, 0, 0)):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+FAKE_EVENT_NS = "http://schemas.microsoft.com/win/2004/08/events/event"
+
+
+class FakeGuest:
+    """
+    Scripted guest for FakeHypervisor: starting a program "runs" a sample that
+    spawns `processes` children spread over `duration` seconds, and wevtutil
+    queries return them as Sysmon ProcessCreate XML. Like the real event log,
+    a record id is assigned when an event is written, so ids follow the order
+    in which events become visible.
+    """
+
+    GUEST_CONTROL = "C:\\Windows\\System32\\VBoxService.exe"
+
+    def __init__(self, processes=20, duration=2.0, images=("cmd.exe", "powershell.exe", "conhost.exe")):
+        self.processes = processes
+        self.duration = duration
+        self.images = images
+        self._logs = {}  # vm name -> {"next_id", "pending": [(visible_at, seq, fields)], "written": [(rid, xml)]}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _log(self, vm_name):
+        return self._logs.setdefault(vm_name, {"next_id": 1001, "pending": [], "written": []})
+
+    def reset(self, vm_name):
+        with self._lock:
+            self._logs.pop(vm_name, None)
+
+    def _schedule(self, log, at, **fields):
+        self._seq += 1
+        log["pending"].append((at, self._seq, fields))
+
+    def _write_due(self, log, now):
+        due = sorted(e for e in log["pending"] if e[0] <= now)
+        log["pending"] = [e for e in log["pending"] if e[0] > now]
+        for _, _, fields in due:
+            rid = log["next_id"]
+            log["next_id"] += 1
+            log["written"].append((rid, self._event_xml(rid, **fields)))
+
+    def start(self, vm_name, exe):
+        # Launched through guest control, exactly like the wevtutil queries
+        now = time.monotonic()
+        with self._lock:
+            log = self._log(vm_name)
+            self._schedule(log, now, image=exe, ppid=1, guid="root", parent_guid="vboxsvc",
+                           parent_image=self.GUEST_CONTROL)
+            for i in range(self.processes):
+                image = "C:\\Windows\\System32\\" + self.images[i % len(self.images)]
+                self._schedule(log, now + self.duration * (i + 1) / self.processes, image=image, ppid=100 + i,
+                               guid=f"p{i}", parent_guid="root", parent_image=exe)
+
+    def run(self, vm_name, exe, args):
+        if not exe.lower().endswith("wevtutil.exe"):
+            return ""
+        now = time.monotonic()
+        with self._lock:
+            log = self._log(vm_name)
+            self._write_due(log, now)
+            visible = list(log["written"])
+            # The query itself shows up in Sysmon, after what it read (for the next poll)
+            self._schedule(log, now, image=exe, ppid=1, guid=f"w{self._seq}", parent_guid="vboxsvc",
+                           cmdline=" ".join([exe, *args]), parent_image=self.GUEST_CONTROL)
+        if "/c:1" in args:
+            return visible[-1][1] if visible else ""
+        after = 0
+        for arg in args:
+            if "EventRecordID>" in arg:
+                after = int(arg.split("EventRecordID>", 1)[1].split("]", 1)[0])
+        return "".join(xml for rid, xml in visible if rid > after)
+
+    @staticmethod
+    def _event_xml(record_id, image, ppid, guid, parent_guid, cmdline=None, parent_image=""):
+        return (
+            f'<Event xmlns="{FAKE_EVENT_NS}"><System><EventID>1</EventID>'
+            f"<EventRecordID>{record_id}</EventRecordID></System><EventData>"
+            f'<Data Name="ProcessGuid">{guid}</Data><Data Name="ProcessId">{record_id}</Data>'
+            f'<Data Name="Image">{image}</Data><Data Name="CommandLine">{escape(cmdline or image)}</Data>'
+            f'<Data Name="ParentProcessGuid">{parent_guid}</Data><Data Name="ParentProcessId">{ppid}</Data>'
+            f'<Data Name="ParentImage">{parent_image}</Data>'
+            f"</EventData></Event>"
+        )
+
+
+class FakeHypervisor(Hypervisor):
+    """
+    In-process hypervisor for tests and benchmarks on machines without
+    VirtualBox. VMs, snapshots and power state live in memory; `boot_time`,
+    `restore_time` and `op_latency` (added to every call, e.g. to model a
+    process spawn per command) make timings realistic.
+    """
+
+    name = "fake"
+
+    def __init__(self, boot_time=0.0, restore_time=0.0, op_latency=0.0, guest=None):
+        self.boot_time = boot_time
+        self.restore_time = restore_time
+        self.op_latency = op_latency
+        self.guest = guest or FakeGuest()
+        self._vms = {}  # name -> {"running", "ready_at", "snapshots": {name: was_running}}
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._screen = _png()
+
+    def add_vm(self, vm_name, snapshots=(VM_SNAPSHOT,)):
+        with self._lock:
+            self._vms[vm_name] = {"running": False, "ready_at": 0.0, "snapshots": {s: False for s in snapshots}}
+
+    def _op(self, op, vm_name=None):
+        self._calls[op] += 1
+        if self.op_latency:
+            time.sleep(self.op_latency)
+        if vm_name is not None and vm_name not in self._vms:
+            raise RuntimeError(f"No such VM: {vm_name}")
+        return self._vms.get(vm_name)
+
+    def vm_exists(self, vm_name):
+        self._op("vm_exists")
+        return vm_name in self._vms
+
+    def snapshot_exists(self, vm_name, snapshot):
+        self._op("snapshot_exists")
+        vm = self._vms.get(vm_name)
+        return vm is not None and snapshot in vm["snapshots"]
+
+    def clone(self, base_vm, snapshot, vm_name):
+        base = self._op("clone", base_vm)
+        if snapshot not in base["snapshots"]:
+            raise RuntimeError(f"No snapshot {snapshot} on {base_vm}")
+        self.add_vm(vm_name, snapshots=())
+
+    def take_snapshot(self, vm_name, snapshot):
+        vm = self._op("take_snapshot", vm_name)
+        with self._lock:
+            vm["snapshots"][snapshot] = vm["running"]
+
+    def restore_snapshot(self, vm_name, snapshot):
+        vm = self._op("restore_snapshot", vm_name)
+        if snapshot not in vm["snapshots"]:
+            raise RuntimeError(f"No snapshot {snapshot} on {vm_name}")
+        time.sleep(self.restore_time)
+        with self._lock:
+            vm["resume"] = vm["snapshots"][snapshot]  # running-state snapshot: no boot on start
+        self.guest.reset(vm_name)
+
+    def start(self, vm_name):
+        vm = self._op("start", vm_name)
+        with self._lock:
+            vm["running"] = True
+            vm["ready_at"] = time.monotonic() + (0.0 if vm.pop("resume", False) else self.boot_time)
+
+    def power_off(self, vm_name):
+        vm = self._op("power_off", vm_name)
+        with self._lock:
+            vm["running"] = False
+
+    def guest_property(self, vm_name, key):
+        vm = self._op("guest_property", vm_name)
+        if key == LOGGED_IN_USERS and vm["running"]:
+            return "1" if time.monotonic() >= vm["ready_at"] else "0"
+        return None
+
+    def guest_run(self, vm_name, exe, args):
+        vm = self._op("guest_run", vm_name)
+        if not vm["running"]:
+            raise RuntimeError(f"{vm_name} is not running")
+        return self.guest.run(vm_name, exe, args)
+
+    def guest_start(self, vm_name, exe):
+        self._op("guest_start", vm_name)
+        self.guest.start(vm_name, exe)
+
+    def screenshot_png(self, vm_name):
+        self._op("screenshot_png", vm_name)
+        return self._screen
+
+    def wait_for_guest(self, vm_name, timeout=GUEST_READY_TIMEOUT, interval=0.05):
+        super().wait_for_guest(vm_name, timeout, interval)
+
+    def stats(self):
+        return {"backend": self.name, "vms": len(self._vms), "calls": dict(self._calls)}
+
+
+_hypervisor = None
+_hypervisor_lock = threading.Lock()
+
+
+def make_hypervisor(kind=HYPERVISOR):
+    if kind == "fake":
+        return FakeHypervisor()
+    if kind == "vboxmanage":
+        return VBoxManageHypervisor()
+    try:
+        return VBoxApiHypervisor()
+    except Exception as e:
+        print(f"vboxapi unavailable ({e}); falling back to VBoxManage per command")
+        return VBoxManageHypervisor()
+
+
+def get_hypervisor():
+    """The worker's shared backend, created on first use (HYPERVISOR in config)."""
+    global _hypervisor
+    with _hypervisor_lock:
+        if _hypervisor is None:
+            _hypervisor = make_hypervisor()
+        return _hypervisor
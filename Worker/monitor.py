@@ -1,21 +1,208 @@
+import xml.etree.ElementTree as ET
+from .process_tree import ProcessTree
 
-def collect_process_tree():
+SYSMON_CHANNEL = "Microsoft-Windows-Sysmon/Operational"
+EVENT_NS = "{http://schemas.microsoft.com/win/2004/08/events/event}"
+
+# Sysmon event ids that count as guest activity for the execution window
+ACTIVITY_EVENT_IDS = {
+    1: "process",    # ProcessCreate
+    11: "file",      # FileCreate
+    23: "file",      # FileDelete
+    12: "registry",  # RegistryEvent (Object create and delete)
+    13: "registry",  # RegistryEvent (Value Set)
+    14: "registry",  # RegistryEvent (Key and Value Rename)
+}
+
+PROCESS_CREATE = 1
+TREE_EVENT_IDS = {PROCESS_CREATE}
+PROCESS_FIELDS = {
+    "ProcessGuid", "ProcessId", "Image", "CommandLine",
+    "ParentProcessGuid", "ParentProcessId", "ParentImage",
+}
+
+# Every poll runs wevtutil through guest control, which Sysmon logs as a
+# ProcessCreate. Those processes (and their children, e.g. conhost) are
+# recognised by the exact command line this feed issued; the sample itself is
+# also launched through guest control, so the parent image says nothing.
+MONITOR_IMAGE = "wevtutil.exe"
+
+
+def _basename(path):
+    return (path or "").replace("/", "\\").rsplit("\\", 1)[-1].lower()
+
+
+class SysmonFeed:
+    """
+    Pulls Sysmon events from the guest incrementally: each poll() asks only for
+    records newer than the last one seen, so the cost of a poll does not grow
+    with the length of the run. ProcessCreate events are added to `tree` as
+    they arrive, so the process tree is built during execution.
+
+    `query` runs wevtutil in the guest and returns its stdout, e.g.
+    Hypervisor.guest_run bound to a VM and wevtutil.exe.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.last_record_id = 0
+        self.totals = {kind: 0 for kind in set(ACTIVITY_EVENT_IDS.values())}
+        self.tree = ProcessTree()
+        self.ignored = 0
+        self._issued = {}  # argument string of our queries not yet seen in the log -> count
+        self._own_guids = set()  # ProcessGuids of monitor processes, to drop their children too
+
+    def _query(self, args):
+        tail = " ".join(args)
+        self._issued[tail] = self._issued.get(tail, 0) + 1
+        return self.query(args)
+
+    def skip_existing(self):
+        """Start after the newest record already in the log (reads a single event)."""
+        for event in iter_events([self._query(["qe", SYSMON_CHANNEL, "/c:1", "/rd:true", "/f:xml"])]):
+            self.last_record_id = max(self.last_record_id, event.record_id)
+
+    def poll(self):
+        """Return activity counts by kind for events since the previous poll."""
+        out = self._query([
+            "qe", SYSMON_CHANNEL,
+            f"/q:*[System[EventRecordID>{self.last_record_id}]]",
+            "/f:xml",
+        ])
+        counts = {kind: 0 for kind in self.totals}
+        for event in iter_events([out]):
+            if event.record_id <= self.last_record_id:
+                continue
+            self.last_record_id = event.record_id
+            if event.event_id == PROCESS_CREATE:
+                if self._is_own_process(event.data):
+                    self.ignored += 1
+                    continue
+                self.tree.add_event(event.data)
+            kind = ACTIVITY_EVENT_IDS.get(event.event_id)
+            if kind:
+                counts[kind] += 1
+                self.totals[kind] += 1
+        return counts
+
+    def _is_own_process(self, data):
+        """
+        One of this feed's wevtutil queries (matched on its exact arguments),
+        or a child of one. Anything else, including a sample's own wevtutil
+        (e.g. `wevtutil cl` of the Sysmon channel), is sample activity.
+        """
+        if data.get("ParentProcessGuid") in self._own_guids:
+            own = True
+        else:
+            own = False
+            cmdline = (data.get("CommandLine") or "").rstrip()
+            if _basename(data.get("Image")) == MONITOR_IMAGE:
+                for tail in self._issued:
+                    if cmdline.endswith(" " + tail):
+                        own = True
+                        self._issued[tail] -= 1
+                        if not self._issued[tail]:
+                            del self._issued[tail]
+                        break
+        if own and data.get("ProcessGuid"):
+            self._own_guids.add(data["ProcessGuid"])
+        return own
+
+    def drain(self):
+        """Pull whatever is left after execution stops, so the tree is complete."""
+        self.poll()
+        return self.tree
+
+
+class SysmonEvent:
+    __slots__ = ("event_id", "record_id", "data")
+
+    def __init__(self, event_id, record_id, data):
+        self.event_id = event_id
+        self.record_id = record_id
+        self.data = data  # EventData Name -> value, only for events we build state from
+
+
+def iter_events(chunks):
     """
-    Minimal placeholder.
-    In real version:
-    - Parse Sysmon logs
-    - Extract PID / PPID / Image
+    Stream Sysmon events out of wevtutil-style XML (bare <Event> elements,
+    split across any number of text chunks). Each element is dropped as soon
+    as it has been read, so memory does not grow with the size of the log.
     """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed("<Events>")
+    root = None
+    for piece in _slices(chunks):
+        parser.feed(piece)
+        for kind, elem in parser.read_events():
+            if kind == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == f"{EVENT_NS}Event":
+                yield _event_from_element(elem)
+                root.clear()
+    parser.feed("</Events>")
+    for kind, elem in parser.read_events():
+        if kind == "end" and elem.tag == f"{EVENT_NS}Event":
+            yield _event_from_element(elem)
+    parser.close()
+
+
+def _slices(chunks, size=64 * 1024):
+    # Feed the parser in small pieces so elements can be cleared as we go,
+    # even when one wevtutil poll returns a very large document
+    for chunk in chunks:
+        for start in range(0, len(chunk), size):
+            yield chunk[start:start + size]
+
+
+def iter_evtx_events(path):
+    """Stream events from an exported .evtx file (needs the optional python-evtx package)."""
+    try:
+        from Evtx.Evtx import Evtx
+    except ImportError:
+        raise RuntimeError("python-evtx is required to read .evtx files")
+    with Evtx(path) as log:
+        yield from iter_events(record.xml() for record in log.records())
+
+
+def iter_xml_file_events(path, chunk_size=1024 * 1024):
+    """Stream events from a `wevtutil qe ... /f:xml` dump on disk."""
+    def chunks():
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    yield from iter_events(chunks())
+
+
+def load_process_tree(path):
+    """Build a ProcessTree from a saved Sysmon log (.evtx or XML) without loading it whole."""
+    events = iter_evtx_events(path) if path.lower().endswith(".evtx") else iter_xml_file_events(path)
+    tree = ProcessTree()
+    for event in events:
+        if event.event_id == PROCESS_CREATE:
+            tree.add_event(event.data)
+    return tree
+
+
+def _event_from_element(event):
+    system = event.find(f"{EVENT_NS}System")
+    event_id = int(system.findtext(f"{EVENT_NS}EventID", "0"))
+    record_id = int(system.findtext(f"{EVENT_NS}EventRecordID", "0"))
+    data = None
+    if event_id in TREE_EVENT_IDS:
+        data = {}
+        for item in event.iter(f"{EVENT_NS}Data"):
+            name = item.get("Name")
+            if name in PROCESS_FIELDS:
+                data[name] = item.text
+    return SysmonEvent(event_id, record_id, data)
+
 
-    return {
-        "root": "malware.exe",
-        "children": [
-            {
-                "pid": 1234,
-                "image": "cmd.exe",
-                "children": [
-                    {"pid": 5678, "image": "powershell.exe", "children": []}
-                ]
-            }
-        ]
-    }
+def collect_process_tree(feed):
+    """Final process tree for a run, built incrementally by the feed's polls."""
+    return feed.drain()
@@ -0,0 +1,153 @@
+from array import array
+
+
+class StringTable:
+    """Interns repeated strings (images, command lines) as small integer ids."""
+
+    __slots__ = ("_ids", "_values")
+
+    def __init__(self):
+        self._ids = {}
+        self._values = []
+
+    def intern(self, value):
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = len(self._values)
+            self._ids[value] = idx
+            self._values.append(value)
+        return idx
+
+    def __getitem__(self, idx):
+        return self._values[idx]
+
+    def __len__(self):
+        return len(self._values)
+
+    def values(self):
+        return list(self._values)
+
+
+class ProcessTree:
+    """
+    Process tree stored column-wise: one row per ProcessCreate event, with
+    pid/ppid/image/cmdline/parent kept in typed arrays and image and command
+    line strings interned. Children are linked through first_child /
+    next_sibling columns, so rows can be appended as events stream in and a
+    fork bomb of tens of thousands of processes costs a few dozen bytes per
+    process instead of a dict per node.
+
+    Parents are matched on Sysmon's ProcessGuid (PIDs get reused); a process
+    whose parent was never seen becomes a root.
+    """
+
+    def __init__(self):
+        self.images = StringTable()
+        self.cmdlines = StringTable()
+        self.pid = array("l")
+        self.ppid = array("l")
+        self.image_id = array("l")
+        self.cmdline_id = array("l")
+        self.parent = array("l")
+        self.first_child = array("l")
+        self.last_child = array("l")
+        self.next_sibling = array("l")
+        self._by_guid = {}
+        self._by_pid = {}  # latest row per pid, for events without GUIDs
+
+    def __len__(self):
+        return len(self.pid)
+
+    def add(self, pid, ppid, image, cmdline="", guid=None, parent_guid=None):
+        """Append a process; returns its row index."""
+        row = len(self.pid)
+        parent = self._by_guid.get(parent_guid, -1) if parent_guid else self._by_pid.get(ppid, -1)
+
+        self.pid.append(pid)
+        self.ppid.append(ppid)
+        self.image_id.append(self.images.intern(image))
+        self.cmdline_id.append(self.cmdlines.intern(cmdline))
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+
+        if parent >= 0:
+            if self.first_child[parent] < 0:
+                self.first_child[parent] = row
+            else:
+                self.next_sibling[self.last_child[parent]] = row
+            self.last_child[parent] = row
+
+        if guid:
+            self._by_guid[guid] = row
+        self._by_pid[pid] = row
+        return row
+
+    def add_event(self, data):
+        """Add a Sysmon ProcessCreate (event 1) from its EventData fields."""
+        return self.add(
+            _int(data.get("ProcessId")),
+            _int(data.get("ParentProcessId")),
+            data.get("Image") or "",
+            data.get("CommandLine") or "",
+            data.get("ProcessGuid"),
+            data.get("ParentProcessGuid"),
+        )
+
+    def image(self, row):
+        return self.images[self.image_id[row]]
+
+    def cmdline(self, row):
+        return self.cmdlines[self.cmdline_id[row]]
+
+    def roots(self):
+        return [row for row in range(len(self.pid)) if self.parent[row] < 0]
+
+    def children(self, row):
+        child = self.first_child[row]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def walk(self):
+        """Depth-first (row, depth) over every process; iterative, so deep spawn chains are fine."""
+        stack = [(row, 0) for row in reversed(self.roots())]
+        while stack:
+            row, depth = stack.pop()
+            yield row, depth
+            kids = list(self.children(row))
+            stack.extend((child, depth + 1) for child in reversed(kids))
+
+    def image_counts(self):
+        """{image_id: process count}."""
+        counts = {}
+        for image_id in self.image_id:
+            counts[image_id] = counts.get(image_id, 0) + 1
+        return counts
+
+    def to_report(self, max_nodes=None):
+        """
+        Flat, columnar form for the JSON report (no nesting, so no recursion
+        limits): parallel lists indexed by row, with images and command lines
+        as ids into their string tables.
+        """
+        n = len(self.pid) if max_nodes is None else min(len(self.pid), max_nodes)
+        return {
+            "count": len(self.pid),
+            "truncated": len(self.pid) - n,
+            "images": self.images.values(),
+            "cmdlines": self.cmdlines.values(),
+            "pid": self.pid[:n].tolist(),
+            "ppid": self.ppid[:n].tolist(),
+            "image": self.image_id[:n].tolist(),
+            "cmdline": self.cmdline_id[:n].tolist(),
+            "parent": self.parent[:n].tolist(),
+        }
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
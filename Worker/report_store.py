@@ -0,0 +1,38 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from .config import REPORTS_PATH
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+
+def save_report(report, root=REPORTS_PATH):
+    """
+    Write a report to the shared, content-addressed report store and return
+    (ref, uncompressed size). The layout is the one the backend reads
+    (Backend/fourat/core/report_store.py):
+        <root>/<ab>/<cd>/<sha256 of the JSON>.json.zst   (or .json.gz without zstandard)
+    Only the ref goes back to the API; the report itself never touches MySQL.
+    """
+    data = json.dumps(report, separators=(",", ":"), default=str).encode()
+    digest = hashlib.sha256(data).hexdigest()
+    suffix = ".json.zst" if zstandard else ".json.gz"
+    ref = "/".join((digest[:2], digest[2:4], digest + suffix))
+    path = os.path.join(root, digest[:2], digest[2:4], digest + suffix)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if zstandard:
+            blob = zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            blob = gzip.compress(data, compresslevel=6)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+    return ref, len(data)
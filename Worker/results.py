@@ -0,0 +1,28 @@
+import json
+from datetime import datetime
+import pika
+from .config import RESULTS_QUEUE
+
+
+def result_message(job, status, **fields):
+    """Result/stage-transition message for the API's results consumer (core/results.py)."""
+    message = {
+        "analysis_id": job.get("analysis_id"),
+        "file_hash": job.get("file_hash"),
+        "status": status,
+    }
+    if status in ("finished", "error"):
+        # Stamped once on the worker so redeliveries write the same value
+        message["analyzed_at"] = datetime.utcnow().isoformat(timespec="seconds")
+    message.update(fields)
+    return message
+
+
+def publish_result(channel, message):
+    """Must run on the connection thread (pika channels are not thread-safe)."""
+    channel.basic_publish(
+        exchange="",
+        routing_key=RESULTS_QUEUE,
+        body=json.dumps(message).encode(),
+        properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+    )
@@ -0,0 +1,211 @@
+import glob
+import json
+import ntpath
+import os
+from collections import deque
+from .config import RULES_PATH, SCORE_HIGH, SCORE_MEDIUM, MATCH_EXAMPLE_MAX_CHARS
+
+
+class PatternMatcher:
+    """Aho-Corasick automaton: finds every pattern occurring in a text in one scan."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(pattern_id)
+
+        # Breadth-first failure links; each state inherits its fail state's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text):
+        """Set of pattern ids found in text."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class Rule:
+    __slots__ = ("id", "description", "weight", "images", "parent_images", "cmdline", "any_process", "min_count")
+
+    def __init__(self, spec, source):
+        self.id = spec.get("id")
+        if not self.id:
+            raise ValueError(f"{source}: rule without an id")
+        self.description = spec.get("description", self.id)
+        self.weight = int(spec.get("weight", 0))
+        self.images = {name.lower() for name in spec.get("image", [])}
+        self.parent_images = {name.lower() for name in spec.get("parent_image", [])}
+        self.cmdline = [pattern.lower() for pattern in spec.get("cmdline", [])]
+        self.any_process = bool(spec.get("any_process", False))  # e.g. process-count rules
+        self.min_count = int(spec.get("min_count", 1))
+        if not (self.images or self.parent_images or self.cmdline or self.any_process):
+            raise ValueError(f"{source}: rule {self.id} has no image, parent_image, cmdline or any_process condition")
+
+
+def load_rules(path=RULES_PATH):
+    """Every rule in path/*.json (each file holds a list of rules), in file order."""
+    rules, seen = [], set()
+    for filename in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(filename, "r", encoding="utf-8") as f:
+            specs = json.load(f)
+        for spec in specs:
+            rule = Rule(spec, filename)
+            if rule.id in seen:
+                raise ValueError(f"{filename}: duplicate rule id {rule.id}")
+            seen.add(rule.id)
+            rules.append(rule)
+    return rules
+
+
+class RuleEngine:
+    """
+    Rules compiled into indexes so a tree is scored in one pass over its rows:
+
+    - rules with an image condition are indexed by image basename,
+    - rules keyed on command lines share one Aho-Corasick matcher,
+    - rules with only a parent condition are indexed by parent basename,
+    - any_process rules (counts) are candidates for every process.
+
+    Each rule is indexed under one of those keys and its other conditions are
+    checked only for processes it is a candidate for. Images and command lines
+    are interned in the tree, so lookups and matching run once per distinct
+    string rather than once per process.
+
+    Conditions within a rule are ANDed; lists within a condition are ORed
+    (cmdline entries are case-insensitive substrings, images are basenames).
+    A rule fires once at least min_count processes match, and adds its
+    weight to the score (capped at 100).
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._by_image = {}
+        self._by_parent = {}
+        self._by_pattern = []
+        self._always = []
+        patterns, pattern_ids = [], {}
+
+        for idx, rule in enumerate(rules):
+            for pattern in rule.cmdline:
+                if pattern not in pattern_ids:
+                    pattern_ids[pattern] = len(patterns)
+                    patterns.append(pattern)
+                    self._by_pattern.append([])
+            if rule.images:
+                for image in rule.images:
+                    self._by_image.setdefault(image, []).append(idx)
+            elif rule.cmdline:
+                for pattern in rule.cmdline:
+                    self._by_pattern[pattern_ids[pattern]].append(idx)
+            elif rule.parent_images:
+                for image in rule.parent_images:
+                    self._by_parent.setdefault(image, []).append(idx)
+            else:
+                self._always.append(idx)
+
+        self._rule_patterns = [{pattern_ids[p] for p in rule.cmdline} for rule in rules]
+        self._matcher = PatternMatcher(patterns)
+
+    @classmethod
+    def from_path(cls, path=RULES_PATH):
+        return cls(load_rules(path))
+
+    def evaluate(self, tree):
+        """Return (score, [match dicts]) for a ProcessTree."""
+        image_names = [ntpath.basename(image).lower() for image in tree.images.values()]
+        cmdline_hits = {}
+        counts = [0] * len(self.rules)
+        first_row = [-1] * len(self.rules)
+
+        for row in range(len(tree)):
+            image = image_names[tree.image_id[row]]
+            parent = tree.parent[row]
+            parent_image = image_names[tree.image_id[parent]] if parent >= 0 else None
+
+            cmdline_id = tree.cmdline_id[row]
+            patterns = cmdline_hits.get(cmdline_id)
+            if patterns is None:
+                patterns = self._matcher.find(tree.cmdlines[cmdline_id].lower())
+                cmdline_hits[cmdline_id] = patterns
+
+            candidates = set(self._always)
+            candidates.update(self._by_image.get(image, ()))
+            for pattern_id in patterns:
+                candidates.update(self._by_pattern[pattern_id])
+            if parent_image:
+                candidates.update(self._by_parent.get(parent_image, ()))
+
+            for idx in candidates:
+                rule = self.rules[idx]
+                if rule.images and image not in rule.images:
+                    continue
+                if rule.parent_images and parent_image not in rule.parent_images:
+                    continue
+                if rule.cmdline and not (self._rule_patterns[idx] & patterns):
+                    continue
+                counts[idx] += 1
+                if first_row[idx] < 0:
+                    first_row[idx] = row
+
+        matches = []
+        for idx, rule in enumerate(self.rules):
+            if counts[idx] < rule.min_count:
+                continue
+            row = first_row[idx]
+            matches.append({
+                "rule": rule.id,
+                "description": rule.description,
+                "weight": rule.weight,
+                "count": counts[idx],
+                "example": {"pid": tree.pid[row], "image": tree.image(row),
+                            "cmdline": tree.cmdline(row)[:MATCH_EXAMPLE_MAX_CHARS]},
+            })
+        score = min(100, max(0, sum(match["weight"] for match in matches)))
+        return score, matches
+
+
+def risk_level(score):
+    if score >= SCORE_HIGH:
+        return "High"
+    if score >= SCORE_MEDIUM:
+        return "Medium"
+    return "Low"
+
+
+_default_engine = None
+
+
+def default_engine():
+    """Rules from RULES_PATH, compiled once per worker process."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = RuleEngine.from_path()
+    return _default_engine
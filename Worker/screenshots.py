@@ -1,13 +1,146 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import (
+    VM_NAME,
+    RESULTS_PATH,
+    SCREENSHOT_INTERVAL,
+    SCREENSHOT_MAX_FRAMES,
+    SCREENSHOT_DEDUP_DISTANCE,
+    SCREENSHOT_THUMB_WIDTH,
+    SCREENSHOT_QUALITY,
+    SCREENSHOT_ENCODERS,
+)
+from .hypervisor import get_hypervisor
 
-import subprocess
-from .config import VM_NAME, RESULTS_PATH
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow frames are kept as PNG and deduped by exact hash
+    Image = None
 
-def take_screenshot(job_id):
+# Shared by every job on this worker, so concurrent VMs cannot oversubscribe the CPU with encoding
+_encoders = ThreadPoolExecutor(max_workers=SCREENSHOT_ENCODERS, thread_name_prefix="screenshot-encode")
+
+
+def capture_png(vm_name):
+    """Grab the VM display as PNG bytes through the worker's hypervisor backend."""
+    return get_hypervisor().screenshot_png(vm_name)
+
+
+def take_screenshot(job_id, vm_name=VM_NAME):
+    """Single full-size PNG, for callers that only want one frame."""
     path = f"{RESULTS_PATH}/{job_id}.png"
-    subprocess.run(
-        f'controlvm {VM_NAME} screenshotpng {path}',
-        shell=True,
-        check=True
-    )
+    with open(path, "wb") as f:
+        f.write(capture_png(vm_name))
     return path
 
+
+def dhash(image, size=8):
+    """64-bit difference hash: robust to compression noise and tiny changes like a blinking caret."""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class ScreenshotRecorder:
+    """
+    Samples the VM display every `interval` seconds on its own thread while
+    the sample runs. A frame that is perceptually the same as the last kept
+    one (dHash within `dedup_distance` bits; exact match without Pillow) only
+    extends that frame's time span. Kept frames are handed to the shared
+    encoder pool, which writes a compressed full frame and a thumbnail, so
+    neither capture nor the job waits on encoding.
+
+    stop() takes a final frame, waits for pending encodes and returns the
+    timeline: [{"t", "until", "frame", "thumb"}], times in seconds from start.
+    """
+
+    def __init__(self, job_id, vm_name=VM_NAME, interval=SCREENSHOT_INTERVAL, max_frames=SCREENSHOT_MAX_FRAMES,
+                 dedup_distance=SCREENSHOT_DEDUP_DISTANCE, out_dir=None, capture=capture_png):
+        self.vm_name = vm_name
+        self.interval = interval
+        self.max_frames = max_frames
+        self.dedup_distance = dedup_distance
+        self.out_dir = out_dir or os.path.join(RESULTS_PATH, str(job_id), "screenshots")
+        self.capture = capture
+        self.captured = 0
+        self.dropped = 0
+        self._timeline = []
+        self._futures = []
+        self._last_key = None
+        self._start = None
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"screenshots-{vm_name}", daemon=True)
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._start = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        self._grab()  # the final state of the screen is usually the interesting one
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[{self.vm_name}] Screenshot encode failed: {e}")
+        return [frame for frame in self._timeline if frame.get("frame")]
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._grab()
+
+    def _grab(self):
+        if len(self._timeline) >= self.max_frames:
+            return
+        t = round(time.monotonic() - self._start, 1)
+        try:
+            png = self.capture(self.vm_name)
+        except Exception as e:
+            print(f"[{self.vm_name}] Screenshot failed: {e}")
+            return
+        self.captured += 1
+
+        image = Image.open(io.BytesIO(png)) if Image else None
+        key = dhash(image) if image else hashlib.sha256(png).digest()
+        if self._last_key is not None and self._same(key, self._last_key):
+            self._timeline[-1]["until"] = t
+            self.dropped += 1
+            return
+
+        self._last_key = key
+        frame = {"t": t, "until": t}
+        self._timeline.append(frame)
+        self._futures.append(_encoders.submit(self._encode, frame, len(self._timeline), png, image))
+
+    def _same(self, key, last_key):
+        if isinstance(key, int):
+            return bin(key ^ last_key).count("1") <= self.dedup_distance
+        return key == last_key
+
+    def _encode(self, frame, seq, png, image):
+        base = os.path.join(self.out_dir, f"{seq:04d}")
+        if image is None:
+            path = base + ".png"
+            with open(path, "wb") as f:
+                f.write(png)
+            frame["frame"], frame["thumb"] = path, None
+            return
+        image = image.convert("RGB")
+        image.save(base + ".jpg", "JPEG", quality=SCREENSHOT_QUALITY, optimize=True)
+        thumb = image.copy()
+        thumb.thumbnail((SCREENSHOT_THUMB_WIDTH, SCREENSHOT_THUMB_WIDTH))
+        thumb.save(base + "_thumb.jpg", "JPEG", quality=SCREENSHOT_QUALITY)
+        frame["frame"], frame["thumb"] = base + ".jpg", base + "_thumb.jpg"
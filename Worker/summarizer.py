@@ -1,25 +1,39 @@
+from .config import SUMMARY_MAX_REASONS, SUMMARY_MAX_REASON_CHARS
+from .rule_engine import default_engine, risk_level
 
-def generate_summary(process_tree):
-    reasons = []
 
-    def walk(node):
-        if "cmd.exe" in node["image"]:
-            reasons.append("Spawned command interpreter")
-        if "powershell.exe" in node["image"]:
-            reasons.append("Spawned PowerShell")
-        for c in node.get("children", []):
-            walk(c)
-
-    walk(process_tree)
-
-    risk = "High" if reasons else "Low"
+def generate_summary(process_tree, engine=None):
+    """Score a process tree against the behaviour rules in RULES_PATH."""
+    score, matches = (engine or default_engine()).evaluate(process_tree)
+    risk = risk_level(score)
 
     return {
         "risk_level": risk,
-        "reasons": list(set(reasons)),
+        "score": score,
+        "reasons": [match["description"] for match in matches],
+        "matches": matches,
+        "process_count": len(process_tree),
         "message": (
             "This file shows suspicious behavior."
-            if risk == "High"
+            if risk != "Low"
             else "No suspicious behavior detected."
         )
     }
+
+
+def short_summary(summary):
+    """
+    The part of a summary that goes back to the API and into analyses.summary;
+    the rule matches stay in the report store document.
+    """
+    reasons = [reason[:SUMMARY_MAX_REASON_CHARS] for reason in summary["reasons"][:SUMMARY_MAX_REASONS]]
+    if len(summary["reasons"]) > SUMMARY_MAX_REASONS:
+        reasons.append(f"... and {len(summary['reasons']) - SUMMARY_MAX_REASONS} more")
+    return {
+        "risk_level": summary["risk_level"],
+        "score": summary["score"],
+        "reasons": reasons,
+        "process_count": summary["process_count"],
+        "message": summary["message"],
+    }
+
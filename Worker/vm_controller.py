@@ -1,39 +1,98 @@
-import subprocess
-from .config import VM_NAME, VM_SNAPSHOT
-from .monitor import collect_process_tree
-from .screenshots import take_screenshot
-from .summarizer import generate_summary
+import ntpath
+import os
+import re
+from .config import (
+    VM_NAME,
+    PROCESS_TREE_REPORT_MAX,
+    RESULTS_PATH,
+    REPORTS_PATH,
+    GUEST_STORE_DIR,
+    GUEST_RUN_DIR,
+    DEFAULT_SAMPLE_EXT,
+)
+from .execution import ExecutionController
+from .hypervisor import get_hypervisor
+from .monitor import SysmonFeed, collect_process_tree
+from .report_store import save_report
+from .screenshots import ScreenshotRecorder
+from .summarizer import generate_summary, short_summary
 
-VBOX = r'"C:\Program Files\Oracle\VirtualBox\VBoxManage.exe"'
+WEVTUTIL = r"C:\Windows\System32\wevtutil.exe"
+CMD = r"C:\Windows\System32\cmd.exe"
+SAMPLE_EXT = re.compile(r"\.[A-Za-z0-9]{1,10}")
 
-def run_cmd(cmd):
-    full_cmd = f'{VBOX} {cmd}'
-    subprocess.run(full_cmd, shell=True, check=True)
+def _no_progress(stage, progress):
+    pass
 
-def run_vm_analysis(job_id, file_path):
-    print("Restoring VM snapshot")
-    run_cmd(f'snapshot "{VM_NAME}" restore "{VM_SNAPSHOT}"')
+def guest_sample_paths(file_path, filename=None):
+    """
+    (path of the blob on the guest's share, path to run it from). file_path
+    is store-relative with "/" separators; the run copy keeps the extension
+    of the uploaded filename, without which Windows will not execute it.
+    """
+    source = ntpath.join(GUEST_STORE_DIR, *file_path.split("/"))
+    ext = ntpath.splitext(ntpath.basename(filename or ""))[1]
+    if not SAMPLE_EXT.fullmatch(ext):
+        ext = DEFAULT_SAMPLE_EXT
+    return source, ntpath.join(GUEST_RUN_DIR, ntpath.basename(source) + ext.lower())
 
-    print("Starting VM")
-    run_cmd(f'startvm "{VM_NAME}" --type headless')
+def run_vm_analysis(job_id, file_path, vm_name=VM_NAME, warm=False, progress=_no_progress, hv=None,
+                    controller=None, results_root=RESULTS_PATH, reports_root=REPORTS_PATH, filename=None):
+    """Analyse one sample on vm_name; progress(stage, fraction) is called at each stage."""
+    hv = hv or get_hypervisor()
+    if warm:
+        print(f"[{vm_name}] Using warm standby VM")
+    else:
+        print(f"[{vm_name}] Restoring VM snapshot and starting VM")
+        progress("booting", 0.1)
+        hv.cold_start(vm_name)
 
-    print("Executing file in VM")
-    run_cmd(
-        f'guestcontrol "{VM_NAME}" run '
-        f'--exe "C:\\sandbox\\{file_path}" '
-        f'--username user --password pass'
-    )
+    # Before skip_existing, so the copy's own processes are not counted as activity
+    source, sample_path = guest_sample_paths(file_path, filename)
+    hv.guest_run(vm_name, CMD, ["/c", "copy", "/y", source, sample_path])
 
-    print("Collecting process tree")
-    process_tree = collect_process_tree()
+    feed = SysmonFeed(lambda args: hv.guest_run(vm_name, WEVTUTIL, args))
+    feed.skip_existing()  # only count events from after the sample starts
 
-    print("aking screenshot")
-    take_screenshot(job_id)
+    print(f"[{vm_name}] Executing file in VM")
+    progress("executing", 0.3)
+    # `start` returns immediately; the execution controller decides when to stop
+    hv.guest_start(vm_name, sample_path)
+    recorder = ScreenshotRecorder(
+        job_id, vm_name, out_dir=os.path.join(results_root, str(job_id), "screenshots"), capture=hv.screenshot_png
+    ).start()
+    try:
+        outcome = (controller or ExecutionController()).run(feed)
+    finally:
+        screenshots = recorder.stop()
+    print(f"[{vm_name}] Execution stopped: {outcome.stop_reason} after {outcome.duration:.0f}s, "
+          f"{len(screenshots)} screenshots ({recorder.dropped} duplicates dropped)")
 
-    print("Generating summary")
+    print(f"[{vm_name}] Collecting process tree")
+    progress("collecting", 0.8)
+    process_tree = collect_process_tree(feed)
+
+    print(f"[{vm_name}] Generating summary")
+    progress("summarizing", 0.9)
     summary = generate_summary(process_tree)
 
-    print("Stopping VM")
-    run_cmd(f'controlvm "{VM_NAME}" poweroff')
+    print(f"[{vm_name}] Stopping VM")
+    hv.power_off(vm_name)
+
+    # The full report goes to the shared report store; only the ref and the
+    # short summary travel back to the API
+    report = {
+        "job_id": job_id,
+        "file_path": file_path,
+        "vm": vm_name,
+        "execution": outcome.as_dict(),
+        "process_tree": process_tree.to_report(PROCESS_TREE_REPORT_MAX),
+        "screenshots": screenshots,
+        "summary": summary,
+    }
+    report_ref, report_size = save_report(report, reports_root)
 
-    print("RESULT:", summary)
+    summary = short_summary(summary)
+    summary["execution"] = outcome.as_dict()
+    print("RESULT:", summary, report_ref)
+    return {"summary": summary, "report_ref": report_ref, "report_size": report_size}
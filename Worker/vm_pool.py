@@ -0,0 +1,161 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .config import (
+    VM_NAME,
+    VM_SNAPSHOT,
+    VM_POOL_SIZE,
+    VM_CLONE_PREFIX,
+    VM_WARM_SNAPSHOT,
+    WARM_STANDBY,
+)
+from .hypervisor import get_hypervisor
+
+# VM states
+COLD = "cold"        # powered off (or dirty after a job); the job does its own restore + boot
+WARMING = "warming"  # background refill in progress, not leasable
+READY = "ready"      # resumed from the warm snapshot and idle at the desktop
+BUSY = "busy"        # leased to a job
+
+
+class VMPool:
+    """
+    Owns VM_POOL_SIZE linked clones of the clean snapshot and leases one per job.
+    Each clone gets its own copy of the clean snapshot so it can be restored
+    independently of the others.
+
+    Up to WARM_STANDBY clones are kept READY: restored from a running-state
+    snapshot and resumed in the background, so a job leasing one can start the
+    sample within seconds. After every job the pool refills standby VMs in the
+    background.
+    """
+
+    def __init__(
+        self,
+        base_vm=VM_NAME,
+        snapshot=VM_SNAPSHOT,
+        size=VM_POOL_SIZE,
+        prefix=VM_CLONE_PREFIX,
+        warm_snapshot=VM_WARM_SNAPSHOT,
+        warm_standby=WARM_STANDBY,
+        hv=None,
+    ):
+        self.hv = hv or get_hypervisor()
+        self.base_vm = base_vm
+        self.snapshot = snapshot
+        self.warm_snapshot = warm_snapshot
+        self.warm_standby = min(warm_standby, size)
+        self.names = [f"{prefix}{i}" for i in range(1, size + 1)]
+
+        self._state = {name: COLD for name in self.names}
+        self._busy = {}  # vm name -> job id
+        self._cond = threading.Condition()
+        self._refill = ThreadPoolExecutor(max_workers=max(1, self.warm_standby), thread_name_prefix="vm-refill")
+
+        self._leases = 0
+        self._warm_leases = 0
+        self._wait_total = 0.0
+        self._refill_failures = 0
+
+    def prepare(self):
+        """Create missing clones and warm snapshots (idempotent), then fill the standby set."""
+        for name in self.names:
+            if not self.hv.vm_exists(name):
+                print(f"Creating linked clone {name}")
+                self.hv.create_clone(self.base_vm, self.snapshot, name)
+            if self.warm_standby and not self.hv.snapshot_exists(name, self.warm_snapshot):
+                print(f"Taking running-state snapshot {self.warm_snapshot} of {name}")
+                self.hv.cold_start(name, self.snapshot)
+                self.hv.take_snapshot(name, self.warm_snapshot)
+                self.hv.power_off(name)
+        self._schedule_refill()
+
+    @contextmanager
+    def lease(self, job_id):
+        """
+        Block until a clone is available and hold it for the duration of a job.
+        Yields (vm_name, warm); warm VMs are already at the desktop.
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                name = self._pick(READY) or self._pick(COLD)
+                if name:
+                    break
+                self._cond.wait()
+            warm = self._state[name] == READY
+            self._state[name] = BUSY
+            self._busy[name] = job_id
+            self._leases += 1
+            self._warm_leases += warm
+            self._wait_total += time.monotonic() - start
+        try:
+            yield name, warm
+        finally:
+            with self._cond:
+                del self._busy[name]
+                self._state[name] = COLD
+                self._cond.notify()
+            self._schedule_refill()
+
+    def _pick(self, state):
+        for name in self.names:
+            if self._state[name] == state:
+                return name
+        return None
+
+    def _schedule_refill(self):
+        """Start warming COLD clones until the standby target is met."""
+        with self._cond:
+            warm = sum(1 for s in self._state.values() if s in (READY, WARMING))
+            targets = []
+            for name in self.names:
+                if warm >= self.warm_standby:
+                    break
+                if self._state[name] == COLD:
+                    self._state[name] = WARMING
+                    targets.append(name)
+                    warm += 1
+        for name in targets:
+            self._refill.submit(self._warm, name)
+
+    def _warm(self, name):
+        try:
+            self.hv.resume_warm(name, self.warm_snapshot)
+            state = READY
+        except Exception as e:
+            print(f"Warm refill of {name} failed: {e}")
+            try:
+                self.hv.power_off(name)
+            except Exception as e:
+                # Still back to COLD: a lease cold-starts it, which powers off first
+                print(f"Power off of {name} after failed refill failed: {e}")
+            state = COLD
+        with self._cond:
+            if state == COLD:
+                self._refill_failures += 1
+            self._state[name] = state
+            self._cond.notify()
+
+    def shutdown(self):
+        self._refill.shutdown(wait=True)
+
+    def stats(self):
+        with self._cond:
+            counts = {s: 0 for s in (COLD, WARMING, READY, BUSY)}
+            for s in self._state.values():
+                counts[s] += 1
+            return {
+                "size": len(self.names),
+                "busy": counts[BUSY],
+                "free": counts[COLD] + counts[READY],
+                "ready": counts[READY],
+                "warming": counts[WARMING],
+                "warm_standby_target": self.warm_standby,
+                "jobs": dict(self._busy),
+                "leases": self._leases,
+                "warm_leases": self._warm_leases,
+                "refill_failures": self._refill_failures,
+                "avg_lease_wait_s": round(self._wait_total / self._leases, 3) if self._leases else 0.0,
+            }
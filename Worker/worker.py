@@ -1,39 +1,105 @@
+import functools
 import json
+from concurrent.futures import ThreadPoolExecutor
 import pika
-from .config import RABBITMQ_HOST, QUEUE_NAME
+from .config import RABBITMQ_HOST, QUEUE_NAME, RESULTS_QUEUE, VM_POOL_SIZE, WORKER_STATUS_PORT, SUMMARY_MAX_REASON_CHARS
+from .events import EventPublisher
+from .results import result_message, publish_result
+from .status import start_status_server
 from .vm_controller import run_vm_analysis
+from .vm_pool import VMPool
 
-def on_message(channel, method, properties, body):
-    print("Job received")
 
-    payload = json.loads(body.decode())
-    job_id = payload["job_id"]
-    file_path = payload["file_path"]
+def ack(channel, delivery_tag):
+    if channel.is_open:
+        channel.basic_ack(delivery_tag=delivery_tag)
 
+
+def finish_job(channel, delivery_tag, result):
+    # Publish before acking: if we die in between, the job is redelivered
+    # and the duplicate result is a no-op on the API side
+    if result is not None and channel.is_open:
+        publish_result(channel, result)
+    ack(channel, delivery_tag)
+
+
+def process_job(connection, channel, delivery_tag, body, pool, events):
+    """Runs on an executor thread: lease a VM, analyse, then publish the result and ack on the connection thread."""
+    payload = {}
+    result_msg = None
     try:
-        run_vm_analysis(job_id, file_path)
-        channel.basic_ack(delivery_tag=method.delivery_tag)
-        print("Job completed")
+        payload = json.loads(body.decode())
+        job_id = payload["job_id"]
+        file_path = payload["file_path"]
+
+        events.emit(payload, "queued_on_worker", status="pending", progress=0.0)
+        with pool.lease(job_id) as (vm_name, warm):
+            print(f"Job {job_id} running on {vm_name}" + (" (warm)" if warm else ""))
+            events.emit(payload, "vm_leased", progress=0.05, vm=vm_name, warm=warm)
+            connection.add_callback_threadsafe(
+                functools.partial(publish_result, channel, result_message(payload, "running"))
+            )
+            result = run_vm_analysis(
+                job_id, file_path, vm_name, warm,
+                progress=lambda stage, fraction: events.emit(payload, stage, progress=fraction),
+                hv=pool.hv,
+                filename=payload.get("filename"),
+            )
+        result_msg = result_message(
+            payload, "finished",
+            score=result["summary"].get("score"),
+            summary=result["summary"],
+            report_ref=result["report_ref"],
+            report_size=result["report_size"],
+        )
+        events.emit(payload, "finished", status="finished", progress=1.0,
+                    risk_level=result["summary"].get("risk_level"))
+        print(f"Job {job_id} completed")
     except Exception as e:
         print("Error:", e)
-        channel.basic_ack(delivery_tag=method.delivery_tag)
+        if payload.get("file_hash"):
+            result_msg = result_message(payload, "error", summary={"error": str(e)[:SUMMARY_MAX_REASON_CHARS]})
+        events.emit(payload, "error", status="error", error=str(e))
+    finally:
+        # pika channels are not thread-safe: hand the publish and ack back to the ioloop
+        connection.add_callback_threadsafe(functools.partial(finish_job, channel, delivery_tag, result_msg))
+
 
 def main():
+    pool = VMPool()
+    pool.prepare()
+
+    if WORKER_STATUS_PORT:
+        start_status_server(WORKER_STATUS_PORT, {"vm_pool": pool.stats, "hypervisor": pool.hv.stats})
+
+    events = EventPublisher().start()
+    executor = ThreadPoolExecutor(max_workers=VM_POOL_SIZE, thread_name_prefix="vm-job")
+
     connection = pika.BlockingConnection(
         pika.ConnectionParameters(host=RABBITMQ_HOST)
     )
     channel = connection.channel()
 
     channel.queue_declare(queue=QUEUE_NAME, durable=True)
-    channel.basic_qos(prefetch_count=1)
+    channel.queue_declare(queue=RESULTS_QUEUE, durable=True)
+    # One unacked message per VM: the broker never hands us more than we can run
+    channel.basic_qos(prefetch_count=VM_POOL_SIZE)
+
+    def on_message(channel, method, properties, body):
+        print("Job received")
+        executor.submit(process_job, connection, channel, method.delivery_tag, body, pool, events)
 
     channel.basic_consume(
         queue=QUEUE_NAME,
         on_message_callback=on_message
     )
 
-    print("Worker started, waiting for jobs...")
-    channel.start_consuming()
+    print(f"Worker started with {VM_POOL_SIZE} VMs, waiting for jobs...")
+    try:
+        channel.start_consuming()
+    finally:
+        executor.shutdown(wait=True)
+        pool.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -5,3 +5,7 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+
+# In-memory user/token store (database/memory_store.py); an empty path disables snapshots
+STORE_SNAPSHOT_PATH = os.getenv("STORE_SNAPSHOT_PATH", "store_snapshot.json")
+STORE_SNAPSHOT_INTERVAL = float(os.getenv("STORE_SNAPSHOT_INTERVAL", "30"))
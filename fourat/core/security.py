@@ -1,11 +1,12 @@
 #core.security.py - provides security utilities for token creation and user authentication
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
+import time
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose.exceptions import ExpiredSignatureError
-from database.fake_db import REFRESH_TOKENS
-from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from database.fake_db import store
+from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 
 security = HTTPBearer() #class provides HTTP Bearer authentication for FastAPI routes // 
 #the http bearer scheme is commonly used for transmitting access tokens
@@ -19,13 +20,14 @@ def create_access_token(user_id: int, email: str):
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM) 
 
 def create_refresh_token(user_id: int):
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     payload = {
         "sub": str(user_id),
         "type": "refresh",
-        "exp": datetime.utcnow() + timedelta(days=7)
+        "exp": expires_at
     }
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-    REFRESH_TOKENS[token] = user_id
+    store.add_refresh_token(token, user_id, time.time() + REFRESH_TOKEN_EXPIRE_DAYS * 86400)  # evicted at expiry
     return token
 
 
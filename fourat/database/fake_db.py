@@ -8,3 +8,8 @@ def get_db():
         password=os.getenv("DB_PASS", "vexpass"),
         database=os.getenv("DB_NAME", "vex"),
     )
+
+# Users and refresh tokens for this service live in memory (see memory_store.py)
+from database.memory_store import MemoryStore
+
+store = MemoryStore()
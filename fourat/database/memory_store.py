@@ -0,0 +1,176 @@
+# database.memory_store.py - in-memory users and refresh tokens for dev / load-test mode
+#
+# Users are indexed by id and by (lower-cased) email, so login and register
+# are dict lookups instead of a scan. Refresh tokens are kept by the SHA-256
+# of the token with their expiry; expired ones are evicted from a heap on
+# every write (and by purge_expired()). All mutations take one lock.
+# snapshot() writes everything to a JSON file atomically and load() reads it
+# back at startup, so a restart does not log every load-test client out.
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users_by_id: Dict[int, Dict] = {}
+        self._ids_by_email: Dict[str, int] = {}
+        self._next_id = 1
+        self._tokens: Dict[str, tuple] = {}  # key -> (user_id, expires_at epoch)
+        self._expiry_heap = []  # (expires_at, key); stale entries are skipped
+        self._dirty = False
+
+    # Users
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        with self._lock:
+            user_id = self._ids_by_email.get(email.lower())
+            return dict(self._users_by_id[user_id]) if user_id is not None else None
+
+    def get_user_by_id(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            user = self._users_by_id.get(int(user_id))
+            return dict(user) if user else None
+
+    def create_user(self, username: str, email: str, password_hash: str) -> Optional[Dict]:
+        """Insert a user; None if the email is taken (check and insert are one step)"""
+        with self._lock:
+            if email.lower() in self._ids_by_email:
+                return None
+            user = {"id": self._next_id, "username": username, "email": email, "password": password_hash}
+            self._users_by_id[user["id"]] = user
+            self._ids_by_email[email.lower()] = user["id"]
+            self._next_id += 1
+            self._dirty = True
+            return dict(user)
+
+    def user_count(self) -> int:
+        with self._lock:
+            return len(self._users_by_id)
+
+    # Refresh tokens
+
+    def add_refresh_token(self, token: str, user_id: int, expires_at: float) -> None:
+        key = _token_key(token)
+        with self._lock:
+            self._purge_expired(time.time())
+            self._tokens[key] = (int(user_id), expires_at)
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            self._dirty = True
+
+    def get_refresh_token_user(self, token: str) -> Optional[int]:
+        """Owner of a stored, unexpired refresh token"""
+        with self._lock:
+            entry = self._tokens.get(_token_key(token))
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def revoke_refresh_token(self, token: str) -> bool:
+        with self._lock:
+            removed = self._tokens.pop(_token_key(token), None) is not None
+            self._dirty = self._dirty or removed
+            return removed
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_expired(time.time())
+
+    def _purge_expired(self, now: float) -> int:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self._tokens.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._tokens[key]
+                removed += 1
+        if removed:
+            self._dirty = True
+        return removed
+
+    def token_count(self) -> int:
+        with self._lock:
+            return len(self._tokens)
+
+    # Persistence
+
+    def snapshot(self, path: str) -> bool:
+        """Write the store to `path` (temp file + rename); False if nothing changed"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._purge_expired(time.time())
+            data = {
+                "version": 1,
+                "next_id": self._next_id,
+                "users": list(self._users_by_id.values()),
+                "refresh_tokens": [[key, uid, exp] for key, (uid, exp) in self._tokens.items()],
+            }
+            body = json.dumps(data, separators=(",", ":"))
+            self._dirty = False
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+        return True
+
+    def load(self, path: str) -> bool:
+        """Replace the contents with a snapshot; False if there is none"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        with self._lock:
+            self._users_by_id = {user["id"]: user for user in data.get("users", [])}
+            self._ids_by_email = {user["email"].lower(): uid for uid, user in self._users_by_id.items()}
+            self._next_id = max(data.get("next_id", 1), max(self._users_by_id, default=0) + 1)
+            self._tokens = {key: (uid, exp) for key, uid, exp in data.get("refresh_tokens", []) if exp > now}
+            self._expiry_heap = [(exp, key) for key, (_, exp) in self._tokens.items()]
+            heapq.heapify(self._expiry_heap)
+            self._dirty = False
+        return True
+
+
+class SnapshotWriter:
+    """Background thread that snapshots the store every `interval` seconds while it has changes"""
+
+    def __init__(self, store: MemoryStore, path: str, interval: float):
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="store-snapshot", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._write()  # final snapshot on shutdown
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.store.snapshot(self.path)
+        except OSError as e:
+            print(f"Store snapshot failed: {e}")
@@ -1,9 +1,25 @@
 #Purpose: create app, add middleware
 from fastapi import FastAPI, HTTPException, Depends #fastapi tools and error handling
 from fastapi.middleware.cors import CORSMiddleware #middleware for handling CORS
+from contextlib import asynccontextmanager
 from routes.auth import router as auth_router #importing the route modules
+from database.fake_db import store
+from database.memory_store import SnapshotWriter
+from core.config import STORE_SNAPSHOT_PATH, STORE_SNAPSHOT_INTERVAL
 
-app = FastAPI(title="Simple Login API - Permanent Token") #API instance that gives you ip to get access
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Reload users and refresh tokens from the last snapshot, then keep snapshotting
+    writer = None
+    if STORE_SNAPSHOT_PATH:
+        store.load(STORE_SNAPSHOT_PATH)
+        writer = SnapshotWriter(store, STORE_SNAPSHOT_PATH, STORE_SNAPSHOT_INTERVAL)
+        writer.start()
+    yield
+    if writer:
+        writer.stop()
+
+app = FastAPI(title="Simple Login API - Permanent Token", lifespan=lifespan) #API instance that gives you ip to get access
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.0.0.1:5500"],
@@ -12,4 +28,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(auth_router, prefix="/api")
\ No newline at end of file
+app.include_router(auth_router, prefix="/api")
+
+@app.get("/api/metrics")
+def metrics():
+    return {"users": store.user_count(), "refresh_tokens": store.token_count()}